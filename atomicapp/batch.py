@@ -0,0 +1,254 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+from atomicapp.constants import (BATCH_ACTIONS,
+                                 BATCH_WORKERS,
+                                 HOST_DIR,
+                                 LOGGER_DEFAULT)
+from atomicapp.nulecule import NuleculeManager
+from atomicapp.nulecule.exceptions import NuleculeException, DockerException
+from atomicapp.plugin import ProviderFailedException
+from atomicapp.utils import Utils
+
+logger = logging.getLogger(LOGGER_DEFAULT)
+
+
+class BatchException(Exception):
+    pass
+
+
+class Batch(object):
+
+    """
+    Runs or stops many Nulecule applications, or one application with
+    many answers, in a single process.
+
+    Every distinct application is unpacked once. Each entry then deploys
+    a copy of it with its own answers, on a pool of worker threads. All
+    entries share the caches of the process (provider classes, HTTP
+    sessions, API discovery, Docker probe and image list).
+    """
+
+    entry_keys = ("action", "app_spec", "answers", "provider", "namespace",
+                  "destination")
+
+    def __init__(self, entries, workers=BATCH_WORKERS, dryrun=False,
+                 cli_answers=None, answers_format=None):
+        """
+        Args:
+            entries (list): dicts with an app_spec and optionally an
+                            action (run or stop), answers file, provider,
+                            namespace and destination
+            workers (int): entries deployed at the same time
+            dryrun (bool): Do not make any change to the host system
+            cli_answers (dict): answers shared by all entries, overridden
+                                by the provider and namespace of an entry
+            answers_format (str): format of the answers files
+        """
+        self.entries = entries
+        self.workers = workers
+        self.dryrun = dryrun
+        self.cli_answers = cli_answers or {}
+        self.answers_format = answers_format
+
+    @classmethod
+    def load(cls, manifest, **kwargs):
+        """
+        Load the entries of a batch from a manifest file. The manifest is
+        a list of entries, or a mapping with the list under 'entries'.
+        Relative answers files and destinations are relative to the
+        manifest.
+
+        Args:
+            manifest (str): path of the manifest (JSON or YAML)
+            kwargs (dict): passed on to Batch
+
+        Returns:
+            Batch
+
+        Raises:
+            BatchException: the manifest is not valid
+        """
+        import anymarkup
+        try:
+            data = anymarkup.parse_file(manifest)
+        except Exception as e:
+            raise BatchException("Unable to read batch manifest %s: %s"
+                                 % (manifest, e))
+        if isinstance(data, dict):
+            data = data.get("entries")
+        if not isinstance(data, list) or not data:
+            raise BatchException("Batch manifest %s has no entries" % manifest)
+
+        basedir = os.path.dirname(os.path.abspath(manifest))
+        entries = []
+        destinations = set()
+        for number, entry in enumerate(data, 1):
+            if not isinstance(entry, dict) or not entry.get("app_spec"):
+                raise BatchException("Entry %s of %s has no app_spec"
+                                     % (number, manifest))
+            unknown = set(entry) - set(cls.entry_keys)
+            if unknown:
+                raise BatchException("Entry %s of %s has unknown keys: %s"
+                                     % (number, manifest, ", ".join(sorted(unknown))))
+            entry = dict(entry)
+            entry.setdefault("action", "run")
+            # Apps in directories next to the manifest
+            if not os.path.isabs(entry["app_spec"]) and \
+                    os.path.exists(os.path.join(basedir, entry["app_spec"])):
+                entry["app_spec"] = os.path.join(basedir, entry["app_spec"])
+            if entry["action"] not in BATCH_ACTIONS:
+                raise BatchException("Entry %s of %s has an unknown action %s"
+                                     % (number, manifest, entry["action"]))
+            for key in ("answers", "destination"):
+                if entry.get(key) and entry[key].lower() != "none" and \
+                        "://" not in entry[key]:
+                    entry[key] = os.path.join(basedir, entry[key])
+            if entry.get("destination") and entry["destination"].lower() != "none":
+                if entry["destination"] in destinations:
+                    raise BatchException("Entry %s of %s reuses destination %s"
+                                         % (number, manifest, entry["destination"]))
+                destinations.add(entry["destination"])
+            entries.append(entry)
+        return cls(entries, **kwargs)
+
+    def run(self):
+        """
+        Unpack the applications and run the entries.
+
+        Returns:
+            list: a result per entry, in the order of the entries, with
+                  the app_spec, action, provider, namespace, status ("ok"
+                  or "failed"), error, app_path and seconds taken
+        """
+        started = time.time()
+        pool = ThreadPool(self.workers)
+        try:
+            apps = [entry["app_spec"] for entry in self.entries
+                    if entry["action"] == "run"]
+            apps = sorted(set(apps), key=apps.index)
+            unpacked = dict(zip(apps, pool.map(self._unpack, apps)))
+            results = pool.map(lambda entry: self._run_entry(entry, unpacked),
+                               self.entries)
+        finally:
+            pool.close()
+            pool.join()
+            # Hand the files written by the batch over to the user
+            Utils.fixOwnership()
+
+        failed = len([r for r in results if r["status"] != "ok"])
+        logger.info("Batch of %s entries done in %.1fs, %s failed",
+                    len(results), time.time() - started, failed)
+        return results
+
+    def _unpack(self, app_spec):
+        """
+        Unpack an application once for all of its entries.
+
+        Returns:
+            tuple (path, error): path of the unpacked application or the
+                                 error unpacking it
+        """
+        try:
+            if self._is_path(app_spec):
+                return app_spec, None
+            nm = NuleculeManager(app_spec=app_spec, interactive=False)
+            nm.fetch(dryrun=self.dryrun)
+            return self._host_path(nm.app_path), None
+        except Exception as e:
+            logger.error("Unable to unpack %s: %s", app_spec, e)
+            return None, "Unable to unpack %s: %s" % (app_spec, e)
+
+    def _run_entry(self, entry, unpacked):
+        result = {"app_spec": entry["app_spec"],
+                  "action": entry["action"],
+                  "provider": entry.get("provider"),
+                  "namespace": entry.get("namespace"),
+                  "status": "failed",
+                  "error": None,
+                  "app_path": None}
+        started = time.time()
+        try:
+            result["app_path"] = self._deploy(entry, unpacked)
+            result["status"] = "ok"
+        except (DockerException, NuleculeException, ProviderFailedException,
+                BatchException) as e:
+            result["error"] = str(e)
+        except Exception as e:
+            logger.debug(e, exc_info=True)
+            result["error"] = repr(e)
+        result["seconds"] = round(time.time() - started, 3)
+        if result["error"]:
+            logger.error("%s of %s failed: %s", entry["action"],
+                         entry["app_spec"], result["error"])
+        return result
+
+    def _deploy(self, entry, unpacked):
+        cli_answers = dict(self.cli_answers)
+        for key in ("provider", "namespace"):
+            if entry.get(key):
+                cli_answers[key] = entry[key]
+
+        if entry["action"] == "stop":
+            nm = NuleculeManager(app_spec=entry["app_spec"],
+                                 cli_answers=cli_answers,
+                                 interactive=False)
+            nm.stop(dryrun=self.dryrun)
+            return self._host_path(nm.app_path)
+
+        app_path, error = unpacked[entry["app_spec"]]
+        if error:
+            raise BatchException(error)
+        # Every entry deploys its own copy, the rendered artifacts and
+        # runtime answers of the entries differ
+        destination = entry.get("destination")
+        if not destination:
+            name = entry["app_spec"]
+            if self._is_path(name):
+                name = os.path.basename(os.path.abspath(name))
+            destination = self._host_path(Utils.getNewAppCacheDir(name))
+        nm = NuleculeManager(app_spec=app_path,
+                             destination=destination,
+                             cli_answers=cli_answers,
+                             answers_file=entry.get("answers"),
+                             answers_format=self.answers_format,
+                             interactive=False)
+        nm.run(answers_output=None, ask=False, dryrun=self.dryrun)
+        if destination.lower() == "none":
+            Utils.rm_dir(nm.app_path)
+            return None
+        return self._host_path(nm.app_path)
+
+    @staticmethod
+    def _is_path(app_spec):
+        if os.path.isabs(app_spec):
+            app_spec = Utils.get_real_abspath(app_spec)
+        return os.path.exists(app_spec)
+
+    @staticmethod
+    def _host_path(path):
+        # NuleculeManager takes paths as seen from the host
+        if Utils.inContainer() and path.startswith(HOST_DIR):
+            return path[len(HOST_DIR):]
+        return path
@@ -17,6 +17,7 @@
  along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import json
 import os
 import sys
 
@@ -29,15 +30,20 @@ from atomicapp.constants import (__ATOMICAPPVERSION__,
                                  ANSWERS_FILE,
                                  ANSWERS_FILE_SAMPLE_FORMAT,
                                  APP_ENT_PATH,
+                                 BATCH_WORKERS,
                                  CACHE_DIR,
                                  HOST_DIR,
                                  LOGGER_DEFAULT,
-                                 PROVIDERS)
+                                 PROVIDERS,
+                                 SERVE_APP_CONCURRENCY,
+                                 SERVE_PORT,
+                                 SERVE_SOCKET,
+                                 SERVE_WORKERS)
 from atomicapp.nulecule import NuleculeManager
 from atomicapp.nulecule.exceptions import NuleculeException, DockerException
 from atomicapp.plugin import ProviderFailedException
 from atomicapp.utils import Utils
-from atomicapp.index import Index
+from atomicapp.index import Index, IndexException
 
 logger = logging.getLogger(LOGGER_DEFAULT)
 
@@ -85,6 +91,10 @@ def cli_run(args):
                          answers_file=argdict['answers'],
                          answers_format=argdict.get('answers_format'))
     nm.run(**argdict)
+    if argdict.get('watch'):
+        from atomicapp.watch import Watch
+        Watch(nm, dryrun=argdict['dryrun'], ask=argdict['ask'],
+              only=argdict.get('only'), skip=argdict.get('skip')).watch()
     # Clean up the files if the user asked us to. Otherwise
     # notify the user where they can manage the application
     if destination and destination.lower() == 'none':
@@ -118,12 +128,67 @@ def cli_init(args):
 def cli_index(args):
     argdict = args.__dict__
     i = Index()
-    if argdict["index_action"] == "list":
-        i.list()
-    elif argdict["index_action"] == "update":
-        i.update()
-    elif argdict["index_action"] == "generate":
-        i.generate(argdict["location"])
+    try:
+        if argdict["index_action"] == "list":
+            i.list()
+        elif argdict["index_action"] == "update":
+            i.update()
+        elif argdict["index_action"] == "generate":
+            i.generate(argdict["location"])
+        elif argdict["index_action"] == "search":
+            i.search(" ".join(argdict["query"]), argdict["substring"])
+        elif argdict["index_action"] == "info":
+            i.info(argdict["app_id"])
+    except IndexException as e:
+        logger.error(e)
+        sys.exit(1)
+    sys.exit(0)
+
+
+def cli_batch(args):
+    argdict = args.__dict__
+    from atomicapp.batch import Batch, BatchException
+    try:
+        batch = Batch.load(argdict['manifest'],
+                           workers=argdict['workers'],
+                           dryrun=argdict['dryrun'],
+                           cli_answers=argdict['cli_answers'],
+                           answers_format=argdict.get('answers_format'))
+    except BatchException as e:
+        logger.error(e)
+        sys.exit(1)
+    results = batch.run()
+
+    output = json.dumps(results, indent=2, sort_keys=True,
+                        separators=(',', ': '))
+    if argdict['results']:
+        with open(argdict['results'], 'w') as f:
+            f.write(output + "\n")
+        Utils.trackOwnership(argdict['results'], recursive=False)
+    else:
+        print(output)
+    sys.exit(0 if all(r['status'] == 'ok' for r in results) else 1)
+
+
+def cli_serve(args):
+    argdict = args.__dict__
+    from atomicapp.server import Server, ServerException
+    address = argdict['socket']
+    if argdict['host']:
+        address = (argdict['host'], argdict['port'])
+    token = None
+    try:
+        if argdict['token_file']:
+            with open(argdict['token_file']) as f:
+                token = f.read().strip()
+        server = Server(address, workers=argdict['workers'],
+                        app_concurrency=argdict['app_concurrency'],
+                        token=token,
+                        destination_root=argdict['destination_root'])
+    except (IOError, ServerException) as e:
+        logger.error(e)
+        sys.exit(1)
+    server.serve_forever()
     sys.exit(0)
 
 
@@ -155,6 +220,9 @@ def cli_func_exec(cli_func, cli_func_args):
     except Exception as e:
         logger.error(e, exc_info=True)
         sys.exit(1)
+    finally:
+        # Hand the files written during the run over to the user
+        Utils.fixOwnership()
 
 
 class CLI():
@@ -294,9 +362,28 @@ class CLI():
             dest="provider-auth",
             help='Value for provider-auth answers option.')
 
+        # === COMPONENTS PARSER ===
+        # Create a 'components parser' that will include flags selecting
+        # the components of the app to act on
+        components_parser = argparse.ArgumentParser(add_help=False)
+        components_parser.add_argument(
+            "--only",
+            dest="only",
+            action="append",
+            metavar="COMPONENT",
+            help=("Only act on this component of the app, may be repeated. "
+                  "Components of external apps are named <component>:<name>. "
+                  "The external apps of the other components are not pulled."))
+        components_parser.add_argument(
+            "--skip",
+            dest="skip",
+            action="append",
+            metavar="COMPONENT",
+            help="Do not act on this component of the app, may be repeated.")
+
         # === "run" SUBPARSER ===
         run_subparser = toplevel_subparsers.add_parser(
-            "run", parents=[globals_parser, deploy_parser])
+            "run", parents=[globals_parser, deploy_parser, components_parser])
         run_subparser.add_argument(
             "-a",
             "--answers",
@@ -309,13 +396,34 @@ class CLI():
         run_subparser.add_argument(
             "--provider",
             dest="provider",
-            choices=PROVIDERS,
-            help="The provider to use. Overrides provider value in answerfile.")
+            help="The provider to use (%s or an installed provider "
+                 "plugin). Overrides provider value in answerfile."
+                 % ", ".join(PROVIDERS))
+        run_subparser.add_argument(
+            "--wait",
+            dest="provider-wait",
+            default=None,
+            action="store_true",
+            help=('''
+                Wait until the deployed application is up and running.
+                Currently supported by the Marathon provider.'''))
+        run_subparser.add_argument(
+            "--wait-timeout",
+            dest="provider-wait-timeout",
+            type=int,
+            help="Seconds to wait for the application when using --wait.")
         run_subparser.add_argument(
             "--ask",
             default=False,
             action="store_true",
             help="Ask for params even if the default value is provided")
+        run_subparser.add_argument(
+            "--watch",
+            default=False,
+            action="store_true",
+            help=("Keep running and apply the changes of the Nulecule file, "
+                  "the artifacts and the answers file of the application "
+                  "until interrupted with Ctrl-C."))
         run_subparser.add_argument(
             "app_spec",
             nargs='?',
@@ -373,12 +481,13 @@ class CLI():
 
         # === "stop" SUBPARSER ===
         stop_subparser = toplevel_subparsers.add_parser(
-            "stop", parents=[globals_parser, deploy_parser])
+            "stop", parents=[globals_parser, deploy_parser, components_parser])
         stop_subparser.add_argument(
             "--provider",
             dest="cli_provider",
-            choices=PROVIDERS,
-            help="The provider to use. Overrides provider value in answerfile.")
+            help="The provider to use (%s or an installed provider "
+                 "plugin). Overrides provider value in answerfile."
+                 % ", ".join(PROVIDERS))
         stop_subparser.add_argument(
             "app_spec",
             help=('''
@@ -415,6 +524,96 @@ class CLI():
                 "which will be part of the generated index"))
         index_generate.set_defaults(func=cli_index)
 
+        index_search = index_action.add_parser("search")
+        index_search.add_argument(
+            "query",
+            nargs='+',
+            help=(
+                "Terms matched against the id, name, tags, description "
+                "and providers of the indexed applications"))
+        index_search.add_argument(
+            "--substring",
+            default=False,
+            action="store_true",
+            help="Match the terms anywhere, not only at the start of words")
+        index_search.set_defaults(func=cli_index)
+
+        index_info = index_action.add_parser("info")
+        index_info.add_argument(
+            "app_id",
+            help="The id of an application in the index")
+        index_info.set_defaults(func=cli_index)
+
+        # === "batch" SUBPARSER ===
+        batch_subparser = toplevel_subparsers.add_parser(
+            "batch", parents=[globals_parser, deploy_parser])
+        batch_subparser.add_argument(
+            "manifest",
+            help=("""
+                YAML or JSON file listing the entries to deploy. Each entry
+                has an app_spec and optionally an action (run or stop), an
+                answers file, a provider, a namespace and a destination."""))
+        batch_subparser.add_argument(
+            "--workers",
+            dest="workers",
+            type=int,
+            default=BATCH_WORKERS,
+            help="Entries to deploy at the same time. Default: %s" % BATCH_WORKERS)
+        batch_subparser.add_argument(
+            "--results",
+            dest="results",
+            default=None,
+            help="Write the results of the entries as JSON to this file instead of stdout.")
+        batch_subparser.set_defaults(func=cli_batch)
+
+        # === "serve" SUBPARSER ===
+        serve_subparser = toplevel_subparsers.add_parser(
+            "serve", parents=[globals_parser])
+        serve_subparser.add_argument(
+            "--socket",
+            dest="socket",
+            default=SERVE_SOCKET,
+            help=("Unix socket to serve on, only accessible by its owner. "
+                  "Default: %s" % SERVE_SOCKET))
+        serve_subparser.add_argument(
+            "--host",
+            dest="host",
+            default=None,
+            help=("Serve on this TCP address instead of the unix socket. "
+                  "Needs --token-file."))
+        serve_subparser.add_argument(
+            "--port",
+            dest="port",
+            type=int,
+            default=SERVE_PORT,
+            help="TCP port to serve on. Default: %s" % SERVE_PORT)
+        serve_subparser.add_argument(
+            "--token-file",
+            dest="token_file",
+            default=None,
+            help=("File with the token clients send as 'Authorization: "
+                  "Bearer <token>'."))
+        serve_subparser.add_argument(
+            "--destination-root",
+            dest="destination_root",
+            default=CACHE_DIR,
+            help=("Directory the destination and answers_output of the "
+                  "operations must be under. Default: %s" % CACHE_DIR))
+        serve_subparser.add_argument(
+            "--workers",
+            dest="workers",
+            type=int,
+            default=SERVE_WORKERS,
+            help="Operations to run at the same time. Default: %s" % SERVE_WORKERS)
+        serve_subparser.add_argument(
+            "--app-concurrency",
+            dest="app_concurrency",
+            type=int,
+            default=SERVE_APP_CONCURRENCY,
+            help=("Operations to run at the same time for a single app. "
+                  "Default: %s" % SERVE_APP_CONCURRENCY))
+        serve_subparser.set_defaults(func=cli_serve)
+
         # === "init" SUBPARSER ===
         init_subparser = toplevel_subparsers.add_parser(
             "init", parents=[globals_parser])
@@ -448,8 +647,10 @@ class CLI():
         cmdline = sys.argv[1:]  # Grab args from cmdline
         if len(cmdline) == 0:
             cmdline = ['-h']    # Show help if no arguments are given
-        # Initial setup of logging (to allow for a few early debug statements)
-        Logging.setup_logging(verbose=True, quiet=False)
+        # Logging is set up once the cmdline is parsed, keep the debug
+        # statements until then
+        early_msgs = []
+        logger.addHandler(logging.NullHandler())
 
         # If we are running in an openshift pod (via `oc new-app`) then
         # there is no cmdline but we want to default to "atomicapp run".
@@ -461,14 +662,14 @@ class CLI():
         # ATOMICAPP_ARGS environment variable then set it now
         argstr = os.environ.get('ATOMICAPP_ARGS')
         if argstr:
-            logger.debug("Setting cmdline args to: {}".format(argstr))
+            early_msgs.append("Setting cmdline args to: {}".format(argstr))
             cmdline = argstr.split()
 
         # If the user has elected to provide some arguments via the
         # ATOMICAPP_APPEND_ARGS environment variable then add those now
         argstr = os.environ.get('ATOMICAPP_APPEND_ARGS')
         if argstr:
-            logger.debug("Appending args to cmdline: {}".format(argstr))
+            early_msgs.append("Appending args to cmdline: {}".format(argstr))
             cmdline.extend(argstr.split())
 
         # We want to be able to place options anywhere on the command
@@ -489,6 +690,8 @@ class CLI():
 
         # Setup logging (now with arguments from cmdline) and log a few msgs
         Logging.setup_logging(args.verbose, args.quiet, args.logtype)
+        for msg in early_msgs:
+            logger.debug(msg)
 
         logger.info("Atomic App: %s - Mode: %s"
                     % (__ATOMICAPPVERSION__,
@@ -500,7 +703,7 @@ class CLI():
         # a directory if they want to for "run". For that reason we won't
         # default the RUN label for Atomic App to provide an app_spec argument.
         # In this case pick up app_spec from $IMAGE env var (set by RUN label).
-        if args.action != 'init' and args.action != 'index' and args.app_spec is None:
+        if args.action not in ('init', 'index', 'serve', 'batch') and args.app_spec is None:
             if os.environ.get('IMAGE') is not None:
                 logger.debug("Setting app_spec based on $IMAGE env var")
                 args.app_spec = os.environ['IMAGE']
@@ -514,7 +717,7 @@ class CLI():
         setattr(args, 'cli_answers', {})
         for item in ['provider-api', 'provider-cafile', 'provider-auth',
                      'provider-config', 'provider-tlsverify', 'namespace',
-                     'provider']:
+                     'provider', 'provider-wait', 'provider-wait-timeout']:
             if hasattr(args, item) and getattr(args, item) is not None:
                 args.cli_answers[item] = getattr(args, item)
 
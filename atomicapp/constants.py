@@ -54,6 +54,8 @@ ANSWERS_RUNTIME_FILE = "answers.conf.gen"
 ANSWERS_FILE_SAMPLE = "answers.conf.sample"
 ANSWERS_FILE_SAMPLE_FORMAT = 'ini'
 WORKDIR = ".workdir"
+# Manifest of the files Utils.copy_dir copied, kept in WORKDIR of the copy
+COPY_MANIFEST = "copy-manifest.json"
 
 LOGGER_DEFAULT = "atomicapp"
 LOGGER_COCKPIT = "cockpit"
@@ -70,24 +72,104 @@ DEFAULT_ANSWERS = {
 }
 
 PROVIDERS = ["docker", "kubernetes", "openshift", "marathon"]
+# Entry point group other packages register their providers under
+PROVIDER_ENTRY_POINTS = "atomicapp.providers"
+# Optional provider features, declared in Provider.capabilities
+PROVIDER_CAPABILITY_BULK_APPLY = "bulk-apply"
+PROVIDER_CAPABILITY_PARTIAL = "partial-apply"
+PROVIDER_CAPABILITY_STORAGE = "persistent-storage"
+PROVIDER_CAPABILITY_WAIT = "wait"
+# Provider capability needed by each requirement (see REQUIREMENT_FUNCTIONS)
+REQUIREMENT_CAPABILITIES = {
+    "persistentVolume": PROVIDER_CAPABILITY_STORAGE
+}
 PROVIDER_API_KEY = "provider-api"
 PROVIDER_AUTH_KEY = "provider-auth"
 PROVIDER_CONFIG_KEY = "provider-config"
 PROVIDER_TLS_VERIFY_KEY = "provider-tlsverify"
 PROVIDER_CA_KEY = "provider-cafile"
+PROVIDER_WAIT_KEY = "provider-wait"
+PROVIDER_WAIT_TIMEOUT_KEY = "provider-wait-timeout"
+PROVIDER_WAIT_TIMEOUT = 600
 
 K8S_DEFAULT_API = "http://localhost:8080"
+# Seconds the discovered resources of a Kubernetes/OpenShift API are reused
+KUBE_DISCOVERY_TTL = 300
 OC_DEFAULT_API = "http://localhost:8443"
 
+# Pooled HTTP sessions used for REST calls (Utils.make_rest_request).
+# Timeouts are (connect, read) in seconds; idempotent requests are retried
+# with exponential backoff on the REST_RETRY_STATUS status codes.
+REST_TIMEOUT = (10, 60)
+REST_RETRIES = 3
+REST_BACKOFF = 0.5
+REST_RETRY_STATUS = (429, 500, 502, 503, 504)
+REST_POOL_SIZE = 10
+
+# Deploy all Marathon apps of a component as one group under this group id
+MARATHON_GROUP_KEY = "marathon-group"
+
+# Docker ownership labels and stop behaviour
+DOCKER_LABEL_PREFIX = "io.projectatomic.atomicapp"
+DOCKER_STOP_TIMEOUT_KEY = "docker-stop-timeout"
+DOCKER_STOP_TIMEOUT = 10
+DOCKER_STOP_WORKERS = 16
+
+# Docker capability probe, cached per daemon for DOCKER_PROBE_TTL seconds
+DOCKER_DEFAULT_HOST = "unix:///var/run/docker.sock"
+DOCKER_PROBE_CACHE = ".atomicapp/docker-probe.json"
+DOCKER_PROBE_TTL = 60
+# Seconds the list of local Docker images is reused by a process
+DOCKER_IMAGES_TTL = 30
+
+# Below this number of artifacts rendering does not start a process pool
+RENDER_POOL_THRESHOLD = 8
+
+# atomicapp run --watch: seconds to wait for more changes after one, and
+# seconds between scans when inotify is not available
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1
+
 # Persistent Storage Formats
 PERSISTENT_STORAGE_FORMAT = ["ReadWriteOnce", "ReadOnlyMany", "ReadWriteMany"]
 
 # If running in an openshift POD via `oc new-app`, the ca file is here
 OPENSHIFT_POD_CA_FILE = "/run/secrets/kubernetes.io/serviceaccount/ca.crt"
 
+# atomicapp serve: default unix socket, TCP port, operations running at
+# the same time in total and for a single app
+SERVE_SOCKET = "/run/atomicapp.sock"
+SERVE_PORT = 7075
+SERVE_WORKERS = 8
+SERVE_APP_CONCURRENCY = 1
+
+# atomicapp batch: actions of the entries, entries deployed at the same time
+BATCH_ACTIONS = ("run", "stop")
+BATCH_WORKERS = 8
+
 # Index
 INDEX_IMAGE = "projectatomic/nulecule-library"
 INDEX_DEFAULT_IMAGE_LOCATION = "localhost"
 INDEX_NAME = "index.yaml"
 INDEX_LOCATION = ".atomicapp/" + INDEX_NAME
 INDEX_GEN_DEFAULT_OUTPUT_LOC = "./" + INDEX_NAME
+# Sidecar of `index generate` with the content hash of every indexed app,
+# kept next to the generated index file
+INDEX_GEN_MANIFEST_SUFFIX = ".manifest.json"
+# Below this number of apps `index generate` does not start a process pool
+INDEX_GEN_POOL_THRESHOLD = 8
+# Inverted index used by `index search`, kept next to the index file
+INDEX_SEARCH_SUFFIX = ".search.json"
+# Compiled cache of the parsed index file, kept next to it
+INDEX_CACHE_SUFFIX = ".cache"
+# Index sources; each source is fetched into its own shard in INDEX_SHARDS
+INDEX_SOURCES = ".atomicapp/index-sources.yaml"
+INDEX_SHARDS = ".atomicapp/index.d"
+
+# Parsed Nulecule files compiled with marshal, by content hash, and the
+# number of cache files kept there, the oldest are removed first
+SPEC_CACHE_DIR = ".atomicapp/spec-cache"
+SPEC_CACHE_MAX_FILES = 512
+# Parsed files kept in memory by a process, the least recently used are
+# dropped first
+PARSED_FILES_MAX = 256
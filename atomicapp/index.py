@@ -20,22 +20,39 @@
 from __future__ import print_function
 import os
 
+import bisect
+import hashlib
+import json
 import logging
 import errno
+import multiprocessing
+import re
+import shutil
+import tempfile
+import urlparse
+from multiprocessing.pool import ThreadPool
 from constants import (INDEX_IMAGE,
                        INDEX_LOCATION,
                        INDEX_DEFAULT_IMAGE_LOCATION,
+                       INDEX_CACHE_SUFFIX,
                        INDEX_GEN_DEFAULT_OUTPUT_LOC,
-                       INDEX_NAME)
+                       INDEX_GEN_MANIFEST_SUFFIX,
+                       INDEX_GEN_POOL_THRESHOLD,
+                       INDEX_NAME,
+                       INDEX_SEARCH_SUFFIX,
+                       INDEX_SHARDS,
+                       INDEX_SOURCES)
 from nulecule.container import DockerHandler
 from nulecule.base import Nulecule
 from atomicapp.nulecule.exceptions import NuleculeException
 
 from copy import deepcopy
 
-import anymarkup
 from atomicapp.utils import Utils
 
+# anymarkup is imported where it is used, listing and searching the index
+# goes through the compiled caches without it
+
 logger = logging.getLogger(__name__)
 
 
@@ -43,6 +60,198 @@ class IndexException(Exception):
     pass
 
 
+def _hash_nulecule_dir(nulecule_dir):
+    """
+    Hash the names and contents of all files within a Nulecule directory.
+    """
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(nulecule_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, nulecule_dir) + "\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    digest.update(chunk)
+            digest.update("\0")
+    return digest.hexdigest()
+
+
+def _index_nulecule_dir(args):
+    """
+    Index a single Nulecule directory. This runs in the worker processes of
+    `index generate` and so must stay a picklable module level function.
+
+    Args:
+        args (tuple): path of the directory, its name within the indexed
+                      location and its content hash from the previous run
+
+    Returns:
+        tuple (name, digest, index_info, error): index_info is None when
+        digest matches the previous hash or when indexing failed with error
+    """
+    nulecule_dir, name, previous_digest = args
+    digest = _hash_nulecule_dir(nulecule_dir)
+    if digest == previous_digest:
+        return (name, digest, None, None)
+    try:
+        index_info = Index._nulecule_get_info(nulecule_dir)
+    except (NuleculeException, IndexException) as e:
+        return (name, digest, None, str(e))
+    index_info["path"] = name
+    return (name, digest, index_info, None)
+
+
+class SearchIndex(object):
+
+    """
+    Inverted index over the entries of a Nulecule index. Tokens of the id,
+    name, tags, description and providers of every entry map to the
+    positions of the entries containing them.
+    """
+
+    def __init__(self, entries, postings=None, source=None):
+        """
+        Args:
+            entries (list): entries of the Nulecule index
+            postings (dict): token to positions of entries, built from
+                             entries when not given
+            source (list): mtime and size of the index files the entries
+                           were read from
+        """
+        self.entries = entries
+        self.postings = postings if postings is not None else \
+            self._build_postings(entries)
+        self.vocabulary = sorted(self.postings)
+        self.source = source
+
+    @staticmethod
+    def tokenize(text):
+        return [t for t in re.split(r"[^a-z0-9]+", text.lower()) if t]
+
+    @classmethod
+    def _entry_tokens(cls, entry):
+        metadata = entry.get("metadata") or {}
+        texts = [entry.get("id"), metadata.get("name"),
+                 metadata.get("description")]
+        texts.extend(metadata.get("tags") or [])
+        texts.extend(entry.get("providers") or [])
+
+        tokens = set()
+        for text in texts:
+            if isinstance(text, basestring):
+                tokens.update(cls.tokenize(text))
+        if isinstance(entry.get("id"), basestring):
+            tokens.add(entry["id"].lower())
+        return tokens
+
+    @classmethod
+    def _build_postings(cls, entries):
+        postings = {}
+        for position, entry in enumerate(entries):
+            for token in cls._entry_tokens(entry):
+                postings.setdefault(token, []).append(position)
+        return postings
+
+    def _matching_tokens(self, term, substring=False):
+        if substring:
+            return [token for token in self.vocabulary if term in token]
+        tokens = []
+        i = bisect.bisect_left(self.vocabulary, term)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+            tokens.append(self.vocabulary[i])
+            i += 1
+        return tokens
+
+    def search(self, query, substring=False):
+        """
+        Find the entries matching every term of query
+
+        Args:
+            query (str): search terms
+            substring (bool): match terms anywhere within the indexed
+                              tokens instead of as their prefix
+
+        Returns:
+            list of matching entries, in index order
+        """
+        positions = None
+        for term in self.tokenize(query):
+            matched = set()
+            for token in self._matching_tokens(term, substring):
+                matched.update(self.postings[token])
+            positions = matched if positions is None else positions & matched
+        if positions is None:
+            return list(self.entries)
+        return [self.entries[i] for i in sorted(positions)]
+
+    def get(self, app_id):
+        """
+        Get the entry of the app with app_id or None
+        """
+        for position in self.postings.get(app_id.lower(), []):
+            if self.entries[position].get("id") == app_id:
+                return self.entries[position]
+        return None
+
+    def save(self, path):
+        """
+        Atomically write the search index to path
+        """
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                   prefix=".search-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"source": self.source,
+                           "entries": self.entries,
+                           "postings": self.postings},
+                          f, separators=(",", ":"))
+            os.rename(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path, index_files):
+        """
+        Load the search index from path. Returns None when it is missing,
+        unreadable or was not built from the current index_files.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("source") != cls.files_source(index_files):
+                return None
+            return cls(data["entries"], data["postings"], data["source"])
+        except (IOError, OSError, ValueError, KeyError, AttributeError):
+            return None
+
+    @staticmethod
+    def files_source(paths):
+        source = []
+        for path in paths:
+            st = os.stat(path)
+            source.append([st.st_mtime, st.st_size])
+        return source
+
+    @classmethod
+    def build(cls, index, index_files, path):
+        """
+        Build the search index of the parsed index_files and save it to
+        path. Failing to save is not fatal.
+        """
+        entries = index.get("nulecules") or []
+        try:
+            search_index = cls(entries, source=cls.files_source(index_files))
+        except OSError:
+            return cls(entries)
+        try:
+            search_index.save(path)
+        except (IOError, OSError) as e:
+            logger.warning("Unable to save the search index: %s", e)
+        return search_index
+
+
 class Index(object):
 
     """
@@ -51,63 +260,176 @@ class Index(object):
     """
 
     index_template = {"location": ".", "nulecules": []}
+    source_kinds = ("image", "directory", "url")
 
     def __init__(self):
 
-        self.index = deepcopy(self.index_template)
+        self._index = None
         self.index_location = os.path.join(Utils.getUserHome(), INDEX_LOCATION)
-        self._load_index_file(self.index_location)
+        self.sources_location = os.path.join(Utils.getUserHome(), INDEX_SOURCES)
+        self.shards_location = os.path.join(Utils.getUserHome(), INDEX_SHARDS)
+        self._sources = None
+        self._search_index = None
+
+    @property
+    def index(self):
+        # The index file is only loaded (and fetched) once it is needed
+        if self._index is None:
+            self._load_index_file(self.index_location)
+        return self._index
+
+    @index.setter
+    def index(self, index):
+        self._index = index
 
     def list(self):
         """
         This command lists all available Nulecule packaged applications in a
         properly formatted way.
         """
+        self._print_entries(self.index["nulecules"])
+
+    def search(self, query, substring=False):
+        """
+        List the Nulecule applications matching all terms of query by
+        their id, name, tags, description or providers.
+
+        Args:
+            query (str): search terms, matched as token prefixes
+            substring (bool): match the terms anywhere within the tokens
+        """
+        self._print_entries(self.find(query, substring))
+
+    def info(self, app_id):
+        """
+        Print the index entry of the Nulecule application app_id.
+        """
+        import anymarkup
+        print(anymarkup.serialize(self.get_entry(app_id), format="yaml"))
+
+    def find(self, query="", substring=False):
+        """
+        Get the entries of the Nulecule applications matching all terms of
+        query, all entries for an empty query.
+
+        Args:
+            query (str): search terms, matched as token prefixes
+            substring (bool): match the terms anywhere within the tokens
+
+        Returns:
+            list of matching entries, in index order
+        """
+        return self._get_search_index().search(query, substring)
 
-        # In order to "format" it correctly, find the largest length of 'name', 'id', and 'appversion'
+    def get_entry(self, app_id):
+        """
+        Get the index entry of the Nulecule application app_id.
+
+        Raises:
+            IndexException: app_id is not in the index
+        """
+        entry = self._get_search_index().get(app_id)
+        if entry is None:
+            raise IndexException("No application %s found in the index" % app_id)
+        return entry
+
+    def _print_entries(self, entries):
+        # Retrieve the entry information
+        rows = []
+        for entry in entries:
+            metadata = entry.get('metadata') or {}
+            # Get the list of providers (first letter), add brackets
+            providers = "{%s}" % ",".join(
+                provider[0].capitalize() for provider in entry.get("providers") or [])
+            rows.append((entry.get('id') or "",
+                         metadata.get('appversion') or "",
+                         providers,
+                         metadata.get('location') or INDEX_DEFAULT_IMAGE_LOCATION))
+
+        # In order to "format" it correctly, find the largest length of 'id', 'appversion' and 'location'
         # Set a minimum length of '7' due to the length of each column name
-        id_length = 7
-        app_length = 7
-        location_length = 7
-
-        # Loop through each 'nulecule' and retrieve the largest string length
-        for entry in self.index["nulecules"]:
-            id = entry.get('id') or ""
-            version = entry['metadata'].get('appversion') or ""
-            location = entry['metadata'].get('location') or INDEX_DEFAULT_IMAGE_LOCATION
-
-            if len(id) > id_length:
-                id_length = len(id)
-            if len(version) > app_length:
-                app_length = len(version)
-            if len(location) > location_length:
-                location_length = len(location)
+        id_length = max([7] + [len(row[0]) for row in rows])
+        app_length = max([7] + [len(row[1]) for row in rows])
+        location_length = max([7] + [len(row[3]) for row in rows])
 
         # Print out the "index bar" with the lengths
         index_format = ("{0:%s}  {1:%s}  {2:10} {3:%s}" % (id_length, app_length, location_length))
         print(index_format.format("ID", "VER", "PROVIDERS", "LOCATION"))
+        for row in rows:
+            print(index_format.format(*row))
 
-        # Loop through each entry of the index and spit out the formatted line
-        for entry in self.index["nulecules"]:
-            # Get the list of providers (first letter)
-            providers = ""
-            for provider in entry["providers"]:
-                providers = "%s,%s" % (providers, provider[0].capitalize())
-
-            # Remove the first element, add brackets
-            providers = "{%s}" % providers[1:]
-
-            # Retrieve the entry information
-            id = entry.get('id') or ""
-            version = entry['metadata'].get('appversion') or ""
-            location = entry['metadata'].get('location') or INDEX_DEFAULT_IMAGE_LOCATION
+    def _get_search_index(self):
+        """
+        Load the search index of the index files, rebuild it when any of
+        them changed since it was saved.
+        """
+        search_location = self.index_location + INDEX_SEARCH_SUFFIX
+        index_files = self._index_files()
+        search_index = None
+        if all(os.path.exists(f) for f in index_files):
+            # Reuse the search index loaded before by this instance
+            if self._search_index is not None and \
+                    self._search_index.source == SearchIndex.files_source(index_files):
+                return self._search_index
+            search_index = SearchIndex.load(search_location, index_files)
+        if search_index is None:
+            if self._search_index is not None:
+                # The index files changed since they were loaded
+                self._index = None
+            index = self.index
+            search_index = SearchIndex.build(index, self._index_files(),
+                                             search_location)
+        self._search_index = search_index
+        return search_index
+
+    @property
+    def sources(self):
+        """
+        Configured index sources, None when INDEX_SOURCES does not exist
+        and the single index image is used.
+        """
+        if self._sources is None and os.path.exists(self.sources_location):
+            self._sources = self._load_sources(self.sources_location)
+        return self._sources
 
-            # Print out the row
-            print(index_format.format(
-                id,
-                version,
-                providers,
-                location))
+    def _load_sources(self, sources_file):
+        """
+        Load and validate the index sources. Each source has a name and
+        one of an image, a directory of Nulecule applications or an url of
+        an index file.
+        """
+        import anymarkup
+        try:
+            sources = anymarkup.parse_file(sources_file).get("sources")
+        except Exception as e:
+            raise IndexException("Unable to load index sources from %s: %s" %
+                                 (sources_file, e))
+        if not isinstance(sources, list) or not sources:
+            raise IndexException("No index sources defined in %s" % sources_file)
+
+        names = set()
+        for source in sources:
+            if not isinstance(source, dict) or not source.get("name"):
+                raise IndexException("Index source without a name in %s" %
+                                     sources_file)
+            kinds = [k for k in self.source_kinds if source.get(k)]
+            if len(kinds) != 1:
+                raise IndexException(
+                    "Index source %s needs exactly one of: %s" %
+                    (source["name"], ", ".join(self.source_kinds)))
+            if source["name"] in names:
+                raise IndexException("Duplicate index source %s" % source["name"])
+            names.add(source["name"])
+        return sources
+
+    def _index_files(self):
+        if self.sources is None:
+            return [self.index_location]
+        return [self._shard_location(source) for source in self.sources]
+
+    def _shard_location(self, source):
+        return os.path.join(self.shards_location,
+                            Utils.sanitizeName(source["name"]) + ".yaml")
 
     def update(self, index_image=INDEX_IMAGE):
         """
@@ -117,67 +439,294 @@ class Index(object):
         """
 
         logger.info("Updating the index list")
-        logger.info("Pulling latest index image...")
-        self._fetch_index_container()
+        if self.sources is not None:
+            self._refresh_sources(self.sources)
+        else:
+            logger.info("Pulling latest index image...")
+            self._fetch_index_container(index_image, update=True)
+        self._load_index_file(self.index_location, fetch=False)
+        SearchIndex.build(self.index, self._index_files(),
+                          self.index_location + INDEX_SEARCH_SUFFIX)
         logger.info("Index updated")
 
+    def _refresh_sources(self, sources):
+        """
+        Refresh the shards of sources concurrently. Sources whose validator
+        did not change since the last refresh are skipped. A failing source
+        keeps its previous shard.
+        """
+        validators_location = os.path.join(self.shards_location, "sources.json")
+        try:
+            with open(validators_location) as f:
+                validators = json.load(f)
+        except (IOError, ValueError):
+            validators = {}
+        if not os.path.isdir(self.shards_location):
+            os.makedirs(self.shards_location)
+
+        def refresh(source):
+            try:
+                return (self._refresh_source(source, validators.get(source["name"])),
+                        None)
+            except Exception as e:
+                return (None, e)
+
+        pool = ThreadPool(len(sources))
+        try:
+            results = pool.map(refresh, sources)
+        finally:
+            pool.close()
+            pool.join()
+
+        failed = 0
+        for source, (validator, error) in zip(sources, results):
+            if error is not None:
+                logger.warning("Unable to refresh index source %s: %s",
+                               source["name"], error)
+                failed += 1
+            else:
+                validators[source["name"]] = validator
+
+        with open(validators_location, "w") as f:
+            json.dump(validators, f, indent=1, sort_keys=True)
+        if failed == len(sources):
+            raise IndexException("Unable to refresh any index source")
+
+    def _refresh_source(self, source, previous):
+        """
+        Refresh the shard of a single source if its validator changed.
+
+        Args:
+            source (dict): the index source
+            previous (str): validator of the last refresh of source
+
+        Returns:
+            str: the current validator of source
+        """
+        shard = self._shard_location(source)
+        if source.get("image"):
+            dh = DockerHandler()
+            dh.pull(source["image"], update=True)
+            validator = "image:%s" % dh.get_image_id(source["image"])
+        elif source.get("directory"):
+            validator = "directory:%s" % self._tree_validator(source["directory"])
+        else:
+            url = urlparse.urlparse(source["url"])
+            if url.scheme not in ("", "file"):
+                raise IndexException("Unsupported index source url %s" %
+                                     source["url"])
+            st = os.stat(url.path)
+            validator = "file:%s:%s" % (st.st_mtime, st.st_size)
+
+        if validator == previous and os.path.exists(shard):
+            logger.info("Index source %s is up to date", source["name"])
+            return validator
+
+        logger.info("Refreshing index source %s", source["name"])
+        if source.get("image"):
+            self._fetch_index_container(source["image"], shard)
+        elif source.get("directory"):
+            # A process pool would fork next to the other refresh threads
+            index = self._generate(source["directory"], shard, workers=1)
+            if not index["nulecules"]:
+                import anymarkup
+                anymarkup.serialize_file(index, shard, format="yaml")
+        else:
+            tmp = shard + ".tmp"
+            shutil.copyfile(url.path, tmp)
+            os.rename(tmp, shard)
+        return validator
+
+    @staticmethod
+    def _tree_validator(location):
+        """
+        Cheap validator of a directory tree from the names, sizes and
+        modification times of its files.
+        """
+        digest = hashlib.sha1()
+        for root, dirs, files in os.walk(location):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                digest.update("%s\0%s\0%r\0" % (
+                    os.path.relpath(path, location), st.st_size, st.st_mtime))
+        return digest.hexdigest()
+
     # TODO: Error out if the locaiton does not have a Nulecule file / dir
-    def generate(self, location, output_location=INDEX_GEN_DEFAULT_OUTPUT_LOC):
+    def generate(self, location, output_location=INDEX_GEN_DEFAULT_OUTPUT_LOC,
+                 workers=None):
         """
         Generate an index.yaml with a provided directory location
+
+        Apps whose content did not change since the previous run are not
+        loaded again, their entries are reused from the previous index file.
+        The content hashes are kept in a manifest next to output_location.
+        The remaining apps are loaded by a pool of worker processes.
+
+        Args:
+            location (str): directory with a Nulecule app in each subdirectory
+            output_location (str): path of the generated index file
+            workers (int): number of worker processes, defaults to the
+                           number of CPUs
+        """
+        self.index = self._generate(location, output_location, workers)
+        logger.info("index.yaml generated")
+
+    def _generate(self, location, output_location, workers=None):
+        """
+        Generate the index of location into output_location
+
+        Returns:
+            dict: the generated index
         """
         logger.info("Generating index.yaml from %s" % location)
-        self.index = deepcopy(self.index_template)
+        index = deepcopy(self.index_template)
 
         if not os.path.isdir(location):
             raise Exception("Location must be a directory")
 
-        for f in os.listdir(location):
+        manifest_location = output_location + INDEX_GEN_MANIFEST_SUFFIX
+        previous_hashes, previous_entries = self._load_generated_index(
+            location, output_location, manifest_location)
+
+        tasks = []
+        for f in sorted(os.listdir(location)):
             nulecule_dir = os.path.join(location, f)
             if f.startswith("."):
                 continue
             if os.path.isdir(nulecule_dir):
-                try:
-                    index_info = self._nulecule_get_info(nulecule_dir)
-                except NuleculeException as e:
-                    logger.warning("SKIPPING %s. %s" %
-                                   (nulecule_dir, e))
-                    continue
-                index_info["path"] = f
-                self.index["nulecules"].append(index_info)
-
-        if len(index_info) > 0:
-            anymarkup.serialize_file(self.index, output_location, format="yaml")
-        logger.info("index.yaml generated")
+                known_hash = previous_hashes.get(f) if f in previous_entries else None
+                tasks.append((nulecule_dir, f, known_hash))
+
+        hashes = {}
+        reused = 0
+        for name, digest, index_info, error in self._map_index_tasks(tasks, workers):
+            if error:
+                logger.warning("SKIPPING %s. %s" %
+                               (os.path.join(location, name), error))
+                continue
+            if index_info is None:
+                index_info = previous_entries[name]
+                reused += 1
+            hashes[name] = digest
+            index["nulecules"].append(index_info)
+        logger.debug("Reused %s unchanged index entries", reused)
+
+        if len(index["nulecules"]) > 0:
+            import anymarkup
+            anymarkup.serialize_file(index, output_location, format="yaml")
+            SearchIndex.build(index, [output_location],
+                              output_location + INDEX_SEARCH_SUFFIX)
+            with open(manifest_location, "w") as f:
+                json.dump({"location": os.path.abspath(location),
+                           "hashes": hashes}, f, indent=1, sort_keys=True)
+        return index
+
+    def _map_index_tasks(self, tasks, workers=None):
+        """
+        Run _index_nulecule_dir for each task, in a process pool when there
+        are enough of them. Results are returned in the order of tasks.
+        """
+        workers = workers or multiprocessing.cpu_count()
+        if workers < 2 or len(tasks) < INDEX_GEN_POOL_THRESHOLD:
+            return [_index_nulecule_dir(task) for task in tasks]
+
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        try:
+            return pool.map(_index_nulecule_dir, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _load_generated_index(self, location, output_location,
+                              manifest_location):
+        """
+        Load the content hashes and the entries of a previously generated
+        index of location. Both are empty when there is nothing to reuse.
 
-    def _fetch_index_container(self, index_image=INDEX_IMAGE):
+        Returns:
+            tuple (hashes, entries): dicts keyed by the path of the app
+        """
+        import anymarkup
+        try:
+            with open(manifest_location) as f:
+                manifest = json.load(f)
+            if manifest.get("location") != os.path.abspath(location):
+                return ({}, {})
+            previous = anymarkup.parse_file(output_location)
+            entries = dict((entry["path"], entry)
+                           for entry in previous.get("nulecules", [])
+                           if "path" in entry)
+        except Exception as e:
+            # Missing or malformed files, anymarkup raises its own exceptions
+            logger.debug("Not reusing the previous index: %s", e)
+            return ({}, {})
+        return (manifest.get("hashes", {}), entries)
+
+    def _fetch_index_container(self, index_image=INDEX_IMAGE,
+                               index_location=None, update=False):
         """
-        Fetch the index container
+        Fetch the index container and extract its index file to
+        index_location, the user's index file by default
         """
+        index_location = index_location or self.index_location
         # Create the ".atomicapp" dir if it does not exist
-        if not os.path.exists(os.path.dirname(self.index_location)):
+        if not os.path.exists(os.path.dirname(index_location)):
             try:
-                os.makedirs(os.path.dirname(self.index_location))
+                os.makedirs(os.path.dirname(index_location))
             except OSError as exc:  # Guard against race condition
                 if exc.errno != errno.EEXIST:
                     raise
 
         dh = DockerHandler()
-        dh.pull(index_image)
-        dh.extract_files(index_image, "/" + INDEX_NAME, self.index_location)
+        dh.pull(index_image, update=update)
+        dh.extract_files(index_image, "/" + INDEX_NAME, index_location)
 
-    def _load_index_file(self, index_file=INDEX_LOCATION):
+    def _load_index_file(self, index_file=INDEX_LOCATION, fetch=True):
         """
-        Load the index file. If it does not exist, fetch it.
+        Load the index file. If it does not exist, fetch it. With index
+        sources configured, the shards of all sources are merged instead,
+        the first source listing an application id wins.
         """
+        if self.sources is not None:
+            missing = [source for source in self.sources
+                       if not os.path.exists(self._shard_location(source))]
+            if missing and fetch:
+                logger.info("Retrieving index sources...")
+                try:
+                    self._refresh_sources(missing)
+                except IndexException:
+                    # Still list the sources that were fetched before
+                    if len(missing) == len(self.sources):
+                        raise
+
+            index = deepcopy(self.index_template)
+            seen = set()
+            for source in self.sources:
+                shard = self._shard_location(source)
+                if not os.path.exists(shard):
+                    continue
+                entries = Utils.parse_file_cached(
+                    shard, shard + INDEX_CACHE_SUFFIX).get("nulecules") or []
+                for entry in entries:
+                    if entry.get("id") in seen:
+                        continue
+                    seen.add(entry.get("id"))
+                    index["nulecules"].append(entry)
+            self.index = index
+            return
+
         # If the file/path does not exist, retrieve the index yaml
         if not os.path.exists(index_file):
             logger.warning("Couldn't load index file: %s", index_file)
             logger.info("Retrieving index...")
             self._fetch_index_container()
-        self.index = anymarkup.parse_file(index_file)
+        self.index = Utils.parse_file_cached(index_file,
+                                             index_file + INDEX_CACHE_SUFFIX)
 
-    def _nulecule_get_info(self, nulecule_dir):
+    @staticmethod
+    def _nulecule_get_info(nulecule_dir):
         """
         Get the required information in order to generate an index.yaml
         """
@@ -17,13 +17,13 @@
  You should have received a copy of the GNU Lesser General Public License
  along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
 """
-import anymarkup
+import json
 import logging
+import multiprocessing
 import os
-import yaml
 import re
+import threading
 
-from collections import defaultdict
 from string import Template
 
 from atomicapp.constants import (APP_ENT_PATH,
@@ -35,6 +35,7 @@ from atomicapp.constants import (APP_ENT_PATH,
                                  RESOURCE_KEY,
                                  PARAMS_KEY,
                                  NAME_KEY,
+                                 RENDER_POOL_THRESHOLD,
                                  INHERIT_KEY,
                                  ARTIFACTS_KEY,
                                  NAMESPACE_SEPARATOR)
@@ -43,14 +44,137 @@ from atomicapp.requirements import Requirements
 from atomicapp.nulecule.lib import NuleculeBase
 from atomicapp.nulecule.container import DockerHandler
 from atomicapp.nulecule.exceptions import NuleculeException
-from atomicapp.providers.openshift import OpenshiftProvider
 
-from jsonpointer import resolve_pointer, set_pointer, JsonPointerException
-from anymarkup import AnyMarkupError
+# anymarkup, jsonpointer and the providers are imported where they are
+# used to keep them off the startup path of the CLI
 
 cockpit_logger = logging.getLogger(LOGGER_COCKPIT)
 logger = logging.getLogger(LOGGER_DEFAULT)
 
+# Compiled pointer plans of artifact params, see _compile_pointers
+_pointer_plans = {}
+_pointer_plans_lock = threading.Lock()
+
+
+def _compile_pointers(params):
+    """
+    Compile the JSON pointers of artifact params into a trie of pointer
+    tokens, applied to an artifact in a single walk by _apply_pointers.
+    Plans are compiled once per process for the same params.
+
+    Args:
+        params (dict): list of pointers, or of comma separated pointers,
+                       by param name
+
+    Returns:
+        dict: trie node, children by unescaped token, and under the None
+              key the (name, pointer) tuples to set at the node
+
+    Raises:
+        NuleculeException: a pointer is not valid
+    """
+    key = json.dumps(params, sort_keys=True)
+    with _pointer_plans_lock:
+        plan = _pointer_plans.get(key)
+    if plan is not None:
+        return plan
+
+    plan = {}
+    for name, pointers in params.items():
+        if not pointers:
+            logger.warning("Could not find pointer for %s" % name)
+            continue
+        for pointer in pointers:
+            for pointer in pointer.split(','):
+                pointer = pointer.strip()
+                if not pointer.startswith('/'):
+                    raise NuleculeException(
+                        "Error replacing pointer %s with %s." % (pointer, name))
+                node = plan
+                for token in pointer.split('/')[1:]:
+                    token = token.replace('~1', '/').replace('~0', '~')
+                    node = node.setdefault(token, {})
+                node.setdefault(None, []).append((name, pointer))
+    with _pointer_plans_lock:
+        _pointer_plans[key] = plan
+    return plan
+
+
+def _apply_pointers(obj, node, applied):
+    """
+    Replace the values of obj at the pointers of a plan compiled by
+    _compile_pointers with the name of their param. Pointers that do not
+    resolve in obj are skipped, the applied ones are added to applied.
+    """
+    for token, child in node.items():
+        if token is None:
+            continue
+        if isinstance(obj, list):
+            if not token.isdigit() or int(token) >= len(obj):
+                continue
+            key = int(token)
+        elif isinstance(obj, dict):
+            if token not in obj:
+                continue
+            key = token
+        else:
+            continue
+        _apply_pointers(obj[key], child, applied)
+        for name, pointer in child.get(None, []):
+            obj[key] = name
+            applied.add(pointer)
+            logger.debug("Replaced %s pointer with %s param" % (pointer, name))
+
+
+def _render_artifact_content(path, params, context):
+    """
+    Render the content of an artifact file.
+
+    Args:
+        path (str): path of the artifact file
+        params (dict): params with the pointers to replace in it or None
+        context (dict): data to render in it
+
+    Returns:
+        str: rendered content
+    """
+    with open(path, 'r') as f:
+        content = f.read()
+    if params is not None:
+        content = NuleculeComponent.apply_pointers(content, params)
+    return Template(content).safe_substitute(context)
+
+
+def _write_rendered_artifact(render_path, content):
+    # The rendered file of an external application may be linked to
+    # the one of another component (see load_external_application),
+    # replace the file instead of writing through the link
+    if os.path.exists(render_path) and os.stat(render_path).st_nlink > 1:
+        os.unlink(render_path)
+    with open(render_path, 'w') as f:
+        f.write(content)
+
+
+def _render_artifact_file(args):
+    """
+    Render an artifact file to a file at the same level, with a dot '.'
+    prefixed to its name. This runs in the worker processes of
+    NuleculeComponent.render_jobs and so must stay a picklable module level
+    function.
+
+    Args:
+        args (tuple): path of the artifact file, params with the pointers
+                      to replace in it or None, and data to render in it
+
+    Returns:
+        str: path of the rendered artifact file
+    """
+    path, params, context = args
+    render_path = NuleculeComponent.get_render_path(path)
+    _write_rendered_artifact(render_path,
+                             _render_artifact_content(path, params, context))
+    return render_path
+
 
 class Nulecule(NuleculeBase):
 
@@ -88,10 +212,13 @@ class Nulecule(NuleculeBase):
         self.graph = graph
         self.requirements = requirements
         self.config = config
+        # External applications loaded during the run by source, shared
+        # with all the Nulecule applications of the run
+        self.external_apps = {}
 
     @classmethod
     def unpack(cls, image, dest, config=None, namespace=GLOBAL_CONF,
-               nodeps=False, dryrun=False, update=False):
+               nodeps=False, dryrun=False, update=False, external_apps=None):
         """
         Pull and extracts a docker image to the specified path, and loads
         the Nulecule application from the path.
@@ -106,6 +233,8 @@ class Nulecule(NuleculeBase):
                            True.
             update (bool): Don't update contents of destination directory
                            if False, else update it.
+            external_apps (dict): External applications already loaded
+                                  during the run, by source
 
         Returns:
             A Nulecule instance, or None in case of dry run.
@@ -114,6 +243,7 @@ class Nulecule(NuleculeBase):
         if Utils.running_on_openshift():
             # pass general config data containing provider specific data
             # to Openshift provider
+            from atomicapp.providers.openshift import OpenshiftProvider
             op = OpenshiftProvider(config.globals, './', False)
             op.artifacts = []
             op.init()
@@ -126,11 +256,12 @@ class Nulecule(NuleculeBase):
 
         return cls.load_from_path(
             dest, config=config, namespace=namespace, nodeps=nodeps,
-            dryrun=dryrun, update=update)
+            dryrun=dryrun, update=update, external_apps=external_apps)
 
     @classmethod
     def load_from_path(cls, src, config=None, namespace=GLOBAL_CONF,
-                       nodeps=False, dryrun=False, update=False):
+                       nodeps=False, dryrun=False, update=False,
+                       external_apps=None):
         """
         Load a Nulecule application from a path in the source path itself, or
         in the specified destination path.
@@ -143,6 +274,8 @@ class Nulecule(NuleculeBase):
             nodeps (bool): Do not pull external applications if True.
             dryrun (bool): Do not make any change to underlying host.
             update (bool): Update existing application if True, else reuse it.
+            external_apps (dict): External applications already loaded
+                                  during the run, by source
 
         Returns:
             A Nulecule instance or None in case of some dry run (fetching
@@ -150,21 +283,40 @@ class Nulecule(NuleculeBase):
         """
         nulecule_path = os.path.join(src, MAIN_FILE)
 
-        if os.path.exists(nulecule_path):
-            with open(nulecule_path, 'r') as f:
-                nulecule_data = f.read()
-        else:
+        if not os.path.exists(nulecule_path):
             raise NuleculeException("No Nulecule file exists in directory: %s" % src)
 
         if dryrun and not os.path.exists(nulecule_path):
             raise NuleculeException("Fetched Nulecule components are required to initiate dry-run. "
                                     "Please specify your app via atomicapp --dry-run /path/to/your-app")
 
+        nulecule_data = Utils.parse_spec_file(nulecule_path,
+                                              cls._parse_nulecule_file)
+
+        nulecule = Nulecule(config=config, basepath=src,
+                            namespace=namespace, **nulecule_data)
+        if external_apps is not None:
+            nulecule.external_apps = external_apps
+        nulecule.load_components(nodeps, dryrun)
+        return nulecule
+
+    @staticmethod
+    def _parse_nulecule_file(nulecule_path):
+        """
+        Parse a Nulecule file, pointing to the failing lines when it is
+        not valid JSON or YAML.
+        """
+        with open(nulecule_path, 'r') as f:
+            nulecule_data = f.read()
+
+        import anymarkup
+        import yaml
+
         # By default, AnyMarkup converts all formats to YAML when parsing.
         # Thus the rescue works either on JSON or YAML.
         try:
-            nulecule_data = anymarkup.parse(nulecule_data)
-        except (yaml.parser.ParserError, AnyMarkupError), e:
+            return anymarkup.parse(nulecule_data)
+        except (yaml.parser.ParserError, anymarkup.AnyMarkupError), e:
             line = re.search('line (\d+)', str(e)).group(1)
             column = re.search('column (\d+)', str(e)).group(1)
 
@@ -176,11 +328,6 @@ class Nulecule(NuleculeBase):
             raise NuleculeException("Failure parsing %s file. Validation error on line %s, column %s:\n%s"
                                     % (nulecule_path, line, column, output))
 
-        nulecule = Nulecule(config=config, basepath=src,
-                            namespace=namespace, **nulecule_data)
-        nulecule.load_components(nodeps, dryrun)
-        return nulecule
-
     def run(self, provider_key=None, dryrun=False):
         """
         Runs a nulecule application.
@@ -252,7 +399,8 @@ class Nulecule(NuleculeBase):
     def load_components(self, nodeps=False, dryrun=False):
         """
         Load components for the Nulecule application. Sets a list of
-        NuleculeComponent instances to self.components.
+        NuleculeComponent instances to self.components. External
+        applications of the components are loaded on first use.
 
         Args:
             nodeps (bool): When True, do not external dependencies of a
@@ -271,14 +419,54 @@ class Nulecule(NuleculeBase):
                 self._get_component_namespace(node_name), self.basepath,
                 source, node.get(PARAMS_KEY), node.get(ARTIFACTS_KEY),
                 self.config)
+            component.app_id = self.id
+            component.external_apps = self.external_apps
             component.load(nodeps, dryrun)
             components.append(component)
         self.components = components
 
+    def select_components(self, only=None, skip=None):
+        """
+        Keep only a subset of the components of the Nulecule application,
+        so that the external applications of the other components are never
+        pulled or parsed. Components are named by their namespace, e.g.
+        'web' for a component of the application, or 'web:db' for the
+        component 'db' of the external application of 'web'.
+
+        Args:
+            only (list): Names of the components to keep, with all their
+                         own components. Ancestors of the named components
+                         are kept with only the named components.
+            skip (list): Names of the components to drop, with all their
+                         own components.
+
+        Returns:
+            None
+        """
+        components = []
+        for component in self.components:
+            namespace = component.namespace
+            if skip and namespace in skip:
+                logger.info('Skipping component %s' % namespace)
+                continue
+            component_only = only
+            if only:
+                if namespace in only:
+                    component_only = None
+                elif not [name for name in only if name.startswith(
+                        namespace + NAMESPACE_SEPARATOR)]:
+                    logger.info('Skipping component %s' % namespace)
+                    continue
+            component.select_components(component_only, skip)
+            components.append(component)
+        self.components = components
+
     def render(self, provider_key=None, dryrun=False):
         """
         Render the artifact files for the entire Nulecule application from
-        config data.
+        config data. The artifacts of all the components, including the
+        ones of external applications, are rendered together, see
+        NuleculeComponent.render_jobs.
 
         Args:
             provider_key (str): Provider for which artifacts need to be
@@ -289,8 +477,24 @@ class Nulecule(NuleculeBase):
         Returns:
             None
         """
+        NuleculeComponent.render_jobs(self.get_render_jobs(provider_key))
+
+    def get_render_jobs(self, provider_key=None):
+        """
+        List the artifact files to render for the entire Nulecule
+        application, in the order of the components.
+
+        Args:
+            provider_key (str): Provider for which artifacts need to be
+                                rendered, or None for all providers.
+
+        Returns:
+            list: (component, provider, artifact path, context) tuples
+        """
+        jobs = []
         for component in self.components:
-            component.render(provider_key=provider_key, dryrun=dryrun)
+            jobs.extend(component.get_render_jobs(provider_key))
+        return jobs
 
     def _get_component_namespace(self, component_name):
         """
@@ -319,21 +523,48 @@ class NuleculeComponent(NuleculeBase):
     scope. It does not have direct access to props of sibling Nulecule
     components, but can request the value of sibling's property from its
     parent.
+
+    Large applications have many components, and `atomicapp serve` and
+    `atomicapp batch` keep many applications in memory at once: components
+    have no __dict__, and their caches and rendered artifacts are only
+    created when they are used.
     """
 
+    __slots__ = ('name', 'app_id', 'source', 'artifacts',
+                 'rendered_artifacts', 'external_apps', '_app', '_artifacts_by_provider',
+                 '_artifact_params', '_artifact_paths', '_load_args',
+                 '_selection')
+
     def __init__(self, name, basepath, source=None, params=None,
                  artifacts=None, config=None):
         super(NuleculeComponent, self).__init__(basepath, params, name)
         self.name = name
+        # Id of the Nulecule application of the component, set by the
+        # parent
+        self.app_id = None
         self.source = source
         self.artifacts = artifacts
-        self.rendered_artifacts = defaultdict(list)
+        # Rendered artifact paths by provider, until they are handed over
+        # to the provider
+        self.rendered_artifacts = None
         self._app = None
         self.config = config
+        # External applications loaded during the run, set by the parent
+        self.external_apps = {}
+        # Resolved artifacts with their params, by provider, the params of
+        # each artifact path, by provider, and the artifact paths of the
+        # artifact files and directories of the Nulecule file
+        self._artifacts_by_provider = None
+        self._artifact_params = None
+        self._artifact_paths = None
+        # Arguments for loading the external application on first use
+        self._load_args = None
+        self._selection = None
 
     def load(self, nodeps=False, dryrun=False):
         """
-        Load external application of the Nulecule component.
+        Prepare loading the external application of the Nulecule component.
+        The application is pulled and loaded on first use, see app.
         """
         cockpit_logger.info("Loading app %s ." % self.name)
         if self.source:
@@ -341,18 +572,44 @@ class NuleculeComponent(NuleculeBase):
                 logger.info(
                     'Skipping to load external application: %s' % self.name)
             else:
-                self.load_external_application(dryrun)
+                self._load_args = (dryrun,)
+
+    @property
+    def app(self):
+        """
+        The external Nulecule application of the component, loaded on
+        first access, or None.
+        """
+        if self._app is None and self._load_args is not None:
+            load_args, self._load_args = self._load_args, None
+            self.load_external_application(*load_args)
+            if self._app is not None and self._selection:
+                self._app.select_components(*self._selection)
+        return self._app
+
+    def select_components(self, only=None, skip=None):
+        """
+        Select the components of the external application of the component,
+        see Nulecule.select_components.
+        """
+        if not only and not skip:
+            return
+        self._selection = (only, skip)
+        if self._app is not None:
+            self._app.select_components(only, skip)
 
     def run(self, provider_key, dryrun=False):
         """
         Run the Nulecule component with the specified provider,
         """
         cockpit_logger.info("Deploying component %s ..." % self.name)
-        if self._app:
-            self._app.run(provider_key, dryrun)
+        if self.app:
+            self.app.run(provider_key, dryrun)
             return
         provider_key, provider = self.get_provider(provider_key, dryrun)
-        provider.artifacts = self.rendered_artifacts.get(provider_key, [])
+        provider.artifacts = self._release_rendered_artifacts(provider_key)
+        provider.app_id = self.app_id
+        provider.component = self.name
         provider.init()
         provider.run()
 
@@ -360,14 +617,33 @@ class NuleculeComponent(NuleculeBase):
         """
         Stop the Nulecule component with the specified provider.
         """
-        if self._app:
-            self._app.stop(provider_key, dryrun)
+        if self.app:
+            self.app.stop(provider_key, dryrun)
             return
         provider_key, provider = self.get_provider(provider_key, dryrun)
-        provider.artifacts = self.rendered_artifacts.get(provider_key, [])
+        provider.artifacts = self._release_rendered_artifacts(provider_key)
+        provider.app_id = self.app_id
+        provider.component = self.name
         provider.init()
         provider.stop()
 
+    def _add_rendered_artifact(self, provider_key, path):
+        if self.rendered_artifacts is None:
+            self.rendered_artifacts = {}
+        self.rendered_artifacts.setdefault(provider_key, []).append(path)
+
+    def _release_rendered_artifacts(self, provider_key):
+        """
+        The rendered artifacts for a provider, which the component does
+        not keep once they are handed over to the provider.
+        """
+        if not self.rendered_artifacts:
+            return []
+        artifacts = self.rendered_artifacts.pop(provider_key, [])
+        if not self.rendered_artifacts:
+            self.rendered_artifacts = None
+        return artifacts
+
     def load_config(self, config=None, ask=False, skip_asking=False):
         """
         Load config for the Nulecule component.
@@ -376,14 +652,21 @@ class NuleculeComponent(NuleculeBase):
             config = self.config
         super(NuleculeComponent, self).load_config(
             config, ask=ask, skip_asking=skip_asking)
-        if isinstance(self._app, Nulecule):
-            self._app.load_config(config=self.config,
-                                  ask=ask, skip_asking=skip_asking)
+        if isinstance(self.app, Nulecule):
+            self.app.load_config(config=self.config,
+                                 ask=ask, skip_asking=skip_asking)
 
     def load_external_application(self, dryrun=False, update=False):
         """
         Loads an external application for the NuleculeComponent.
 
+        Every source is extracted once per run. When other components of
+        the run (e.g. two apps depending on the same database app) refer
+        to a source that was already extracted, the files are linked from
+        the first extraction and are parsed only once. Each component still
+        loads its own Nulecule instance, so that the application is
+        configured and rendered in the namespace of the component.
+
         Args:
             dryrun (bool): When True, skips pulling an external application.
             update (bool): When True, it ignores an already pulled external
@@ -396,13 +679,29 @@ class NuleculeComponent(NuleculeBase):
         nulecule = None
         external_app_path = os.path.join(
             self.basepath, EXTERNAL_APP_DIR, self.name)
-        if os.path.isdir(external_app_path) and not update:
+        shared_app_path = self.external_apps.get(self.source)
+        if shared_app_path and shared_app_path != external_app_path and \
+                not dryrun and os.path.isdir(shared_app_path) and \
+                (update or not os.path.isdir(external_app_path)):
+            logger.info('Linking external application %s from %s' %
+                        (self.name, shared_app_path))
+            copied = Utils.copy_dir(shared_app_path, external_app_path,
+                                    update=True, link=True)
+            Utils.trackOwnership(os.path.dirname(external_app_path),
+                                 recursive=False)
+            Utils.trackOwnership(external_app_path, recursive=False)
+            for path in copied:
+                Utils.trackOwnership(path, recursive=False)
+            nulecule = Nulecule.load_from_path(
+                external_app_path, dryrun=dryrun, update=update,
+                namespace=self.namespace, external_apps=self.external_apps)
+        elif os.path.isdir(external_app_path) and not update:
             logger.info(
                 'Found existing external application: %s '
                 'Loading: ' % self.name)
             nulecule = Nulecule.load_from_path(
                 external_app_path, dryrun=dryrun, update=update,
-                namespace=self.namespace)
+                namespace=self.namespace, external_apps=self.external_apps)
         elif not dryrun:
             logger.info('Pulling external application: %s' % self.name)
             nulecule = Nulecule.unpack(
@@ -411,13 +710,17 @@ class NuleculeComponent(NuleculeBase):
                 config=self.config,
                 namespace=self.namespace,
                 dryrun=dryrun,
-                update=update
+                update=update,
+                external_apps=self.external_apps
             )
 
             # When pulling an external application, make sure that the
-            # "external" folder is owned by the respective user extracting it
-            # by providing the basepath of the extraction
-            Utils.setFileOwnerGroup(self.basepath)
+            # "external" folder is owned by the respective user extracting it,
+            # the application itself is tracked when it is extracted
+            Utils.trackOwnership(os.path.dirname(external_app_path),
+                                 recursive=False)
+        if nulecule is not None:
+            self.external_apps.setdefault(self.source, external_app_path)
         self._app = nulecule
         cockpit_logger.info("Copied app successfully.")
 
@@ -427,8 +730,8 @@ class NuleculeComponent(NuleculeBase):
         If the Nulecule component is an external application, list Nulecule
         components of the external Nulecule application.
         """
-        if self._app:
-            return self._app.components
+        if self.app:
+            return self.app.components
 
     def render(self, provider_key=None, dryrun=False):
         """
@@ -443,9 +746,24 @@ class NuleculeComponent(NuleculeBase):
         Returns:
             None
         """
-        if self._app:
-            self._app.render(provider_key=provider_key, dryrun=dryrun)
+        if self.app:
+            self.app.render(provider_key=provider_key, dryrun=dryrun)
             return
+        self.render_jobs(self.get_render_jobs(provider_key))
+
+    def get_render_jobs(self, provider_key=None):
+        """
+        List the artifact files to render for the Nulecule component, or
+        for its external application.
+
+        Args:
+            provider_key (str or None): Provider name.
+
+        Returns:
+            list: (component, provider, artifact path, context) tuples
+        """
+        if self.app:
+            return self.app.get_render_jobs(provider_key)
 
         if self.artifacts is None:
             raise NuleculeException(
@@ -455,13 +773,59 @@ class NuleculeComponent(NuleculeBase):
                 "Data for provider \"%s\" are not part of this app"
                 % provider_key)
         context = self.config.context(self.namespace)
+        jobs = []
         for provider in self.artifacts:
             if provider_key and provider != provider_key:
                 continue
             for artifact_path in self.get_artifact_paths_for_provider(
                     provider):
-                self.rendered_artifacts[provider].append(
-                    self.render_artifact(artifact_path, context, provider))
+                jobs.append((self, provider, artifact_path, context))
+        return jobs
+
+    @staticmethod
+    def render_jobs(jobs, workers=None):
+        """
+        Render artifact files and add them to the rendered artifacts of
+        their components, in the order of jobs. Many artifacts are rendered
+        in a process pool, parsing and substituting them on all cores.
+
+        Worker threads of `atomicapp serve` and `atomicapp batch` render
+        in their own thread, forking from them could deadlock on locks held
+        by the other threads, and they render several apps in parallel
+        already.
+
+        Args:
+            jobs (list): (component, provider, artifact path, context)
+                         tuples, see get_render_jobs
+            workers (int): number of processes, the number of cores by
+                           default
+
+        Returns:
+            None
+        """
+        workers = workers or multiprocessing.cpu_count()
+        if workers < 2 or len(jobs) < RENDER_POOL_THRESHOLD or \
+                not isinstance(threading.current_thread(),
+                               threading._MainThread):
+            for component, provider, path, context in jobs:
+                component._add_rendered_artifact(
+                    provider,
+                    component.render_artifact(path, context, provider))
+            return
+
+        tasks = [(path, component.grab_artifact_params(provider, path),
+                  context)
+                 for component, provider, path, context in jobs]
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        try:
+            render_paths = pool.map(_render_artifact_file, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        for (component, provider, _, _), render_path in zip(jobs,
+                                                            render_paths):
+            component._add_rendered_artifact(
+                provider, component._relative_path(render_path))
 
     def get_artifact_paths_for_provider(self, provider_key):
         """
@@ -473,6 +837,39 @@ class NuleculeComponent(NuleculeBase):
         Returns:
             list: A list of artifact paths.
         """
+        return [path for path, params in
+                self._get_artifacts_for_provider(provider_key)]
+
+    def _get_artifacts_for_provider(self, provider_key, inheriting=()):
+        """
+        Get artifact file paths of a Nulecule component for a provider,
+        with the params of the artifact entry each path comes from. The
+        inherited providers are resolved once per component, the result is
+        memoized.
+
+        Args:
+            provider_key (str): Provider name
+            inheriting (tuple): Providers inheriting from provider_key,
+                                being resolved
+
+        Returns:
+            list: (path, params) tuples, params is None when the entry has
+                  no params
+
+        Raises:
+            NuleculeException: there are no artifacts for the provider, or
+                               the providers inherit from each other
+        """
+        if self._artifacts_by_provider is None:
+            self._artifacts_by_provider = {}
+            self._artifact_paths = {}
+        if provider_key in self._artifacts_by_provider:
+            return self._artifacts_by_provider[provider_key]
+        if provider_key in inheriting:
+            raise NuleculeException(
+                "Artifacts of provider %s inherit from themselves: %s"
+                % (provider_key, " -> ".join(inheriting + (provider_key,))))
+
         artifact_paths = []
         artifacts = self.artifacts.get(provider_key)
 
@@ -483,8 +880,10 @@ class NuleculeComponent(NuleculeBase):
                 "No artifacts for provider {}".format(provider_key))
 
         for artifact in artifacts:
+            params = None
             # Convert dict if the Nulecule file references "resource"
             if isinstance(artifact, dict) and artifact.get(RESOURCE_KEY):
+                params = artifact.get(PARAMS_KEY)
                 artifact = artifact[RESOURCE_KEY]
                 logger.debug("Resource xpath added: %s" % artifact)
 
@@ -493,38 +892,56 @@ class NuleculeComponent(NuleculeBase):
                 path = Utils.sanitizePath(artifact)
                 path = os.path.join(self.basepath, path) \
                     if path[0] != '/' else path
-                artifact_paths.extend(self._get_artifact_paths_for_path(path))
+                if path not in self._artifact_paths:
+                    self._artifact_paths[path] = \
+                        self._get_artifact_paths_for_path(path)
+                artifact_paths.extend(
+                    (artifact_path, params) for artifact_path in
+                    self._artifact_paths[path])
 
             # Inherit if inherit name is referenced
             elif isinstance(artifact, dict) and artifact.get(INHERIT_KEY) and \
                     isinstance(artifact.get(INHERIT_KEY), list):
                 for inherited_provider_key in artifact.get(INHERIT_KEY):
                     artifact_paths.extend(
-                        self.get_artifact_paths_for_provider(
-                            inherited_provider_key)
+                        self._get_artifacts_for_provider(
+                            inherited_provider_key,
+                            inheriting + (provider_key,))
                     )
             else:
                 logger.error('Invalid artifact file')
+        self._artifacts_by_provider[provider_key] = artifact_paths
         return artifact_paths
 
-    def grab_artifact_params(self, provider):
+    def grab_artifact_params(self, provider, path=None):
         """
         Check to see if params exist in the artifact. If so, return it.
 
         Args:
             provider(str): name of the provider
+            path(str): path of the artifact file, the params of the
+                       artifact entry it comes from are returned. Without
+                       path, the params of the first artifact entry.
 
         Returns:
             str (dict): list of params
 
         """
+        if path is not None:
+            if self._artifact_params is None:
+                self._artifact_params = {}
+            if provider not in self._artifact_params:
+                self._artifact_params[provider] = dict(
+                    self._get_artifacts_for_provider(provider))
+            return self._artifact_params[provider].get(path)
         artifact = self.artifacts.get(provider)[0]
-        if PARAMS_KEY in artifact:
+        if isinstance(artifact, dict) and PARAMS_KEY in artifact:
             return artifact.get(PARAMS_KEY)
         else:
             return None
 
-    def apply_pointers(self, content, params):
+    @staticmethod
+    def apply_pointers(content, params):
         """
         Let's apply all the json pointers!
         Valid params in Nulecule:
@@ -536,6 +953,12 @@ class NuleculeComponent(NuleculeBase):
             param1:
                 - /spec/containers/0/ports/0/hostPort, /spec/containers/0/ports/0/hostPort2
 
+        The pointers are compiled into a trie once and applied in a single
+        walk of the artifact. Artifacts with several YAML documents, and
+        'kind: List' bundles, are supported: pointers are applied to every
+        document and every item of a List they resolve in. A pointer that
+        does not resolve anywhere is an error.
+
         Args:
             content (str): content of artifact file
             params (dict): list of params with pointers to replace in content
@@ -547,32 +970,50 @@ class NuleculeComponent(NuleculeBase):
             In the future we need to change this to detect haml, yaml, etc as we add more providers
             Blocked by: github.com/bkabrda/anymarkup-core/blob/master/anymarkup_core/__init__.py#L393
         """
-        obj = anymarkup.parse(content)
-
-        if type(obj) != dict:
-            logger.debug("Artifact file not json/haml, assuming it's $VARIABLE substitution")
-            return content
-
-        if params is None:
+        if not params:
             # Nothing to do here!
             return content
 
-        for name, pointers in params.items():
-
-            if not pointers:
-                logger.warning("Could not find pointer for %s" % name)
-                continue
+        import anymarkup
+        try:
+            docs = [anymarkup.parse(content)]
+        except anymarkup.AnyMarkupError:
+            # anymarkup only parses single documents
+            import yaml
+            try:
+                docs = [doc for doc in yaml.safe_load_all(content)
+                        if doc is not None]
+            except yaml.YAMLError:
+                raise NuleculeException(
+                    "Unable to parse artifact to replace pointers of %s"
+                    % ", ".join(sorted(params)))
+
+        if not [doc for doc in docs if isinstance(doc, dict)]:
+            logger.debug("Artifact file not json/haml, assuming it's $VARIABLE substitution")
+            return content
 
-            for pointer in pointers:
-                try:
-                    resolve_pointer(obj, pointer)
-                    set_pointer(obj, pointer, name)
-                    logger.debug("Replaced %s pointer with %s param" % (pointer, name))
-                except JsonPointerException:
-                    logger.debug("Error replacing %s with %s" % (pointer, name))
-                    logger.debug("Artifact content: %s", obj)
-                    raise NuleculeException("Error replacing pointer %s with %s." % (pointer, name))
-        return anymarkup.serialize(obj, format="json")
+        plan = _compile_pointers(params)
+        applied = set()
+        for doc in docs:
+            _apply_pointers(doc, plan, applied)
+            if isinstance(doc, dict) and doc.get('kind') == 'List' and \
+                    isinstance(doc.get('items'), list):
+                for item in doc['items']:
+                    _apply_pointers(item, plan, applied)
+
+        for name, pointers in sorted(params.items()):
+            for pointer in pointers or []:
+                for pointer in pointer.split(','):
+                    if pointer.strip() not in applied:
+                        logger.debug("Artifact content: %s", docs)
+                        raise NuleculeException(
+                            "Error replacing pointer %s with %s."
+                            % (pointer.strip(), name))
+
+        if len(docs) == 1:
+            return anymarkup.serialize(docs[0], format="json")
+        import yaml
+        return yaml.safe_dump_all(docs, default_flow_style=False)
 
     def render_artifact(self, path, context, provider):
         """
@@ -589,24 +1030,57 @@ class NuleculeComponent(NuleculeBase):
             str: Relative path to the rendered artifact file from the
                  immediate parent Nuelcule application
         """
-        basepath, tail = os.path.split(path)
-        render_path = os.path.join(basepath, '.{}'.format(tail))
+        render_path = _render_artifact_file(
+            (path, self.grab_artifact_params(provider, path), context))
+        return self._relative_path(render_path)
 
-        with open(path, 'r') as f:
-            content = f.read()
-            params = self.grab_artifact_params(provider)
-            if params is not None:
-                content = self.apply_pointers(content, params)
-            template = Template(content)
-            rendered_content = template.safe_substitute(context)
+    def render_artifact_content(self, path, context, provider):
+        """
+        Render artifact file at path with context, without writing it.
 
-        with open(render_path, 'w') as f:
-            f.write(rendered_content)
+        Args:
+            path (str): path to the artifact file
+            context (dict): data to render in the artifact file
+            provider (str): what provider is being used
 
-        render_path = render_path.split(
+        Returns:
+            str: rendered content of the artifact file
+        """
+        return _render_artifact_content(
+            path, self.grab_artifact_params(provider, path), context)
+
+    def write_rendered_artifact(self, path, content):
+        """
+        Write the rendered content of the artifact file at path, see
+        render_artifact.
+
+        Args:
+            path (str): path to the artifact file
+            content (str): rendered content of the artifact file
+
+        Returns:
+            str: Relative path to the rendered artifact file from the
+                 immediate parent Nuelcule application
+        """
+        render_path = self.get_render_path(path)
+        _write_rendered_artifact(render_path, content)
+        return self._relative_path(render_path)
+
+    @staticmethod
+    def get_render_path(path):
+        """
+        Path of the rendered file of the artifact file at path.
+        """
+        basepath, tail = os.path.split(path)
+        return os.path.join(basepath, '.{}'.format(tail))
+
+    def _relative_path(self, path):
+        """
+        Path relative to the immediate parent Nulecule application.
+        """
+        return path.split(
             self.basepath + ('' if self.basepath.endswith('/') else '/'),
             1)[1]
-        return render_path
 
     def _get_artifact_paths_for_path(self, path):
         """
@@ -627,9 +1101,10 @@ class NuleculeComponent(NuleculeBase):
         if os.path.isfile(path):
             artifact_paths.append(path)
         elif os.path.isdir(path):
-            if os.listdir(path) == []:
+            dir_children = os.listdir(path)
+            if dir_children == []:
                 raise NuleculeException("Artifact directory %s is empty" % path)
-            for dir_child in os.listdir(path):
+            for dir_child in dir_children:
                 dir_child_path = os.path.join(path, dir_child)
                 if dir_child.startswith('.') or os.path.isdir(dir_child_path):
                     continue
@@ -165,7 +165,7 @@ class Config(object):
             raise
 
         # clean up source data
-        for k in self._data[source]:
+        for k in list(self._data[source]):
             self._data[source].pop(k)
 
         for scope, data in data.items():
@@ -16,12 +16,21 @@
  You should have received a copy of the GNU Lesser General Public License
  along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
 """
+import json
 import os
 import subprocess
+import tempfile
+import threading
+import time
 import uuid
 import logging
+from distutils.spawn import find_executable
 
-from atomicapp.constants import (LOGGER_COCKPIT,
+from atomicapp.constants import (DOCKER_DEFAULT_HOST,
+                                 DOCKER_IMAGES_TTL,
+                                 DOCKER_PROBE_CACHE,
+                                 DOCKER_PROBE_TTL,
+                                 LOGGER_COCKPIT,
                                  LOGGER_DEFAULT,
                                  MAIN_FILE)
 from atomicapp.utils import Utils
@@ -35,31 +44,191 @@ class DockerHandler(object):
 
     """Interface to interact with Docker."""
 
+    # Capability probes done by this process, keyed by daemon and client
+    _probes = {}
+    # Local images by daemon and client: (time listed, set of names)
+    _images = {}
+    _images_lock = threading.Lock()
+
     def __init__(self, dryrun=False, docker_cli='/usr/bin/docker'):
         self.dryrun = dryrun
         self.docker_cli = docker_cli
+        self.capabilities = None
 
         # Check to make sure the docker client in the container and
         # the server on the host can communicate.
         if not dryrun:
+            self.capabilities = self.probe(docker_cli)
+
+    @classmethod
+    def probe(cls, docker_cli='docker'):
+        """
+        Find out the client and server versions of Docker. The result is
+        probed once per process and cached on disk for DOCKER_PROBE_TTL
+        seconds, keyed by the daemon (DOCKER_HOST) and the docker client used.
+
+        Args:
+            docker_cli (str): Docker client to probe with
+
+        Returns:
+            dict: {'client': {'version': str, 'api_version': str},
+                   'server': {'version': str, 'api_version': str}}
+
+        Raises:
+            DockerException: docker client can not talk to the daemon
+        """
+        key = cls._daemon_key(docker_cli)
+        if key in cls._probes:
+            return cls._probes[key]
+
+        cache_file = os.path.join(Utils.getUserHome(), DOCKER_PROBE_CACHE)
+        cache = cls._load_probe_cache(cache_file)
+        entry = cache.get(key)
+        if entry and 0 <= time.time() - entry['time'] < DOCKER_PROBE_TTL:
+            logger.debug("Using cached docker capabilities for %s", key)
+        else:
+            entry = {'time': time.time(),
+                     'data': cls._probe_docker_version(docker_cli)}
+            cache[key] = entry
+            cls._save_probe_cache(cache_file, cache)
+
+        cls._probes[key] = entry['data']
+        return entry['data']
+
+    @staticmethod
+    def _daemon_key(docker_cli):
+        # 'docker' found in PATH and '/usr/bin/docker' are the same client
+        docker_cli = os.path.realpath(find_executable(docker_cli) or docker_cli)
+        return "%s|%s" % (os.environ.get('DOCKER_HOST') or DOCKER_DEFAULT_HOST,
+                          docker_cli)
+
+    @staticmethod
+    def _load_probe_cache(cache_file):
+        try:
+            with open(cache_file) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_probe_cache(cache_file, cache):
+        cache_dir = os.path.dirname(cache_file)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.rename(tmp, cache_file)
+        except (IOError, OSError) as e:
+            logger.debug("Unable to cache docker capabilities in %s: %s",
+                         cache_file, e)
+
+    @classmethod
+    def _probe_docker_version(cls, docker_cli):
+        """
+        Run 'docker version' and parse its output. The structured JSON
+        output is used when the client supports it, else the plain text
+        output is parsed.
+        """
+        try:
+            output = subprocess.check_output(
+                [docker_cli, 'version', '--format', '{{json .}}'],
+                stderr=subprocess.STDOUT)
+            for line in reversed(output.splitlines()):
+                if line.startswith('{'):
+                    return cls._parse_version_json(json.loads(line))
+        except subprocess.CalledProcessError as e:
+            # Only old clients without --format support fall through
+            if 'flag provided but not defined' not in e.output and \
+                    'unknown flag' not in e.output:
+                raise cls._version_error(e.output)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug("Unable to get structured docker version: %s", e)
+
+        try:
+            output = subprocess.check_output([docker_cli, 'version'],
+                                             stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as e:
+            raise cls._version_error(e.output)
+        except OSError as e:
+            raise DockerException("Unable to run docker client %s: %s" %
+                                  (docker_cli, e))
+        return cls._parse_version_text(output)
+
+    @staticmethod
+    def _parse_version_json(data):
+        result = {}
+        for section in ('client', 'server'):
+            info = data.get(section.capitalize()) or {}
+            result[section] = {'version': info.get('Version'),
+                               'api_version': info.get('ApiVersion')}
+        return result
+
+    @staticmethod
+    def _parse_version_text(output):
+        """
+        Parse both the old ('Client API version: 1.21') and the sectioned
+        ('Client:' followed by ' API version: 1.22') formats of
+        'docker version'.
+        """
+        result = {'client': {'version': None, 'api_version': None},
+                  'server': {'version': None, 'api_version': None}}
+        section = None
+        for line in output.splitlines():
+            if not line.strip() or ':' not in line:
+                continue
+            name, value = [part.strip() for part in line.split(':', 1)]
+            name = name.lower()
+            if not value and name in result:
+                section = name
+                continue
+            words = name.split()
+            if words and words[0] in result:
+                section, words = words[0], words[1:]
+            if section is None:
+                continue
+            if words == ['version']:
+                result[section]['version'] = value
+            elif words == ['api', 'version']:
+                # Newer clients append '(minimum version ...)'
+                result[section]['api_version'] = value.split()[0]
+        return result
+
+    @staticmethod
+    def _version_error(output):
+        if "client and server don't have same version" in output \
+                or "client is newer than server" in output:
+            return DockerException("\nThe docker version in this "
+                                   "Atomic App differs greatly from "
+                                   "the host version.\nPlease use a "
+                                   "different Atomic App version for "
+                                   "this host.\n")
+        elif "Is your docker daemon up and running" in output or \
+             "Are you trying to connect to a TLS-enabled daemon " \
+             "without TLS" in output:
+            return DockerException("Could not connect to the "
+                                   "docker daemon.")
+        return DockerException(output)
+
+    @staticmethod
+    def api_version_tuple(version):
+        """
+        Convert an API version string such as '1.22' to a tuple of ints
+        so that versions can be compared numerically.
+
+        Raises:
+            DockerException: the version is missing or not a version
+        """
+        parts = []
+        for part in (version or '').split('.'):
             try:
-                subprocess.check_output([docker_cli, 'version'],
-                                        stderr=subprocess.STDOUT)
-            except subprocess.CalledProcessError as e:
-                if "client and server don't have same version" in e.output \
-                        or "client is newer than server" in e.output:
-                    raise DockerException("\nThe docker version in this "
-                                          "Atomic App differs greatly from "
-                                          "the host version.\nPlease use a "
-                                          "different Atomic App version for "
-                                          "this host.\n")
-                elif "Is your docker daemon up and running" in e.output or \
-                     "Are you trying to connect to a TLS-enabled daemon " \
-                     "without TLS" in e.output:
-                    raise DockerException("Could not connect to the "
-                                          "docker daemon.")
-                else:
-                    raise DockerException(e.output)
+                parts.append(int(part))
+            except ValueError:
+                break
+        if not parts:
+            raise DockerException("Unknown Docker API version: %s" % version)
+        return tuple(parts)
 
     def pull(self, image, update=False):
         """
@@ -90,6 +259,7 @@ class DockerHandler(object):
             subprocess.check_output(pull_cmd, stderr=subprocess.STDOUT)
         except subprocess.CalledProcessError as e:
             raise DockerException("Could not pull docker image: %s.\n%s" % (image, e.output))
+        self._add_image(image)
 
         cockpit_logger.info('Skipping pulling docker image: %s' % image)
 
@@ -136,7 +306,7 @@ class DockerHandler(object):
             raise DockerException('Removing docker container failed: %s. \n%s' % (rm_cmd, e.output))
 
         # Set the proper permissions on the extracted folder
-        Utils.setFileOwnerGroup(dest)
+        Utils.trackOwnership(dest)
 
     def extract_nulecule_data(self, image, source, dest, update=False):
         """
@@ -183,16 +353,38 @@ class DockerHandler(object):
                 logger.info("App exists locally and no update requested")
                 return
 
-        # Copy files from tmpdir into place
+        # Copy files from tmpdir into place, the tmpdir is removed right
+        # after so its files can be hardlinked
         logger.debug('Copying nulecule data from %s to %s' % (tmpdir, dest))
-        Utils.copy_dir(tmpdir, dest, update)
+        copied = Utils.copy_dir(tmpdir, dest, update, link=True)
 
         # Clean up tmpdir
         logger.debug('Removing tmp dir: %s' % tmpdir)
         Utils.rm_dir(tmpdir)
 
-        # Set the proper permissions on the extracted folder
-        Utils.setFileOwnerGroup(dest)
+        # Set the proper permissions on what was copied into the folder
+        Utils.trackOwnership(dest, recursive=False)
+        for path in copied:
+            Utils.trackOwnership(path, recursive=False)
+
+    def get_image_id(self, image):
+        """
+        Get the id of a Docker image present in the host.
+
+        Args:
+            image (str): Docker image name.
+
+        Returns:
+            str: image id, None if the image is not present
+        """
+        if self.dryrun:
+            return None
+        try:
+            return subprocess.check_output(
+                [self.docker_cli, 'inspect', '--format', '{{.Id}}', image],
+                stderr=subprocess.STDOUT).strip()
+        except subprocess.CalledProcessError:
+            return None
 
     def is_image_present(self, image):
         """
@@ -208,14 +400,41 @@ class DockerHandler(object):
         if self.dryrun:
             return True
 
-        output = subprocess.check_output([self.docker_cli, 'images'])
-        image_lines = output.strip().splitlines()[1:]
-        for line in image_lines:
-            words = line.split()
-            image_name = words[0]
+        for image_name in self._list_images():
             registry = repo = None
             if '/' in image_name:
                 registry, repo = image_name.split('/', 1)
             if image_name == image or repo == image:
                 return True
         return False
+
+    def _list_images(self):
+        """
+        Names of the images present in the host. The list is shared by
+        all handlers of the process and reused for DOCKER_IMAGES_TTL
+        seconds, images pulled meanwhile are added to it.
+
+        Returns:
+            set: image names (without tags)
+        """
+        key = self._daemon_key(self.docker_cli)
+        with self._images_lock:
+            listed, names = self._images.get(key, (None, None))
+            if listed is not None and 0 <= time.time() - listed < DOCKER_IMAGES_TTL:
+                return set(names)
+
+        output = subprocess.check_output([self.docker_cli, 'images'])
+        names = set(line.split()[0]
+                    for line in output.strip().splitlines()[1:] if line.strip())
+        with self._images_lock:
+            self._images[key] = (time.time(), names)
+        return set(names)
+
+    def _add_image(self, image):
+        # Record a pulled image in the cached list of images, if any
+        name = image.rsplit(':', 1)[0] if '/' not in image.rsplit(':', 1)[-1] \
+            else image
+        key = self._daemon_key(self.docker_cli)
+        with self._images_lock:
+            if key in self._images:
+                self._images[key][1].add(name)
@@ -25,3 +25,11 @@ class DockerException(Exception):
 
 class NuleculeException(Exception):
     pass
+
+
+class MissingAnswersException(NuleculeException):
+    pass
+
+
+class DestinationNotEmptyException(NuleculeException):
+    pass
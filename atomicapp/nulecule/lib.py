@@ -22,8 +22,7 @@ import logging
 from atomicapp.constants import (GLOBAL_CONF,
                                  LOGGER_COCKPIT,
                                  NAME_KEY,
-                                 DEFAULTNAME_KEY,
-                                 PROVIDERS)
+                                 DEFAULTNAME_KEY)
 from atomicapp.utils import Utils
 from atomicapp.plugin import Plugin
 from atomicapp.nulecule.exceptions import NuleculeException
@@ -38,10 +37,16 @@ class NuleculeBase(object):
     atomicapp.nulecule.base.
     """
 
+    __slots__ = ('basepath', 'params', 'namespace', 'config')
+
+    # Provider classes are cached by the Plugin class, a single instance
+    # serves all the Nulecule graph items
+    plugin = Plugin()
+
     def __init__(self, basepath, params, namespace):
-        self.plugin = Plugin()
+        self.config = None
         self.basepath = basepath
-        self.params = params or []
+        self.params = params or ()
         self.namespace = namespace
 
     def load(self):
@@ -95,8 +100,8 @@ class NuleculeBase(object):
         if provider_class is None:
             raise NuleculeException("Invalid Provider - '{}', provided in "
                                     "answers.conf (choose from {})"
-                                    .format(provider_key, ', '
-                                                          .join(PROVIDERS)))
+                                    .format(provider_key, ', '.join(
+                                        self.plugin.getProviderKeys())))
         return provider_key, provider_class(
             self.config.context(), self.basepath, dry)
 
@@ -17,7 +17,6 @@
  You should have received a copy of the GNU Lesser General Public License
  along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
 """
-import anymarkup
 import distutils.dir_util
 import logging
 import os
@@ -30,14 +29,22 @@ from atomicapp.constants import (ANSWERS_FILE_SAMPLE_FORMAT,
                                  ANSWERS_FILE,
                                  ANSWERS_FILE_SAMPLE,
                                  ANSWERS_RUNTIME_FILE,
+                                 DEFAULTNAME_KEY,
                                  LOGGER_COCKPIT,
                                  LOGGER_DEFAULT,
                                  MAIN_FILE,
+                                 NAME_KEY,
+                                 NAMESPACE_SEPARATOR,
+                                 PROVIDER_CAPABILITY_WAIT,
+                                 PROVIDER_WAIT_KEY,
                                  __ATOMICAPPVERSION__,
                                  __NULECULESPECVERSION__)
 from atomicapp.nulecule.base import Nulecule
-from atomicapp.nulecule.exceptions import NuleculeException
+from atomicapp.nulecule.exceptions import (DestinationNotEmptyException,
+                                           MissingAnswersException,
+                                           NuleculeException)
 from atomicapp.nulecule.config import Config
+from atomicapp.plugin import Plugin
 from atomicapp.utils import Utils
 
 cockpit_logger = logging.getLogger(LOGGER_COCKPIT)
@@ -52,7 +59,7 @@ class NuleculeManager(object):
 
     def __init__(self, app_spec, destination=None,
                  cli_answers=None, answers_file=None,
-                 answers_format=None):
+                 answers_format=None, interactive=True):
         """
         init function for NuleculeManager. Sets a few instance variables.
 
@@ -63,7 +70,12 @@ class NuleculeManager(object):
             cli_answers: some answer file values provided from cli args
             answers_file: the location of the answers file
             answers_format (str): File format for writing sample answers file
+            interactive (bool): Ask the user for missing answers. When
+                                False, e.g. in `atomicapp serve` and
+                                `atomicapp batch`, missing answers are an
+                                error instead
         """
+        self.interactive = interactive
         self.answers_format = answers_format or ANSWERS_FILE_SAMPLE_FORMAT
         self.answers_file = None  # The path to an answer file
         self.app_path = None  # The path where the app resides or will reside
@@ -119,7 +131,7 @@ class NuleculeManager(object):
 
     @staticmethod
     def init(app_name, destination=None, app_version='1.0',
-             app_desc='App description'):
+             app_desc='App description', interactive=True):
         """Initialize a new Nulecule app
 
         Args:
@@ -127,9 +139,15 @@ class NuleculeManager(object):
             destination (str): Destination path
             app_version (str): Application version
             app_desc (str): Application description
+            interactive (bool): Ask the user before writing to a destination
+                                that is not empty
 
         Returns:
             destination (str)
+
+        Raises:
+            DestinationNotEmptyException: the destination is not empty
+                                          and the user can not be asked
         """
 
         # context to render template files for Atomic App
@@ -147,6 +165,9 @@ class NuleculeManager(object):
         # Check if destination directory exists and is not empty
         if os.path.exists(destination) and \
            os.path.isdir(destination) and os.listdir(destination):
+            if not interactive:
+                raise DestinationNotEmptyException(
+                    "Destination directory %s is not empty" % destination)
             value = raw_input('Destination directory is not empty! '
                               'Do you still want to proceed? [Y]/n: ')
             value = value or 'y'
@@ -236,14 +257,26 @@ class NuleculeManager(object):
             raise NuleculeException(
                 "Can't generate answers.conf over existing file")
 
+        # Get answers and write them out to answers.conf in cwd
+        answers = self.get_answers(dryrun=dryrun)
+        self._write_answers(answers_file, answers, self.answers_format)
+
+    def get_answers(self, dryrun=False):
+        """
+        Unpacks the app and gets the answers data of all its params, with
+        the default values of the params as answers.
+
+        Args:
+            dryrun (bool): Do not make any change to the host system if True
+
+        Returns:
+            dict: Answers data
+        """
         # Call unpack to get the app code
         self.nulecule = self.unpack(update=False, dryrun=dryrun, config=self.config)
 
         self.nulecule.load_config(skip_asking=True)
-        # Get answers and write them out to answers.conf in cwd
-        answers = self._get_runtime_answers(
-            self.nulecule.config, None)
-        self._write_answers(answers_file, answers, self.answers_format)
+        return self._get_runtime_answers(self.nulecule.config, None)
 
     def fetch(self, nodeps=False, update=False, dryrun=False, **kwargs):
         """
@@ -285,7 +318,9 @@ class NuleculeManager(object):
                                   to
             ask (bool): Ask for values for params with default values from
                         user, if True
-            kwargs (dict): Extra keyword arguments
+            kwargs (dict): Extra keyword arguments, only and skip select
+                           the components to run (see
+                           Nulecule.select_components)
 
         Returns:
             None
@@ -295,12 +330,18 @@ class NuleculeManager(object):
         # Call unpack. If the app doesn't exist it will be pulled. If
         # it does exist it will be just be loaded and returned
         self.nulecule = self.unpack(dryrun=dryrun, config=self.config)
+        self._select_components(kwargs.get('only'), kwargs.get('skip'))
 
         # Process answers file
         self._process_answers()
 
-        self.nulecule.load_config(ask=ask)
+        self._load_config(ask=ask)
         provider = self.nulecule.config.get('provider')
+        if Utils.isTrue(self.nulecule.config.get(PROVIDER_WAIT_KEY)) and \
+                not Plugin().supports(provider, PROVIDER_CAPABILITY_WAIT):
+            logger.warning("Provider %s does not support waiting for the "
+                           "deployment, ignoring %s", provider,
+                           PROVIDER_WAIT_KEY)
         self.nulecule.render(provider, dryrun)
         self.nulecule.run(provider, dryrun)
         runtime_answers = self._get_runtime_answers(
@@ -312,12 +353,36 @@ class NuleculeManager(object):
             self._write_answers(answers_output, runtime_answers,
                                 self.answers_format)
 
+    def render(self, **kwargs):
+        """
+        Renders the artifacts of a Nulecule application for the provider
+        in the config without deploying them.
+
+        Args:
+            kwargs (dict): Extra keyword arguments, only and skip select
+                           the components to render (see
+                           Nulecule.select_components)
+
+        Returns:
+            str: The provider the artifacts were rendered for
+        """
+        dryrun = kwargs.get('dryrun') or False
+        self.nulecule = self.unpack(dryrun=dryrun, config=self.config)
+        self._select_components(kwargs.get('only'), kwargs.get('skip'))
+        self._process_answers()
+        self._load_config()
+        provider = self.nulecule.config.get('provider')
+        self.nulecule.render(provider, dryrun)
+        return provider
+
     def stop(self, **kwargs):
         """
         Stops a running Nulecule application.
 
         Args:
-            kwargs (dict): Extra keyword arguments
+            kwargs (dict): Extra keyword arguments, only and skip select
+                           the components to stop (see
+                           Nulecule.select_components)
         """
         # For stop we use the generated answer file from the run
         self.answers_file = os.path.join(self.app_path, ANSWERS_RUNTIME_FILE)
@@ -326,7 +391,8 @@ class NuleculeManager(object):
         dryrun = kwargs.get('dryrun') or False
         self.nulecule = Nulecule.load_from_path(
             self.app_path, config=self.config, dryrun=dryrun)
-        self.nulecule.load_config()
+        self._select_components(kwargs.get('only'), kwargs.get('skip'))
+        self._load_config()
         self.nulecule.render(self.nulecule.config.get('provider'),
                              dryrun=dryrun)
         self.nulecule.stop(self.nulecule.config.get('provider'), dryrun)
@@ -337,6 +403,63 @@ class NuleculeManager(object):
         distutils.dir_util.remove_tree(self.unpack_path)
         self.initialize()
 
+    def _load_config(self, ask=False):
+        """
+        Load the config of the Nulecule application. Params without answers
+        are asked for, unless the manager is not interactive.
+
+        Args:
+            ask (bool): Ask for params with default values too
+
+        Raises:
+            MissingAnswersException: answers are missing and the user can
+                                     not be asked for them
+        """
+        if self.interactive:
+            self.nulecule.load_config(ask=ask)
+            return
+        self.nulecule.load_config(skip_asking=True)
+
+        missing = []
+        items = [self.nulecule]
+        for item in items:
+            for param in item.params:
+                if param.get(DEFAULTNAME_KEY) is None and \
+                        item.config.get(param[NAME_KEY],
+                                        scope=item.namespace) is None:
+                    missing.append('%s (%s)' % (param[NAME_KEY],
+                                                item.namespace))
+            if isinstance(item, Nulecule):
+                items.extend(item.components)
+            elif item.app:
+                items.append(item.app)
+        if missing:
+            raise MissingAnswersException(
+                "Answers are missing for params: %s" % ", ".join(missing))
+
+    def _select_components(self, only=None, skip=None):
+        """
+        Select the components of the Nulecule application to act on,
+        before any external application is loaded.
+
+        Args:
+            only (list): Names of the components to act on
+            skip (list): Names of the components not to act on
+
+        Raises:
+            NuleculeException: a name does not belong to a component of
+                               the application
+        """
+        if not only and not skip:
+            return
+        names = [component.namespace for component in self.nulecule.components]
+        for name in (only or []) + (skip or []):
+            if name.split(NAMESPACE_SEPARATOR)[0] not in names:
+                raise NuleculeException(
+                    "Component %s is not part of this app, components are: %s"
+                    % (name, ", ".join(names)))
+        self.nulecule.select_components(only, skip)
+
     def _process_answers(self):
         """
         Processes answer files to load data from them and then merges
@@ -398,10 +521,11 @@ class NuleculeManager(object):
         logger.debug("FILE: %s", path)
         logger.debug("ANSWERS: %s", answers)
         logger.debug("ANSWERS FORMAT: %s", answers_format)
+        import anymarkup
         anymarkup.serialize_file(answers, path, format=answers_format)
 
         # Make sure that the permission of the file is set to the current user
-        Utils.setFileOwnerGroup(path)
+        Utils.trackOwnership(path, recursive=False)
 
     # TODO - once we rework config data we shouldn't need this
     # function anymore, we should be able to take the data
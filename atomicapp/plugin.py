@@ -24,22 +24,35 @@ import os
 
 import logging
 import importlib
+import threading
 from utils import Utils
 from constants import (HOST_DIR,
                        LOGGER_DEFAULT,
-                       PROVIDER_CONFIG_KEY)
+                       PROVIDER_CONFIG_KEY,
+                       PROVIDER_ENTRY_POINTS,
+                       PROVIDERS)
 
 logger = logging.getLogger(LOGGER_DEFAULT)
 
 
 class Provider(object):
     key = None
+    # Optional features of the provider (PROVIDER_CAPABILITY_* constants),
+    # so that callers can check for them without loading the provider
+    capabilities = frozenset()
 
     config = None
     path = None
     dryrun = None
     container = False
     config_file = None
+    # Id of the Nulecule application and name of its component the
+    # provider is acting for
+    app_id = None
+    component = None
+    # Set when the artifacts are only some of the artifacts of the
+    # component, see PROVIDER_CAPABILITY_PARTIAL
+    partial = False
 
     # By default, no artifacts are loaded
     __artifacts = []
@@ -102,6 +115,68 @@ class Provider(object):
 
         return data
 
+    def iterArtifactObjects(self):
+        """
+        Iterate over the objects of the artifacts one at a time. YAML
+        artifacts are read document by document and the items of
+        'kind: List' objects are yielded one by one, so that memory use
+        does not grow with the size of the artifacts.
+
+        Yields:
+            tuple (artifact, data): artifact name and object data
+        """
+        import json
+        import yaml
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        for artifact in self.artifacts:
+            logger.debug("Processing artifact: %s", artifact)
+            with open(os.path.join(self.path, artifact), "r") as fp:
+                # JSON is a single document, and may not be valid YAML
+                # (e.g. tabs for indentation)
+                head = fp.read(1024).lstrip()
+                fp.seek(0)
+                if head.startswith("{") or head.startswith("["):
+                    documents = [json.load(fp)]
+                else:
+                    documents = yaml.load_all(fp, Loader=loader)
+                for data in documents:
+                    if data is None:
+                        continue
+                    if isinstance(data, dict) and data.get("kind") == "List" \
+                            and isinstance(data.get("items"), list):
+                        for item in data.pop("items"):
+                            yield artifact, item
+                    else:
+                        yield artifact, data
+
+    def iterNamespacedObjects(self, namespace):
+        """
+        Stream the Kubernetes objects of the artifacts (see
+        iterArtifactObjects) moved to namespace. Objects are checked as
+        they are deployed, so that the artifacts are only parsed once.
+
+        Args:
+            namespace (str): namespace to deploy the objects to
+
+        Yields:
+            tuple (kind, data): lower case kind and object data
+
+        Raises:
+            ProviderFailedException: an object has no kind or metadata
+        """
+        for artifact, data in self.iterArtifactObjects():
+            if not isinstance(data, dict) or "kind" not in data:
+                raise ProviderFailedException(
+                    "Error processing %s artifact. There is no kind" % artifact)
+            if "metadata" not in data:
+                raise ProviderFailedException(
+                    "Error processing %s artifact. There is no metadata "
+                    "object" % artifact)
+
+            data["metadata"]["namespace"] = namespace
+            data["metadata"].setdefault("labels", {})["namespace"] = namespace
+            yield data["kind"].lower(), data
+
     def saveArtifact(self, path, data):
         if not os.path.isdir(os.path.dirname(path)):
             os.makedirs(os.path.dirname(path))
@@ -122,16 +197,126 @@ class ProviderFailedException(Exception):
 
 
 class Plugin(object):
-    plugins = []
+    """
+    Registry of the providers.
+
+    The built-in providers are listed in PROVIDERS, other packages can add
+    providers under the PROVIDER_ENTRY_POINTS entry point group, e.g.
+
+        entry_points={
+            "atomicapp.providers": ["nomad = atomicapp_nomad:NomadProvider"]
+        }
+
+    Entry points are only scanned when a key is not a built-in provider.
+    A provider is imported on first use and the class is cached for the
+    lifetime of the process.
+    """
+
+    # Provider classes loaded so far, by key
+    plugins = {}
+    # Entry points by key, None until scanned
+    _entry_points = None
+    _lock = threading.Lock()
 
     def __init__(self, ):
         pass
 
+    @classmethod
+    def _get_entry_points(cls):
+        """
+        Scan the installed distributions for provider entry points once.
+
+        Returns:
+            dict: entry points by provider key
+        """
+        with cls._lock:
+            if cls._entry_points is None:
+                entry_points = {}
+                try:
+                    import pkg_resources
+                except ImportError:
+                    pkg_resources = None
+                if pkg_resources:
+                    for entry_point in pkg_resources.iter_entry_points(
+                            PROVIDER_ENTRY_POINTS):
+                        if entry_point.name in PROVIDERS:
+                            logger.warning(
+                                "Ignoring provider %s from %s, it shadows a "
+                                "built-in provider",
+                                entry_point.name, entry_point.dist)
+                            continue
+                        entry_points.setdefault(entry_point.name, entry_point)
+                cls._entry_points = entry_points
+            return cls._entry_points
+
+    def getProviderKeys(self):
+        """
+        Keys of all available providers, without loading them.
+
+        Returns:
+            list: built-in provider keys followed by the sorted keys of
+                  the entry point providers
+        """
+        return PROVIDERS + sorted(self._get_entry_points())
+
     def getProvider(self, provider_key):
+        """
+        Look up a provider class.
+
+        Args:
+            provider_key (str): key of the provider, e.g. "kubernetes"
+
+        Returns:
+            The provider class or None when there is no such provider or
+            it failed to import.
+        """
+        provider = self.plugins.get(provider_key)
+        if provider is not None:
+            return provider
+
         try:
-            module = importlib.import_module("atomicapp.providers.%s" % provider_key)
-            provider_class = "%sProvider" % provider_key.capitalize()
-            provider = getattr(module, provider_class)
-        except ImportError:
-            provider = None
+            if provider_key in PROVIDERS:
+                module = importlib.import_module(
+                    "atomicapp.providers.%s" % provider_key)
+                provider = getattr(
+                    module, "%sProvider" % provider_key.capitalize())
+            else:
+                entry_point = self._get_entry_points().get(provider_key)
+                if entry_point is None:
+                    return None
+                provider = entry_point.load()
+        except ImportError, e:
+            logger.warning("Failed to load provider %s: %s", provider_key, e)
+            return None
+
+        self.plugins[provider_key] = provider
         return provider
+
+    def getCapabilities(self, provider_key):
+        """
+        Optional features of a provider.
+
+        Args:
+            provider_key (str): key of the provider
+
+        Returns:
+            frozenset: PROVIDER_CAPABILITY_* constants, empty for unknown
+                       providers
+        """
+        provider = self.getProvider(provider_key)
+        if provider is None:
+            return frozenset()
+        return frozenset(provider.capabilities)
+
+    def supports(self, provider_key, capability):
+        """
+        Check if a provider has a capability.
+
+        Args:
+            provider_key (str): key of the provider
+            capability (str): one of the PROVIDER_CAPABILITY_* constants
+
+        Returns:
+            bool: True if the provider supports the capability
+        """
+        return capability in self.getCapabilities(provider_key)
@@ -21,11 +21,18 @@ import os
 import subprocess
 import re
 import logging
+from multiprocessing.pool import ThreadPool
 from atomicapp.constants import (DEFAULT_CONTAINER_NAME,
                                  DEFAULT_NAMESPACE,
-                                 LOGGER_DEFAULT)
+                                 DOCKER_LABEL_PREFIX,
+                                 DOCKER_STOP_TIMEOUT,
+                                 DOCKER_STOP_TIMEOUT_KEY,
+                                 DOCKER_STOP_WORKERS,
+                                 LOGGER_DEFAULT,
+                                 PROVIDER_CAPABILITY_PARTIAL)
 from atomicapp.plugin import Provider, ProviderFailedException
 from atomicapp.utils import Utils
+from atomicapp.nulecule.container import DockerHandler
 from atomicapp.nulecule.exceptions import DockerException
 
 logger = logging.getLogger(LOGGER_DEFAULT)
@@ -33,6 +40,7 @@ logger = logging.getLogger(LOGGER_DEFAULT)
 
 class DockerProvider(Provider):
     key = "docker"
+    capabilities = frozenset([PROVIDER_CAPABILITY_PARTIAL])
 
     def init(self):
         self.namespace = DEFAULT_NAMESPACE
@@ -43,7 +51,20 @@ class DockerProvider(Provider):
             self.namespace = self.config.get("namespace")
         logger.debug("Namespace: %s", self.namespace)
 
-        if "image" in self.config:
+        stop_timeout = self.config.get(DOCKER_STOP_TIMEOUT_KEY)
+        if stop_timeout is None or stop_timeout == "":
+            stop_timeout = DOCKER_STOP_TIMEOUT
+        try:
+            self.stop_timeout = int(stop_timeout)
+            if self.stop_timeout < 0:
+                raise ValueError(stop_timeout)
+        except (TypeError, ValueError):
+            raise ProviderFailedException(
+                "Invalid %s: %s, expected a number of seconds"
+                % (DOCKER_STOP_TIMEOUT_KEY, stop_timeout))
+
+        self.image_provided = "image" in self.config
+        if self.image_provided:
             self.image = Utils.sanitizeName(self.config.get("image"))
         else:
             self.image = Utils.getUniqueUUID()
@@ -53,21 +74,16 @@ class DockerProvider(Provider):
         if self.dryrun:
             logger.info("DRY-RUN: Did not check Docker version compatibility")
         else:
-            cmd_check = ["docker", "version"]
             try:
-                docker_version = subprocess.check_output(cmd_check).split("\n")
-            except Exception as ex:
+                capabilities = DockerHandler.probe("docker")
+                client = capabilities['client']['api_version']
+                server = capabilities['server']['api_version']
+                newer = DockerHandler.api_version_tuple(client) > \
+                    DockerHandler.api_version_tuple(server)
+            except DockerException as ex:
                 raise ProviderFailedException(ex)
 
-            client = ""
-            server = ""
-            for line in docker_version:
-                if line.startswith("Client API version"):
-                    client = line.split(":")[1]
-                if line.startswith("Server API version"):
-                    server = line.split(":")[1]
-
-            if client > server:
+            if newer:
                 msg = ("Docker version in app image (%s) is higher than the one "
                        "on host (%s). Please update your host." % (client, server))
                 raise ProviderFailedException(msg)
@@ -80,9 +96,100 @@ class DockerProvider(Provider):
         else:
             return dict((line, 1) for line in subprocess.check_output(docker_cmd, shell=True).splitlines())
 
+    def _get_labels(self, artifact=None):
+        """
+        Ownership labels put on every container started by run(). They allow
+        stop() to find the containers of this app with a single query.
+
+        Args:
+            artifact (str): Artifact the container is started from
+
+        Returns:
+            list: List of "key=value" label strings
+        """
+        labels = ["%s.namespace=%s" % (DOCKER_LABEL_PREFIX, self.namespace)]
+        if self.app_id:
+            labels.append("%s.app=%s" % (DOCKER_LABEL_PREFIX, self.app_id))
+        if self.component:
+            labels.append("%s.component=%s" % (DOCKER_LABEL_PREFIX, self.component))
+        if artifact:
+            labels.append("%s.artifact=%s" % (DOCKER_LABEL_PREFIX,
+                                              os.path.basename(artifact).lstrip('.')))
+        return labels
+
+    def _get_labelled_containers(self, artifact=None):
+        """
+        Find the running containers carrying the ownership labels of this
+        app using a single label filtered 'docker ps'.
+
+        Args:
+            artifact (str): Only find the containers started from this
+                            artifact
+
+        Returns:
+            list: Container IDs
+        """
+        docker_cmd = ["docker", "ps", "-q", "--no-trunc"]
+        for label in self._get_labels(artifact):
+            docker_cmd.extend(["--filter", "label=%s" % label])
+        if self.dryrun:
+            logger.info("DRY-RUN: %s", " ".join(docker_cmd))
+            return []
+        try:
+            output = subprocess.check_output(docker_cmd)
+        except subprocess.CalledProcessError as e:
+            raise DockerException("%s. \n%s" % (docker_cmd, e.output))
+        return output.split()
+
+    def _stop_container(self, container):
+        """
+        Stop a single container, waiting at most self.stop_timeout seconds
+        before docker kills it. When only some artifacts are stopped (see
+        Provider.partial), the container is removed as well.
+
+        Returns:
+            str: Error message or None on success
+        """
+        cmd = ["docker", "stop", "-t", str(self.stop_timeout), container]
+        if self.dryrun:
+            logger.info("DRY-RUN: STOPPING CONTAINER %s", " ".join(cmd))
+            return None
+        logger.info("Stopping container: %s", container)
+        try:
+            subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as e:
+            return "STOPPING CONTAINER failed: %s. \n%s" % (cmd, e.output)
+        if self.partial:
+            # The artifact is started again right after, free the name
+            # given to the container with --name
+            cmd = ["docker", "rm", container]
+            try:
+                subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+            except subprocess.CalledProcessError as e:
+                return "REMOVING CONTAINER failed: %s. \n%s" % (cmd, e.output)
+        return None
+
+    def _stop_containers(self, containers):
+        """
+        Stop containers in parallel so that stopping the whole app costs
+        about one grace period instead of one per container.
+        """
+        if not containers:
+            return
+        pool = ThreadPool(min(len(containers), DOCKER_STOP_WORKERS))
+        try:
+            errors = [e for e in pool.map(self._stop_container, containers) if e]
+        finally:
+            pool.close()
+            pool.join()
+        if errors:
+            raise DockerException("\n".join(errors))
+
     def run(self):
         logger.info("Deploying to provider: Docker")
-        for container in self._get_containers():
+        # Other containers of the app keep running when only some of its
+        # artifacts are started again
+        for container in [] if self.partial else self._get_containers():
             if re.match("%s_+%s+_+[a-zA-Z0-9]{12}" % (self.namespace, self.image), container):
                 raise ProviderFailedException("Container with name %s-%s already deployed in Docker" % (self.namespace, self.image))
 
@@ -95,6 +202,13 @@ class DockerProvider(Provider):
                 label_run = ' '.join(label_run.split('\\\n'))
             run_args = label_run.split()
 
+            # Label the container so that stop() can find it later on
+            label_args = []
+            for label in self._get_labels(artifact):
+                label_args.extend(["--label", label])
+            run_index = run_args.index('run') + 1
+            run_args[run_index:run_index] = label_args
+
             # If --name is provided, do not re-name due to potential linking of containers. Warn user instead.
             # Else use namespace provided within answers.conf
             if '--name' in run_args:
@@ -113,6 +227,30 @@ class DockerProvider(Provider):
 
     def stop(self):
         logger.info("Undeploying to provider: Docker")
+
+        if self.partial:
+            containers = []
+            for artifact in self.artifacts:
+                containers.extend(self._get_labelled_containers(artifact))
+            self._stop_containers(containers)
+            return
+
+        # Containers started by run() carry ownership labels
+        containers = self._get_labelled_containers()
+        if not containers:
+            # Fall back to name matching for containers started before
+            # atomicapp labelled them
+            containers = self._get_named_containers()
+        self._stop_containers(containers)
+
+    def _get_named_containers(self):
+        """
+        Find containers of this app by the names given in the artifacts or
+        by the generated NAMESPACE_IMAGENAME_HASHVALUE name.
+
+        Returns:
+            list: Container names
+        """
         artifact_names = list()
 
         # Gather the list of containers within /artifacts/docker
@@ -134,19 +272,13 @@ class DockerProvider(Provider):
                 artifact_names.append(run_args[run_args.index('--name') + 1])
                 logger.debug("artifact cnames: %s", artifact_names)
 
-        # Regex checks for matching container name and kills it. ex. atomic_mariadb-atomicapp-app_9dfb369ed2a0
+        # Regex checks for matching container name. ex. atomic_mariadb-atomicapp-app_9dfb369ed2a0
+        containers = []
         for container in self._get_containers():
             if artifact_names:
-                m = [i for i, x in enumerate(artifact_names) if x == container]
+                m = container in artifact_names
             else:
                 m = re.match("%s_+%s+_+[a-zA-Z0-9]{12}" % (self.namespace, self.image), container)
             if m:
-                logger.info("Stopping container: %s", container)
-                cmd = ["docker", "stop", container]
-                if self.dryrun:
-                    logger.info("DRY-RUN: STOPPING CONTAINER %s", " ".join(cmd))
-                else:
-                    try:
-                        subprocess.check_output(cmd)
-                    except subprocess.CalledProcessError as e:
-                        raise DockerException("STOPPING CONTAINER failed: %s. \n%s" % (cmd, e.output))
+                containers.append(container)
+        return containers
@@ -17,7 +17,6 @@
  along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
 """
 
-import anymarkup
 import logging
 import os
 
@@ -27,6 +26,8 @@ from atomicapp.constants import (PROVIDER_AUTH_KEY,
                                  LOGGER_DEFAULT,
                                  PROVIDER_API_KEY,
                                  PROVIDER_CA_KEY,
+                                 PROVIDER_CAPABILITY_PARTIAL,
+                                 PROVIDER_CAPABILITY_STORAGE,
                                  PROVIDER_TLS_VERIFY_KEY,
                                  LOGGER_COCKPIT,
                                  K8S_DEFAULT_API)
@@ -48,8 +49,9 @@ class KubernetesProvider(Provider):
 
     # Class variables
     key = "kubernetes"
+    capabilities = frozenset([PROVIDER_CAPABILITY_PARTIAL,
+                              PROVIDER_CAPABILITY_STORAGE])
     namespace = DEFAULT_NAMESPACE
-    k8s_artifacts = {}
 
     # From the provider configuration
     config_file = None
@@ -61,16 +63,12 @@ class KubernetesProvider(Provider):
     provider_ca = None
 
     def init(self):
-        self.k8s_artifacts = {}
-
         logger.debug("Given config: %s", self.config)
         if self.config.get("namespace"):
             self.namespace = self.config.get("namespace")
 
         logger.info("Using namespace %s", self.namespace)
 
-        self._process_artifacts()
-
         if self.dryrun:
             return
 
@@ -183,57 +181,6 @@ class KubernetesProvider(Provider):
             msg = "%s namespace does not exist. Please create the namespace and try again." % self.namespace
             raise ProviderFailedException(msg)
 
-    def _process_artifacts(self):
-        """
-        Parse each Kubernetes file and convert said format into an Object for
-        deployment.
-        """
-        for artifact in self.artifacts:
-            logger.debug("Processing artifact: %s", artifact)
-            data = None
-
-            # Open and parse the artifact data
-            with open(os.path.join(self.path, artifact), "r") as fp:
-                data = anymarkup.parse(fp, force_types=None)
-
-            # Process said artifacts
-            self._process_artifact_data(artifact, data)
-
-    def _process_artifact_data(self, artifact, data):
-        """
-        Process the data for an artifact
-
-        Args:
-            artifact (str): Artifact name
-            data (dict): Artifact data
-        """
-
-        # Check if kind exists
-        if "kind" not in data.keys():
-            raise ProviderFailedException(
-                "Error processing %s artifact. There is no kind" % artifact)
-
-        # Change to lower case so it's easier to parse
-        kind = data["kind"].lower()
-
-        if kind not in self.k8s_artifacts.keys():
-            self.k8s_artifacts[kind] = []
-
-        # Fail if there is no metadata
-        if 'metadata' not in data:
-            raise ProviderFailedException(
-                "Error processing %s artifact. There is no metadata object" % artifact)
-
-        # Change to the namespace specified on init()
-        data['metadata']['namespace'] = self.namespace
-
-        if 'labels' not in data['metadata']:
-            data['metadata']['labels'] = {'namespace': self.namespace}
-        else:
-            data['metadata']['labels']['namespace'] = self.namespace
-
-        self.k8s_artifacts[kind].append(data)
-
     '''
     This is DEPRECATED and not needed anymore as we check the /resource URL of the kubernetes api against the artifact
     def _identify_api(self, artifact, data):
@@ -261,13 +208,12 @@ class KubernetesProvider(Provider):
         """
         logger.info("Deploying to Kubernetes")
 
-        for kind, objects in self.k8s_artifacts.iteritems():
-            for artifact in objects:
-                if self.dryrun:
-                    logger.info("DRY-RUN: Deploying k8s KIND: %s, ARTIFACT: %s"
-                                % (kind, artifact))
-                else:
-                    self.api.create(artifact, self.namespace)
+        for kind, artifact in self.iterNamespacedObjects(self.namespace):
+            if self.dryrun:
+                logger.info("DRY-RUN: Deploying k8s KIND: %s, ARTIFACT: %s"
+                            % (kind, artifact))
+            else:
+                self.api.create(artifact, self.namespace)
 
     def stop(self):
         """Undeploys the app by given resource manifests.
@@ -276,13 +222,12 @@ class KubernetesProvider(Provider):
         """
         logger.info("Undeploying from Kubernetes")
 
-        for kind, objects in self.k8s_artifacts.iteritems():
-            for artifact in objects:
-                if self.dryrun:
-                    logger.info("DRY-RUN: Deploying k8s KIND: %s, ARTIFACT: %s"
-                                % (kind, artifact))
-                else:
-                    self.api.delete(artifact, self.namespace)
+        for kind, artifact in self.iterNamespacedObjects(self.namespace):
+            if self.dryrun:
+                logger.info("DRY-RUN: Deploying k8s KIND: %s, ARTIFACT: %s"
+                            % (kind, artifact))
+            else:
+                self.api.delete(artifact, self.namespace)
 
     # TODO
     def persistent_storage(self, graph, action):
@@ -21,11 +21,15 @@ import requests
 import websocket
 import tempfile
 import base64
+import json
 import ssl
+import threading
+import time
 from requests.exceptions import SSLError
 from atomicapp.providers.lib.kubeshift.exceptions import (KubeBaseError,
                                                           KubeConnectionError)
-from atomicapp.constants import LOGGER_DEFAULT
+from atomicapp.constants import (KUBE_DISCOVERY_TTL,
+                                 LOGGER_DEFAULT)
 import logging
 logger = logging.getLogger(LOGGER_DEFAULT)
 
@@ -48,6 +52,13 @@ class KubeBase(object):
     certificate_ca = None  # Not yet implemented
     insecure_skip_tls_verify = False
 
+    # Sessions and discovered API resources shared by all clients of the
+    # process. A long running process (atomicapp serve) keeps its
+    # connections and does not rediscover the API for every deployment.
+    _sessions = {}
+    _discovery = {}
+    _cache_lock = threading.Lock()
+
     def __init__(self, config):
         '''
         Args:
@@ -92,7 +103,7 @@ class KubeBase(object):
                 self.client_key = self.user['client-key']
 
         # Initialize the connection using all the .kube/config credentials
-        self.api = self._connection()
+        self.api = self._shared_connection()
 
     def request(self, method, url, data=None):
         '''
@@ -161,20 +172,38 @@ class KubeBase(object):
         '''
         Get the groups of APIs available.
         '''
-        data = self.request("get", url)
-        groups = data["groups"] or []
-        groups = [(group['name'], [i['version'] for i in group['versions']]) for group in groups]
-        return groups
+        def parse(data):
+            groups = data["groups"] or []
+            return [(group['name'], [i['version'] for i in group['versions']]) for group in groups]
+        return self._discover(url, parse)
 
     def get_resources(self, url):
         '''
         Get the resources available to the API. This is a list of all available
         API calls that can be made to the API.
         '''
-        data = self.request("get", url)
-        resources = data["resources"] or []
-        resources = [res['name'] for res in resources]
-        return resources
+        def parse(data):
+            resources = data["resources"] or []
+            return [res['name'] for res in resources]
+        return self._discover(url, parse)
+
+    def _discover(self, url, parse):
+        '''
+        Get and parse a discovery end-point of the API. The result is reused
+        by the process for KUBE_DISCOVERY_TTL seconds.
+
+        Args:
+            url (str): url of the end-point
+            parse (function): turns the response into the result
+        '''
+        with self._cache_lock:
+            cached = self._discovery.get(url)
+        if cached and 0 <= time.time() - cached[0] < KUBE_DISCOVERY_TTL:
+            return list(cached[1])
+        result = parse(self.request("get", url))
+        with self._cache_lock:
+            self._discovery[url] = (time.time(), result)
+        return list(result)
 
     def test_connection(self, url):
         self.api.request("get", url)
@@ -274,6 +303,18 @@ class KubeBase(object):
             users[f["name"]] = f["user"]
         return users
 
+    def _shared_connection(self):
+        '''
+        Get the session of the process for the cluster and user, creating
+        it on first use.
+        '''
+        key = json.dumps([self.cluster, self.user], sort_keys=True)
+        with self._cache_lock:
+            connection = self._sessions.get(key)
+            if connection is None:
+                connection = self._sessions[key] = self._connection()
+        return connection
+
     def _connection(self):
         '''
         Initializes the required requests session certs / token / authentication
@@ -1,6 +1,7 @@
 import anymarkup
 
 from atomicapp.plugin import ProviderFailedException
+from atomicapp.utils import Utils
 from atomicapp.constants import (PROVIDER_AUTH_KEY,
                                  LOGGER_DEFAULT,
                                  NAMESPACE_KEY,
@@ -16,13 +17,14 @@ class KubeConfig(object):
     @staticmethod
     def from_file(filename):
         '''
-        Load a file using anymarkup
+        Load a file using anymarkup. The file is only parsed again when it
+        changed since it was last loaded by this process.
 
         Params:
             filename (str): File location
         '''
 
-        return anymarkup.parse_file(filename)
+        return Utils.parse_file_memoized(filename, anymarkup.parse_file)
 
     @staticmethod
     def from_params(api=None, auth=None, ca=None, verify=True):
@@ -18,11 +18,21 @@
 """
 
 import anymarkup
+import json
 import urlparse
 import logging
 import os
+import re
+import requests
+import time
 from atomicapp.constants import (LOGGER_COCKPIT,
-                                 LOGGER_DEFAULT)
+                                 LOGGER_DEFAULT,
+                                 MARATHON_GROUP_KEY,
+                                 PROVIDER_CAPABILITY_BULK_APPLY,
+                                 PROVIDER_CAPABILITY_WAIT,
+                                 PROVIDER_WAIT_KEY,
+                                 PROVIDER_WAIT_TIMEOUT,
+                                 PROVIDER_WAIT_TIMEOUT_KEY)
 from atomicapp.plugin import Provider, ProviderFailedException
 from atomicapp.utils import Utils
 from atomicapp.constants import PROVIDER_API_KEY
@@ -34,14 +44,24 @@ logger = logging.getLogger(LOGGER_DEFAULT)
 class MarathonProvider(Provider):
 
     key = "marathon"
+    # Apps can be deployed as one group (MARATHON_GROUP_KEY)
+    capabilities = frozenset([PROVIDER_CAPABILITY_BULK_APPLY,
+                              PROVIDER_CAPABILITY_WAIT])
     config_file = None
     marathon_api_version = "v2"
     # use localhost as default, when no providerurl is specified
     marathon_api = "http://localhost:8080/%s/" % marathon_api_version
     marathon_artifacts = []
+    # Polling intervals (seconds) used while waiting for deployments
+    wait_poll_interval = 0.5
+    wait_poll_max_interval = 5
+    # Longest time (seconds) the event stream may stay silent
+    wait_stream_timeout = 30
 
     def init(self):
         self.marathon_artifacts = []
+        # Seconds it took every app to become ready, filled in by --wait
+        self.deploy_timings = {}
 
         logger.debug("Given config: %s", self.config)
         if self.config.get(PROVIDER_API_KEY):
@@ -49,11 +69,46 @@ class MarathonProvider(Provider):
             self.marathon_api = urlparse.urljoin(self.marathon_api, "v2/")
 
         logger.debug("marathon_api = %s", self.marathon_api)
+
+        wait_timeout = self.config.get(PROVIDER_WAIT_TIMEOUT_KEY)
+        if wait_timeout is None or wait_timeout == "":
+            wait_timeout = PROVIDER_WAIT_TIMEOUT
+        try:
+            self.wait_timeout = int(wait_timeout)
+            if self.wait_timeout < 0:
+                raise ValueError(wait_timeout)
+        except (TypeError, ValueError):
+            raise ProviderFailedException(
+                "Invalid %s: %s, expected a number of seconds"
+                % (PROVIDER_WAIT_TIMEOUT_KEY, wait_timeout))
+
         self._process_artifacts()
 
     def run(self):
         """ Deploys the app by given resource manifests.
         """
+        if self.config.get(MARATHON_GROUP_KEY):
+            deployments, started = self._run_group()
+        else:
+            deployments, started = self._run_apps()
+        # The apps are submitted, waiting for them only needs their ids
+        self.marathon_artifacts = []
+
+        if deployments and Utils.isTrue(self.config.get(PROVIDER_WAIT_KEY)):
+            self._wait_for_deployments(deployments, started)
+
+    def _run_apps(self):
+        """
+        Deploy every app with its own request to /v2/apps.
+
+        Returns:
+            tuple (deployments, started): deployments - deployment ids
+                                          mapped to the app ids they deploy
+                                          started - app ids mapped to the
+                                          time they were submitted
+        """
+        deployments = {}
+        started = {}
         for artifact in self.marathon_artifacts:
             url = urlparse.urljoin(self.marathon_api, "apps/")
 
@@ -62,6 +117,7 @@ class MarathonProvider(Provider):
                 continue
 
             logger.debug("Deploying appid: %s", artifact["id"])
+            started[artifact["id"]] = time.time()
             (status_code, return_data) = \
                 Utils.make_rest_request("post", url, data=artifact)
             if status_code == 201:
@@ -74,10 +130,20 @@ class MarathonProvider(Provider):
                 logger.error(msg)
                 raise ProviderFailedException(msg)
 
+            for deployment in (return_data or {}).get("deployments") or []:
+                deployments.setdefault(deployment["id"], []).append(
+                    (return_data.get("id") or artifact["id"]))
+        return deployments, started
+
     def stop(self):
         """ Undeploys the app by given resource manifests.
         Undeploy operation deletes Marathon apps from cluster.
         """
+        if self.config.get(MARATHON_GROUP_KEY):
+            self._stop_group()
+            self.marathon_artifacts = []
+            return
+
         for artifact in self.marathon_artifacts:
             url = urlparse.urljoin(
                 self.marathon_api,
@@ -100,10 +166,273 @@ class MarathonProvider(Provider):
                     artifact["id"], status_code, return_data)
                 logger.error(msg)
                 raise ProviderFailedException(msg)
+        self.marathon_artifacts = []
+
+    def _get_group_id(self):
+        """
+        Id of the Marathon group the apps are deployed in. Each component
+        gets its own subgroup of the configured group, so that components
+        sharing the group do not replace each other's apps.
+        """
+        group_id = "/%s" % self.config.get(MARATHON_GROUP_KEY).strip("/")
+        if self.component:
+            group_id = "%s/%s" % (
+                group_id.rstrip("/"),
+                re.sub("[^a-z0-9.-]", "-", self.component.lower()))
+        return group_id
+
+    def _get_group(self):
+        """
+        Wrap all Marathon apps into a single group definition. App ids
+        become relative to the group, and so do the dependencies on apps
+        of the group. Dependencies on other apps stay absolute.
+        """
+        group_id = self._get_group_id()
+        app_ids = dict((artifact["id"],
+                        self._relative_app_id(artifact["id"], group_id))
+                       for artifact in self.marathon_artifacts)
+        apps = []
+        for artifact in self.marathon_artifacts:
+            app = dict(artifact)
+            app["id"] = app_ids[app["id"]]
+            if app.get("dependencies"):
+                app["dependencies"] = [
+                    app_ids.get(dep) or self._group_app_id(dep, group_id)
+                    for dep in app["dependencies"]]
+            apps.append(app)
+        return {"id": group_id, "apps": apps}
+
+    @staticmethod
+    def _relative_app_id(app_id, group_id):
+        # Apps of the group live in it, wherever their id points to
+        return MarathonProvider._group_app_id(app_id, group_id).lstrip("/")
+
+    @staticmethod
+    def _group_app_id(app_id, group_id):
+        if app_id.startswith(group_id + "/"):
+            return app_id[len(group_id) + 1:]
+        return app_id
+
+    def _run_group(self):
+        """
+        Deploy all the apps with a single request to /v2/groups, so that
+        Marathon schedules one deployment instead of one per app.
+
+        Returns:
+            tuple (deployments, started): see _run_apps
+        """
+        group = self._get_group()
+        url = urlparse.urljoin(self.marathon_api,
+                               "groups/%s" % group["id"].lstrip("/"))
+
+        if self.dryrun:
+            logger.info("DRY-RUN: %s %s", url, group)
+            return {}, {}
+
+        logger.debug("Deploying group: %s", group["id"])
+        now = time.time()
+        (status_code, return_data) = \
+            Utils.make_rest_request("put", url, data=group)
+        if status_code in (200, 201):
+            logger.info(
+                "Marathon group %s sucessfully deployed.", group["id"])
+        else:
+            msg = "Error deploying group: %s, Marathon API response %s - %s" % (
+                group["id"], status_code, return_data)
+            logger.error(msg)
+            raise ProviderFailedException(msg)
+
+        app_ids = ["%s/%s" % (group["id"], app["id"]) for app in group["apps"]]
+        deployments = {}
+        if (return_data or {}).get("deploymentId"):
+            deployments[return_data["deploymentId"]] = app_ids
+        return deployments, dict((app_id, now) for app_id in app_ids)
+
+    def _stop_group(self):
+        """
+        Delete the group and with it all the apps it contains.
+        """
+        group_id = self._get_group_id()
+        url = urlparse.urljoin(self.marathon_api,
+                               "groups/%s" % group_id.lstrip("/"))
+
+        if self.dryrun:
+            logger.info("DRY-RUN: %s", url)
+            return
+
+        logger.debug("Deleting group: %s", group_id)
+        (status_code, return_data) = \
+            Utils.make_rest_request("delete", url)
+        if status_code == 200:
+            logger.info(
+                "Marathon group %s sucessfully deleted.", group_id)
+        else:
+            msg = "Error deleting group: %s, Marathon API response %s - %s" % (
+                group_id, status_code, return_data)
+            logger.error(msg)
+            raise ProviderFailedException(msg)
+
+    def _wait_for_deployments(self, deployments, started):
+        """
+        Wait until the given deployments are finished and every app runs
+        its target number of (healthy) instances. Deployment completion is
+        followed on Marathon's event stream; if the stream is not
+        available, /v2/deployments is polled instead.
+
+        Args:
+            deployments (dict): deployment ids mapped to lists of app ids
+            started (dict): app ids mapped to their submission time
+
+        Raises:
+            ProviderFailedException: a deployment failed or did not finish
+                                     in time
+        """
+        deadline = time.time() + self.wait_timeout
+        pending = set(deployments.keys())
+        finished = {}
+        logger.info("Waiting for %s Marathon deployment(s) to finish",
+                    len(pending))
+
+        try:
+            self._wait_events(pending, finished, deadline)
+        except requests.exceptions.RequestException as e:
+            logger.debug("Marathon event stream not available: %s", e)
+        if pending:
+            self._poll_deployments(pending, finished, deadline)
+
+        for deployment_id, app_ids in deployments.items():
+            for app_id in app_ids:
+                ready = self._wait_app_ready(app_id, deadline) or \
+                    finished[deployment_id]
+                self.deploy_timings[app_id] = ready - started.get(app_id, ready)
+                logger.info("Marathon app %s ready after %.1fs",
+                            app_id, self.deploy_timings[app_id])
+
+    def _wait_events(self, pending, finished, deadline):
+        """
+        Follow deployment events on the /v2/events server sent event
+        stream until all pending deployments are finished.
+        """
+        url = urlparse.urljoin(
+            self.marathon_api,
+            "events?event_type=deployment_success&event_type=deployment_failed")
+        response = requests.get(
+            url, stream=True, headers={"Accept": "text/event-stream"},
+            timeout=(self.wait_stream_timeout, self.wait_stream_timeout))
+        try:
+            if response.status_code != 200:
+                logger.debug("Marathon event stream returned %s",
+                             response.status_code)
+                return
+
+            # Deployments that are over before we subscribed never show up
+            # on the stream
+            self._check_deployments(pending, finished)
+            if not pending:
+                return
+
+            event = None
+            for line in response.iter_lines(chunk_size=1):
+                self._check_deadline(pending, deadline)
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:") and event in (
+                        "deployment_success", "deployment_failed"):
+                    try:
+                        data = json.loads(line[len("data:"):])
+                    except ValueError as e:
+                        # Deployments missed here are found by polling
+                        logger.debug("Invalid Marathon event %s: %s",
+                                     line, e)
+                        continue
+                    if not isinstance(data, dict) or \
+                            data.get("id") not in pending:
+                        continue
+                    deployment_id = data["id"]
+                    if event == "deployment_failed":
+                        raise ProviderFailedException(
+                            "Marathon deployment %s failed" % deployment_id)
+                    logger.debug("Marathon deployment %s finished",
+                                 deployment_id)
+                    pending.discard(deployment_id)
+                    finished[deployment_id] = time.time()
+                    if not pending:
+                        break
+                elif not line:
+                    event = None
+        finally:
+            response.close()
+
+    def _poll_deployments(self, pending, finished, deadline):
+        """
+        Poll /v2/deployments with an increasing interval until all pending
+        deployments are finished.
+        """
+        interval = self.wait_poll_interval
+        while True:
+            self._check_deployments(pending, finished)
+            if not pending:
+                return
+            self._check_deadline(pending, deadline)
+            time.sleep(interval)
+            interval = min(interval * 2, self.wait_poll_max_interval)
+
+    def _check_deployments(self, pending, finished):
+        """
+        Move pending deployments that Marathon no longer runs to finished.
+        """
+        url = urlparse.urljoin(self.marathon_api, "deployments")
+        (status_code, return_data) = Utils.make_rest_request("get", url)
+        if status_code != 200:
+            return
+        running = set(deployment["id"] for deployment in return_data or [])
+        now = time.time()
+        for deployment_id in list(pending):
+            if deployment_id not in running:
+                pending.discard(deployment_id)
+                finished[deployment_id] = now
+
+    def _wait_app_ready(self, app_id, deadline):
+        """
+        Wait until an app runs its target number of instances, counting
+        only healthy tasks when the app has health checks.
+
+        Returns:
+            float: time the app was found not ready yet and then became
+                   ready, None if it was ready at the first check
+        """
+        url = urlparse.urljoin(self.marathon_api, "apps/%s" % app_id.lstrip("/"))
+        interval = self.wait_poll_interval
+        waited = False
+        while True:
+            (status_code, return_data) = Utils.make_rest_request("get", url)
+            app = (return_data or {}).get("app") or {}
+            if app.get("healthChecks"):
+                ready_tasks = app.get("tasksHealthy", 0)
+            else:
+                ready_tasks = app.get("tasksRunning", 0)
+            if status_code == 200 and ready_tasks >= app.get("instances", 1):
+                return time.time() if waited else None
+            if time.time() > deadline:
+                raise ProviderFailedException(
+                    "Timed out waiting for Marathon app %s: %s of %s "
+                    "instances ready" % (app_id, ready_tasks,
+                                         app.get("instances", 1)))
+            waited = True
+            time.sleep(interval)
+            interval = min(interval * 2, self.wait_poll_max_interval)
+
+    @staticmethod
+    def _check_deadline(pending, deadline):
+        if time.time() > deadline:
+            raise ProviderFailedException(
+                "Timed out waiting for Marathon deployment(s): %s" %
+                ", ".join(sorted(pending)))
 
     def _process_artifacts(self):
         """ Parse and validate Marathon artifacts
-        Parsed artifacts are saved  to self.marathon_artifacts
+        Parsed artifacts are saved  to self.marathon_artifacts, until run or
+        stop submitted them
         """
         for artifact in self.artifacts:
             logger.debug("Procesesing artifact: %s", artifact)
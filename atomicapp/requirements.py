@@ -19,6 +19,7 @@
 import logging
 
 from atomicapp.constants import (LOGGER_DEFAULT,
+                                 REQUIREMENT_CAPABILITIES,
                                  REQUIREMENT_FUNCTIONS)
 from atomicapp.plugin import Plugin
 
@@ -50,11 +51,10 @@ class Requirements:
         self.graph = graph
         self.dryrun = dryrun
 
-        # We initialize the provider in order to gather provider-specific
-        # information
-        p = self.plugin.getProvider(provider)
-        self.provider = p(config, basepath, dryrun)
-        self.provider.init()
+        # The provider is only initialized once a requirement it supports
+        # is found, see _get_provider
+        self.provider_key = provider
+        self.provider = None
 
     def run(self):
         self._exec("run")
@@ -77,19 +77,28 @@ class Requirements:
             key_name = req.keys()[0]
             requirement_function = self._find_requirement_function_name(key_name)
 
-            # Check to see if the function exists in the provider,
+            # Check to see if the provider supports the requirement,
             # if it does not: warn the user
-            try:
-                requirement = getattr(self.provider, requirement_function)
-            except AttributeError:
+            if not self.plugin.supports(self.provider_key,
+                                        REQUIREMENT_CAPABILITIES[key_name]):
                 logger.warning(
                     "Requirement %s does not exist within %s. Skipping." %
-                    (requirement_function, self.provider))
+                    (requirement_function, self.provider_key))
                 continue
+            requirement = getattr(self._get_provider(), requirement_function)
 
             # Run the requirement function
             requirement(req[key_name], action)
 
+    def _get_provider(self):
+        # We initialize the provider in order to gather provider-specific
+        # information
+        if self.provider is None:
+            p = self.plugin.getProvider(self.provider_key)
+            self.provider = p(self.config, self.basepath, self.dryrun)
+            self.provider.init()
+        return self.provider
+
 
 class RequirementFailedException(Exception):
     pass
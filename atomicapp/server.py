@@ -0,0 +1,391 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import hmac
+import json
+import logging
+import os
+import socket
+import stat
+import threading
+import urlparse
+from contextlib import contextmanager
+
+from atomicapp.constants import (__ATOMICAPPVERSION__,
+                                 CACHE_DIR,
+                                 HOST_DIR,
+                                 LOGGER_DEFAULT,
+                                 SERVE_APP_CONCURRENCY,
+                                 SERVE_WORKERS)
+from atomicapp.index import Index, IndexException
+from atomicapp.nulecule import NuleculeManager
+from atomicapp.nulecule.exceptions import (DockerException,
+                                           MissingAnswersException,
+                                           NuleculeException)
+from atomicapp.plugin import ProviderFailedException
+from atomicapp.utils import Utils
+
+logger = logging.getLogger(LOGGER_DEFAULT)
+
+
+class ServerException(Exception):
+
+    """A request that could not be served, with its HTTP status"""
+
+    def __init__(self, message, status=400):
+        super(ServerException, self).__init__(message)
+        self.status = status
+
+
+class _HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixHTTPServer(_HTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects a (host, port) address
+        SocketServer.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    server_version = "atomicapp/%s" % __ATOMICAPPVERSION__
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        url = urlparse.urlparse(self.path)
+        try:
+            self.server.atomicapp.authorize(
+                self.headers.getheader("Authorization"))
+            body = self._read_body() if method == "POST" else {}
+            status, result = 200, self.server.atomicapp.dispatch(
+                method, url.path, urlparse.parse_qs(url.query), body)
+        except ServerException as e:
+            status, result = e.status, {"error": str(e)}
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            status, result = 500, {"error": str(e)}
+
+        data = json.dumps(result)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.getheader("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError as e:
+            raise ServerException("Invalid JSON in request: %s" % e)
+
+    def address_string(self):
+        # Clients of a unix socket have no address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "local"
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class Server(object):
+
+    """
+    Serves the run, stop, fetch, genanswers, render and index operations
+    over HTTP on a unix socket, or on a TCP address for clients sending
+    the token of the server as "Authorization: Bearer <token>".
+
+    The process stays up between requests, so the imported modules and
+    the caches of the process (provider classes, HTTP sessions, API
+    discovery, Docker probe and image list, parsed Nulecule and config
+    files, search index) are reused by the following requests.
+
+    Operations take a JSON object with the same options as the CLI, e.g.
+
+        POST /run {"app_spec": "projectatomic/helloapache",
+                   "cli_answers": {"provider": "docker"}}
+
+    The destination and answers_output of the operations must be under
+    `destination_root`. At most `workers` operations run at a time, and at
+    most `app_concurrency` of them for the same app_spec.
+    """
+
+    def __init__(self, address, workers=SERVE_WORKERS,
+                 app_concurrency=SERVE_APP_CONCURRENCY, token=None,
+                 destination_root=CACHE_DIR):
+        """
+        Args:
+            address (tuple or str): (host, port) to listen on or the path
+                                    of a unix socket
+            workers (int): operations running at the same time
+            app_concurrency (int): operations running at the same time
+                                   for a single app
+            token (str): token the clients must send, required on TCP
+            destination_root (str): directory the applications are
+                                    unpacked and the answers written under
+
+        Raises:
+            ServerException: serving on TCP without a token
+        """
+        if isinstance(address, tuple) and not token:
+            raise ServerException("Serving on TCP needs a token")
+        self.address = address
+        self.token = token
+        self.destination_root = destination_root
+        self.app_concurrency = app_concurrency
+        self.httpd = None
+        self.operations = {
+            "run": self._run,
+            "stop": self._stop,
+            "fetch": self._fetch,
+            "genanswers": self._genanswers,
+            "render": self._render,
+        }
+        self._workers = threading.BoundedSemaphore(workers)
+        self._app_slots = {}
+        self._app_slots_lock = threading.Lock()
+        self._index = Index()
+        self._index_lock = threading.Lock()
+
+    def start(self):
+        """
+        Bind the address. A stale unix socket left by a previous server
+        is replaced, the new one is only accessible by its owner.
+        """
+        if isinstance(self.address, tuple):
+            self.httpd = _HTTPServer(self.address, _RequestHandler)
+        else:
+            try:
+                if stat.S_ISSOCK(os.stat(self.address).st_mode):
+                    os.unlink(self.address)
+            except OSError:
+                pass
+            self.httpd = _UnixHTTPServer(self.address, _RequestHandler)
+            os.chmod(self.address, 0o600)
+        self.httpd.atomicapp = self
+        logger.info("Serving on %s", self.address)
+
+    def serve_forever(self):
+        """
+        Serve requests until shutdown is called.
+        """
+        if self.httpd is None:
+            self.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+            if not isinstance(self.address, tuple) and \
+                    os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+    def authorize(self, authorization):
+        """
+        Check the Authorization header of a request against the token.
+
+        Args:
+            authorization (str): value of the header, None if missing
+
+        Raises:
+            ServerException: the request does not have the token
+        """
+        if self.token is None:
+            return
+        if not hmac.compare_digest(str(authorization or ""),
+                                   "Bearer %s" % self.token):
+            raise ServerException("Unauthorized", 401)
+
+    def dispatch(self, method, path, query, body):
+        """
+        Serve a request.
+
+        Args:
+            method (str): GET or POST
+            path (str): path of the request url
+            query (dict): parsed query string of the request url
+            body (dict): parsed JSON body of the request
+
+        Returns:
+            dict: result to send as JSON
+
+        Raises:
+            ServerException: the request failed
+        """
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["status"]:
+            return {"version": __ATOMICAPPVERSION__,
+                    "operations": sorted(self.operations)}
+        if parts[:1] == ["index"]:
+            return self._index_request(method, parts[1:], query)
+        if method == "POST" and len(parts) == 1 and parts[0] in self.operations:
+            return self._operation(parts[0], body)
+        raise ServerException("Not found: %s %s" % (method, path), 404)
+
+    @contextmanager
+    def _app_slot(self, app_spec):
+        if os.path.exists(app_spec):
+            app_spec = os.path.realpath(app_spec)
+        with self._app_slots_lock:
+            slot = self._app_slots.get(app_spec)
+            if slot is None:
+                slot = self._app_slots[app_spec] = threading.BoundedSemaphore(
+                    self.app_concurrency)
+        with slot:
+            yield
+
+    def _operation(self, name, body):
+        if not isinstance(body, dict) or not body.get("app_spec"):
+            raise ServerException("The request needs an app_spec")
+        if not isinstance(body.get("cli_answers") or {}, dict):
+            raise ServerException("cli_answers must be an object")
+        for key in ("only", "skip"):
+            if not isinstance(body.get(key) or [], list):
+                raise ServerException("%s must be a list of components" % key)
+        for key in ("destination", "answers", "answers_output"):
+            if not isinstance(body.get(key) or "", basestring):
+                raise ServerException("%s must be a path" % key)
+        destination = body.get("destination")
+        if destination and destination.lower() != "none":
+            # The manager unpacks absolute destinations on the host
+            self._check_path("destination", destination, host=True)
+        if body.get("answers_output"):
+            self._check_path("answers_output", body["answers_output"])
+
+        with self._app_slot(body["app_spec"]):
+            with self._workers:
+                logger.info("Starting %s of %s", name, body["app_spec"])
+                # Hand the files written by the operation over to the
+                # user, apart from the ones of the other operations
+                with Utils.ownershipScope():
+                    try:
+                        return self.operations[name](body)
+                    except MissingAnswersException as e:
+                        # Params without answers can not be asked for
+                        raise ServerException(
+                            "%s, pass them in cli_answers or an answers "
+                            "file" % e)
+                    except (DockerException, NuleculeException,
+                            ProviderFailedException) as e:
+                        raise ServerException(str(e), 500)
+
+    def _check_path(self, key, path, host=False):
+        # Clients only write under the destination root, relative paths
+        # would depend on the directory of the server
+        root = self.destination_root
+        if os.path.isabs(path) and host:
+            path, root = Utils.get_real_abspath(path), Utils.get_real_abspath(root)
+        if not os.path.isabs(path) or not os.path.realpath(path).startswith(
+                os.path.realpath(root) + os.sep):
+            raise ServerException("%s must be an absolute path under %s"
+                                  % (key, self.destination_root))
+
+    @staticmethod
+    def _manager(body, destination=None):
+        return NuleculeManager(app_spec=body["app_spec"],
+                               destination=destination or body.get("destination"),
+                               cli_answers=body.get("cli_answers"),
+                               answers_file=body.get("answers"),
+                               answers_format=body.get("answers_format"),
+                               interactive=False)
+
+    @staticmethod
+    def _app_location(nm, body):
+        # Clean up the files if the client asked us to, as the CLI does
+        destination = body.get("destination")
+        if destination and destination.lower() == "none":
+            Utils.rm_dir(nm.app_path)
+            return None
+        if nm.app_path.startswith(HOST_DIR):
+            return nm.app_path[len(HOST_DIR):]
+        return nm.app_path
+
+    def _run(self, body):
+        nm = self._manager(body)
+        nm.run(answers_output=body.get("answers_output"), ask=False,
+               dryrun=bool(body.get("dryrun")), only=body.get("only"),
+               skip=body.get("skip"))
+        return {"app_path": self._app_location(nm, body)}
+
+    def _stop(self, body):
+        # The answers of the run are read from the application, the ones of
+        # the request override them as they did for the run
+        nm = NuleculeManager(app_spec=body["app_spec"],
+                             cli_answers=body.get("cli_answers"),
+                             interactive=False)
+        nm.stop(dryrun=bool(body.get("dryrun")), only=body.get("only"),
+                skip=body.get("skip"))
+        return {"app_path": self._app_location(nm, body)}
+
+    def _fetch(self, body):
+        nm = self._manager(body)
+        nm.fetch(nodeps=bool(body.get("nodeps")),
+                 update=bool(body.get("update")),
+                 dryrun=bool(body.get("dryrun")))
+        return {"app_path": self._app_location(nm, body)}
+
+    def _genanswers(self, body):
+        nm = self._manager(body, destination="none")
+        try:
+            return {"answers": nm.get_answers(dryrun=bool(body.get("dryrun")))}
+        finally:
+            Utils.rm_dir(nm.app_path)
+
+    def _render(self, body):
+        nm = self._manager(body)
+        provider = nm.render(dryrun=bool(body.get("dryrun")),
+                             only=body.get("only"), skip=body.get("skip"))
+        return {"app_path": self._app_location(nm, body),
+                "provider": provider}
+
+    def _index_request(self, method, parts, query):
+        with self._index_lock:
+            try:
+                if method == "GET" and not parts:
+                    entries = self._index.find(
+                        " ".join(query.get("q", [])),
+                        Utils.isTrue((query.get("substring") or [""])[0]))
+                    return {"nulecules": entries}
+                if method == "GET" and len(parts) == 1:
+                    return self._index.get_entry(parts[0])
+                if method == "POST" and parts == ["update"]:
+                    self._index.update()
+                    return {"nulecules": self._index.find()}
+            except IndexException as e:
+                raise ServerException(str(e), 404 if method == "GET" else 500)
+        raise ServerException("Not found: %s /index/%s"
+                              % (method, "/".join(parts)), 404)
@@ -18,15 +18,25 @@
 """
 
 from __future__ import print_function
+import copy
 import distutils.dir_util
+import errno
+import fcntl
+import hashlib
+import json
 import os
 import pwd
 import sys
 import tempfile
 import re
-import anymarkup
+import shutil
+import marshal
+import threading
+import time
+import urlparse
 import uuid
-import requests
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from distutils.spawn import find_executable
 
 import logging
@@ -34,14 +44,33 @@ import logging
 from subprocess import Popen, PIPE
 from constants import (APP_ENT_PATH,
                        CACHE_DIR,
+                       COPY_MANIFEST,
                        EXTERNAL_APP_DIR,
                        HOST_DIR,
                        LOGGER_COCKPIT,
                        LOGGER_DEFAULT,
+                       PARSED_FILES_MAX,
+                       REST_BACKOFF,
+                       REST_POOL_SIZE,
+                       REST_RETRIES,
+                       REST_RETRY_STATUS,
+                       REST_TIMEOUT,
+                       SPEC_CACHE_DIR,
+                       SPEC_CACHE_MAX_FILES,
                        WORKDIR)
 
 __all__ = ('Utils')
 
+# anymarkup and requests are imported where they are used, importing them
+# dominates the startup of the CLI for commands that don't need them
+
+# The user running atomicapp and the root of the host filesystem. uid and
+# gid are None when the user does not exist on the host.
+Identity = namedtuple("Identity", ["user", "uid", "gid", "home", "root"])
+
+# ioctl cloning a file on copy-on-write filesystems (linux/fs.h)
+FICLONE = 0x40049409
+
 cockpit_logger = logging.getLogger(LOGGER_COCKPIT)
 logger = logging.getLogger(LOGGER_DEFAULT)
 
@@ -81,6 +110,31 @@ class Utils(object):
     __workdir = None
     target_path = None
 
+    # Identity, root and passwd entries of the host, resolved once per
+    # process, see getIdentity
+    _identity = None
+    _root = None
+    _passwd = {}
+
+    # Paths created or modified during this run that have to be owned by
+    # the user running atomicapp, mapped to whether to include their
+    # contents. See trackOwnership and fixOwnership.
+    _owned_paths = {}
+    _owned_paths_lock = threading.Lock()
+    # Paths tracked by a thread inside ownershipScope
+    _owned_scope = threading.local()
+
+    # Pooled HTTP sessions used by make_rest_request, keyed by host
+    _rest_sessions = {}
+    _rest_sessions_lock = threading.Lock()
+    # Number of calls and their total and maximum latency, keyed by host
+    rest_latency = {}
+
+    # Files parsed by this process, least recently used first, see
+    # parse_file_memoized
+    _parsed_files = OrderedDict()
+    _parsed_files_lock = threading.Lock()
+
     @property
     def workdir(self):
         if not self.__workdir:
@@ -120,6 +174,7 @@ class Utils(object):
         # Validate it as an openshift endpoint (could just be
         # kubernetes). Don't worry about ssl verification for now
         # as the openshift provider will do that.
+        import requests
         try:
             response = requests.get(url, verify=False)
             if response.status_code == 200:
@@ -303,8 +358,7 @@ class Utils(object):
         if not os.path.isfile(path):
             return None
 
-        data = anymarkup.parse_file(path)
-        return data.get("id")
+        return Utils.parse_spec_file(path).get("id")
 
     @staticmethod
     def getDockerCli(dryrun=False):
@@ -326,17 +380,13 @@ class Utils(object):
         Returns:
             (bool): True == we are in a container
         """
-        if os.path.isdir(HOST_DIR):
-            return True
-        else:
-            return False
+        return Utils.getRoot() == HOST_DIR
 
     @staticmethod
     def getRoot():
-        if Utils.inContainer():
-            return HOST_DIR
-        else:
-            return "/"
+        if Utils._root is None:
+            Utils._root = HOST_DIR if os.path.isdir(HOST_DIR) else "/"
+        return Utils._root
 
     @staticmethod
     def get_real_abspath(path):
@@ -365,6 +415,7 @@ class Utils(object):
             raise AtomicAppUtilsException(
                 "Provided answers file does not exist: %s" % answers_file)
 
+        import anymarkup
         logger.debug("Loading answers from file: %s", answers_file)
         try:
             # Try to load answers file with a specified answers file format
@@ -378,9 +429,375 @@ class Utils(object):
         return result
 
     @staticmethod
-    def copy_dir(src, dest, update=False, dryrun=False):
-        if not dryrun:
-            distutils.dir_util.copy_tree(src, dest, update)
+    def parse_file_cached(path, cache_path, parse=None):
+        """
+        Parse a file, keeping the parsed data compiled with marshal in
+        cache_path. The cache is used as long as the mtime and size of the
+        file do not change, unchanged files are not parsed again.
+
+        Args:
+            path (str): path of the file to parse
+            cache_path (str): path of the compiled cache
+            parse (function): parser called with path on cache misses,
+                              anymarkup.parse_file by default
+
+        Returns:
+            the parsed data
+        """
+        st = os.stat(path)
+        # marshal format is specific to the Python version
+        key = [sys.version, st.st_mtime, st.st_size]
+        data = Utils._read_compiled(cache_path, key)
+        if data is not None:
+            return data
+
+        if parse is None:
+            import anymarkup
+            parse = anymarkup.parse_file
+        data = parse(path)
+        Utils._write_compiled(cache_path, key, data)
+        return data
+
+    @staticmethod
+    def parse_file_hashed(path, cache_dir, parse=None):
+        """
+        Parse a file, keeping the parsed data compiled with marshal in
+        cache_dir under the hash of the content of the file. Copies of a
+        file, e.g. the same external application extracted for several
+        apps, share the cached data. The hash of a file is kept under its
+        path, inode, mtime and size, so unchanged files are not read again.
+        At most SPEC_CACHE_MAX_FILES cache files are kept, and the files
+        and directories created are handed over to the user (see
+        trackOwnership).
+
+        Args:
+            path (str): path of the file to parse
+            cache_dir (str): directory of the compiled caches
+            parse (function): parser called with path on cache misses,
+                              anymarkup.parse_file by default
+
+        Returns:
+            the parsed data
+        """
+        st = os.stat(path)
+        stamp = hashlib.sha256("%s|%s|%s|%s|%s" % (
+            os.path.abspath(path), st.st_dev, st.st_ino, st.st_mtime,
+            st.st_size)).hexdigest()
+        # marshal format is specific to the Python version
+        stamp_key = [sys.version, stamp]
+        stamp_path = os.path.join(cache_dir, "stamp-%s" % stamp)
+        digest = Utils._read_compiled(stamp_path, stamp_key)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        key = [sys.version, digest]
+        cache_path = os.path.join(cache_dir, digest)
+        data = Utils._read_compiled(cache_path, key)
+        if data is not None:
+            if not os.path.exists(stamp_path):
+                Utils._write_spec_cache(cache_dir, stamp_path, stamp_key,
+                                        digest)
+            return data
+
+        if parse is None:
+            import anymarkup
+            parse = anymarkup.parse_file
+        data = parse(path)
+        if Utils._write_spec_cache(cache_dir, cache_path, key, data):
+            Utils._write_spec_cache(cache_dir, stamp_path, stamp_key, digest)
+        return data
+
+    @staticmethod
+    def _read_compiled(cache_path, key):
+        """
+        Read data written by _write_compiled with the same key.
+
+        Returns:
+            the data, None if the file is missing or has another key
+        """
+        try:
+            with open(cache_path, "rb") as f:
+                cached_key, data = marshal.load(f)
+            if cached_key == key:
+                return data
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            pass
+        return None
+
+    @staticmethod
+    def _write_spec_cache(cache_dir, cache_path, key, data):
+        """
+        Write a cache file of parse_file_hashed, creating cache_dir and
+        removing the oldest cache files beyond SPEC_CACHE_MAX_FILES.
+
+        Returns:
+            bool: whether cache_dir exists
+        """
+        try:
+            if not os.path.isdir(cache_dir):
+                created = cache_dir
+                while not os.path.isdir(os.path.dirname(created)):
+                    created = os.path.dirname(created)
+                os.makedirs(cache_dir)
+                Utils.trackOwnership(created)
+        except OSError as e:
+            logger.debug("Unable to create %s: %s", cache_dir, e)
+            return False
+        Utils._write_compiled(cache_path, key, data)
+        Utils.trackOwnership(cache_path, recursive=False)
+
+        try:
+            names = os.listdir(cache_dir)
+            if len(names) <= SPEC_CACHE_MAX_FILES:
+                return True
+            files = []
+            for name in names:
+                path = os.path.join(cache_dir, name)
+                files.append((os.stat(path).st_mtime, path))
+            for _, path in sorted(files)[:len(files) - SPEC_CACHE_MAX_FILES]:
+                os.unlink(path)
+        except OSError as e:
+            logger.debug("Unable to prune %s: %s", cache_dir, e)
+        return True
+
+    @staticmethod
+    def parse_spec_file(path, parse=None):
+        """
+        Parse a Nulecule file. The parsed data is memoized for the process
+        (see parse_file_memoized) and cached by content hash in
+        SPEC_CACHE_DIR of the home of the user (see parse_file_hashed), so
+        a file is parsed once and loading it again costs a stat, or a read
+        and an unmarshal in a new process. Users without a home directory
+        only get the memoized data.
+
+        Args:
+            path (str): path of the Nulecule file
+            parse (function): parser called with path on cache misses,
+                              anymarkup.parse_file by default
+
+        Returns:
+            the parsed data
+        """
+        home = Utils.getUserHome()
+        if not os.path.isabs(home):
+            # No passwd entry, the home is a literal '~user'
+            return Utils.parse_file_memoized(path, parse)
+        cache_dir = os.path.join(home, SPEC_CACHE_DIR)
+        return Utils.parse_file_memoized(
+            path, lambda path: Utils.parse_file_hashed(path, cache_dir, parse))
+
+    @staticmethod
+    def _write_compiled(cache_path, key, data):
+        """
+        Atomically write data compiled with marshal and its key to
+        cache_path. Data that can not be compiled is not written.
+        """
+        try:
+            compiled = marshal.dumps((key, data))
+        except ValueError:
+            logger.debug("Unable to compile data for %s, not caching it",
+                         cache_path)
+            return
+
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".",
+                                       prefix=".compiled-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(compiled)
+            os.rename(tmp, cache_path)
+        except (IOError, OSError) as e:
+            logger.debug("Unable to write %s: %s", cache_path, e)
+
+    @staticmethod
+    def parse_file_memoized(path, parse=None):
+        """
+        Parse a file once per process. The parsed data is kept in memory
+        by inode, so hard links to a file share it, and is reused as long
+        as the mtime and size of the file do not change. At most
+        PARSED_FILES_MAX files are kept, the least recently used are
+        dropped. Callers get their own copy of the data.
+
+        Args:
+            path (str): path of the file to parse
+            parse (function): parser called with path on cache misses,
+                              anymarkup.parse_file by default
+
+        Returns:
+            the parsed data
+        """
+        st = os.stat(path)
+        inode = (st.st_dev, st.st_ino)
+        key = (st.st_mtime, st.st_size)
+        with Utils._parsed_files_lock:
+            cached = Utils._parsed_files.pop(inode, None)
+            if cached is not None:
+                Utils._parsed_files[inode] = cached
+        if cached is None or cached[0] != key:
+            if parse is None:
+                import anymarkup
+                parse = anymarkup.parse_file
+            cached = (key, parse(path))
+            with Utils._parsed_files_lock:
+                Utils._parsed_files.pop(inode, None)
+                Utils._parsed_files[inode] = cached
+                while len(Utils._parsed_files) > PARSED_FILES_MAX:
+                    Utils._parsed_files.popitem(last=False)
+        return copy.deepcopy(cached[1])
+
+    @staticmethod
+    def copy_dir(src, dest, update=False, dryrun=False, link=False):
+        """
+        Copy the src directory tree to dest. A manifest of the copied files
+        is kept in the WORKDIR of dest, files whose source and copy did not
+        change since the last copy are skipped and files removed from src
+        since then are removed from dest as well. Files are cloned on
+        copy-on-write filesystems and, if link is True, hardlinked when src
+        and dest share a filesystem.
+
+        Args:
+            src (str): source directory
+            dest (str): destination directory
+            update (bool): only copy files that are newer than their copy
+            dryrun (bool): do not copy anything
+            link (bool): hardlink files, only safe when src is not modified
+                         afterwards, e.g. a temporary directory
+
+        Returns:
+            list of the files and directories created or updated in dest
+        """
+        if dryrun:
+            return []
+
+        manifest_path = os.path.join(dest, WORKDIR, COPY_MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            manifest = {}
+        skip = os.path.relpath(manifest_path, dest)
+
+        copied = []
+        seen = set()
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+            copied.append(dest)
+        for root, dirs, files in os.walk(src, followlinks=True):
+            dest_root = os.path.join(dest, os.path.relpath(root, src))
+            for name in dirs:
+                dest_dir = os.path.join(dest_root, name)
+                if not os.path.isdir(dest_dir):
+                    os.mkdir(dest_dir)
+                    copied.append(dest_dir)
+            for name in files:
+                src_file = os.path.join(root, name)
+                rel = os.path.relpath(src_file, src)
+                if rel == skip:
+                    continue
+                seen.add(rel)
+                entry, changed = Utils._copy_file(
+                    src_file, os.path.join(dest, rel), manifest.get(rel),
+                    update, link)
+                if entry is not None:
+                    manifest[rel] = entry
+                if changed:
+                    copied.append(os.path.join(dest, rel))
+
+        # Remove the files we copied before but are gone from src, unless
+        # they were modified in dest
+        for rel in set(manifest) - seen:
+            dest_file = os.path.join(dest, rel)
+            if Utils._stat_key(dest_file) == manifest[rel]["dest"]:
+                logger.debug("Removing %s, it is no longer in %s", dest_file, src)
+                os.unlink(dest_file)
+            del manifest[rel]
+
+        if not os.path.isdir(os.path.dirname(manifest_path)):
+            os.makedirs(os.path.dirname(manifest_path))
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        logger.debug("Copied %s files from %s to %s", len(copied), src, dest)
+        return copied
+
+    @staticmethod
+    def _stat_key(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_size, st.st_mtime]
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _copy_file(src, dest, entry, update, link):
+        """
+        Copy a single file unless its manifest entry shows that dest is
+        already up to date.
+
+        Returns:
+            tuple (entry, changed): the manifest entry of dest and whether
+                                    dest was copied
+        """
+        src_key = Utils._stat_key(src)
+        dest_key = Utils._stat_key(dest)
+        unmodified = entry is not None and dest_key == entry["dest"]
+        if unmodified and src_key == entry["src"]:
+            return (entry, False)
+        if update and dest_key is not None and dest_key[1] >= src_key[1]:
+            return (entry, False)
+        src_hash = Utils._hash_file(src)
+        if unmodified and src_hash == entry["hash"]:
+            return (dict(entry, src=src_key), False)
+
+        tmp = os.path.join(os.path.dirname(dest),
+                           ".%s.%s" % (os.path.basename(dest), uuid.uuid4().hex))
+        try:
+            Utils._link_or_copy(src, tmp, link)
+            os.rename(tmp, dest)
+        except Exception:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        return ({"src": src_key, "dest": Utils._stat_key(dest), "hash": src_hash},
+                True)
+
+    @staticmethod
+    def _link_or_copy(src, dest, link):
+        """
+        Create dest as a hardlink of src if link is True, otherwise as a
+        clone or copy of src, preserving its mode and times.
+        """
+        if link:
+            try:
+                os.link(src, dest)
+                return
+            except OSError:
+                pass
+
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+            try:
+                fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+                cloned = True
+            except (IOError, OSError):
+                cloned = False
+            if not cloned and hasattr(os, "sendfile"):
+                size = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(fdest.fileno(), fsrc.fileno(),
+                                       offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            elif not cloned:
+                shutil.copyfileobj(fsrc, fdest, 1024 * 1024)
+        shutil.copystat(src, dest)
 
     @staticmethod
     def rm_dir(directory):
@@ -390,50 +807,169 @@ class Utils(object):
     @staticmethod
     def getUidGid(user):
         """
-        Get the UID and GID of the specific user by grepping /etc/passwd unless
-        we are in a container.
+        Get the UID and GID of the specific user from /etc/passwd of the
+        host, see _getPasswdEntry.
 
         Returns:
             (int): User UID
             (int): User GID
         """
+        entry = Utils._getPasswdEntry(user)
+        if entry is None:
+            raise KeyError("getpwnam(): name not found: %s" % user)
+        uid, gid, _ = entry
+        return int(uid), int(gid)
+
+    @staticmethod
+    def _getPasswdEntry(user):
+        """
+        Get the uid, gid and home directory of user from the passwd database
+        of the host. If we're in a container /host/etc/passwd is parsed, we
+        don't chroot into /host. Entries are cached for the whole process.
 
-        # If we're in a container we should be looking in the /host/ directory
-        if Utils.inContainer():
-            os.chroot(HOST_DIR)
-            uid = pwd.getpwnam(user).pw_uid
-            gid = pwd.getpwnam(user).pw_gid
-            os.chroot("../..")
+        Returns:
+            tuple (uid, gid, home) or None if there is no such user
+        """
+        if user in Utils._passwd:
+            return Utils._passwd[user]
+
+        entry = None
+        if user is None:
+            pass
+        elif Utils.inContainer():
+            passwd = os.path.join(HOST_DIR, "etc/passwd")
+            try:
+                with open(passwd) as f:
+                    for line in f:
+                        fields = line.rstrip("\n").split(":")
+                        if len(fields) >= 7 and fields[0] == user:
+                            entry = (int(fields[2]), int(fields[3]), fields[5])
+                            break
+            except (IOError, ValueError) as e:
+                logger.warning("Unable to read %s: %s", passwd, e)
         else:
-            uid = pwd.getpwnam(user).pw_uid
-            gid = pwd.getpwnam(user).pw_gid
+            try:
+                pw = pwd.getpwnam(user)
+                entry = (pw.pw_uid, pw.pw_gid, pw.pw_dir)
+            except KeyError:
+                pass
+        Utils._passwd[user] = entry
+        return entry
 
-        return int(uid), int(gid)
+    @staticmethod
+    def getIdentity():
+        """
+        Resolve the user running atomicapp, its uid, gid and home directory
+        and the root of the host filesystem. They are resolved once and
+        kept for the whole process.
+
+        Returns:
+            Identity
+        """
+        if Utils._identity is None:
+            user = Utils.getUserName()
+            entry = Utils._getPasswdEntry(user)
+            if entry is None:
+                # Warn if none is detected, don't error as not having a home
+                # dir doesn't mean we fail.
+                logger.error("No home directory exists for user %s" % user)
+                uid = gid = None
+                home = "~%s" % user
+            else:
+                uid, gid, home = entry
+            Utils._identity = Identity(user, uid, gid, home, Utils.getRoot())
+            logger.debug("Running as user %s. Using home directory %s for configuration data"
+                         % (user, home))
+        return Utils._identity
 
     @staticmethod
-    def setFileOwnerGroup(src):
+    def _chown_tree(src, uid, gid, recursive=True):
         """
-        This function sets the correct uid and gid bits to a source
-        file or directory given the current user that is running Atomic
-        App.
+        chown src and, if it's a dir and recursive, all files within it.
+        Entries already owned by uid and gid are left alone.
         """
-        user = Utils.getUserName()
+        def chown(path):
+            st = os.stat(path)
+            if st.st_uid != uid or st.st_gid != gid:
+                os.chown(path, uid, gid)
 
-        # Get the UID of the User
-        uid, gid = Utils.getUidGid(user)
+        chown(src)
+        if recursive and os.path.isdir(src):
+            for root, dirs, files in os.walk(src):
+                for name in dirs + files:
+                    chown(os.path.join(root, name))
 
-        logger.debug("Setting gid/uid of %s to %s,%s" % (src, uid, gid))
+    @staticmethod
+    def trackOwnership(path, recursive=True):
+        """
+        Record a file or directory created or modified by atomicapp, so
+        that fixOwnership hands it over to the user running atomicapp.
 
-        # chown the file/dir
-        os.chown(src, uid, gid)
+        Args:
+            path (str): path of the file or directory
+            recursive (bool): also fix everything within the directory
+        """
+        path = os.path.abspath(path)
+        scoped = getattr(Utils._owned_scope, "paths", None)
+        if scoped is not None:
+            scoped[path] = recursive or scoped.get(path, False)
+            return
+        with Utils._owned_paths_lock:
+            Utils._owned_paths[path] = \
+                recursive or Utils._owned_paths.get(path, False)
 
-        # If it's a dir, chown all files within it
-        if os.path.isdir(src):
-            for root, dirs, files in os.walk(src):
-                for d in dirs:
-                    os.chown(os.path.join(root, d), uid, gid)
-                for f in files:
-                    os.chown(os.path.join(root, f), uid, gid)
+    @staticmethod
+    @contextmanager
+    def ownershipScope():
+        """
+        Keep the paths tracked by the current thread apart from the ones
+        of the other threads until the end of the block, where they are
+        fixed. Operations running concurrently, e.g. in atomicapp serve,
+        only fix their own paths.
+        """
+        Utils._owned_scope.paths = {}
+        try:
+            yield
+        finally:
+            try:
+                Utils.fixOwnership()
+            finally:
+                Utils._owned_scope.paths = None
+
+    @staticmethod
+    def fixOwnership():
+        """
+        Set the uid and gid of the user running atomicapp on all the paths
+        recorded by trackOwnership since the last call, in one pass. Paths
+        within recursively tracked directories are only visited once and
+        paths that were removed in the meantime are skipped. Inside
+        ownershipScope, only the paths of the current thread are fixed.
+        """
+        paths = getattr(Utils._owned_scope, "paths", None)
+        if paths is not None:
+            Utils._owned_scope.paths = {}
+        else:
+            with Utils._owned_paths_lock:
+                paths = Utils._owned_paths
+                Utils._owned_paths = {}
+        if not paths:
+            return
+
+        uid, gid = Utils.getUidGid(Utils.getIdentity().user)
+        logger.debug("Setting gid/uid of %s paths to %s,%s",
+                     len(paths), uid, gid)
+        covered = None
+        for path in sorted(paths):
+            # Sorted, a directory comes right before everything within it
+            if covered and path.startswith(covered):
+                continue
+            try:
+                Utils._chown_tree(path, uid, gid, paths[path])
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    logger.warning("Unable to set the owner of %s: %s", path, e)
+                continue
+            covered = os.path.join(path, "") if paths[path] else None
 
     @staticmethod
     def getUserName():
@@ -462,35 +998,59 @@ class Utils(object):
         a volume.
         Ex. docker run -v /:/host -e SUDO_USER -e USER foobar
         """
-        logger.debug("Finding the users home directory")
-        user = Utils.getUserName()
-        incontainer = Utils.inContainer()
+        return Utils.getIdentity().home
 
-        # Check to see if we are running in a container. If we are we
-        # will chroot into the /host path before calling os.path.expanduser
-        if incontainer:
-            os.chroot(HOST_DIR)
+    @staticmethod
+    def get_rest_session(url):
+        """
+        Get the pooled HTTP session for the host of url. Sessions keep
+        connections alive and retry idempotent requests with backoff when
+        the server answers with one of REST_RETRY_STATUS. Read timeouts
+        are not retried, a hung server fails the request after a single
+        read timeout.
 
-        # Call os.path.expanduser to determine the user's home dir.
-        # See https://docs.python.org/2/library/os.path.html#os.path.expanduser
-        # Warn if none is detected, don't error as not having a home
-        # dir doesn't mean we fail.
-        home = os.path.expanduser("~%s" % user)
-        if home == ("~%s" % user):
-            logger.error("No home directory exists for user %s" % user)
+        Args:
+            url (str): url
 
-        # Back out of chroot if necessary
-        if incontainer:
-            os.chroot("../..")
+        Returns:
+            requests.Session
+        """
+        parsed = urlparse.urlparse(url)
+        key = "%s://%s" % (parsed.scheme, parsed.netloc)
+        with Utils._rest_sessions_lock:
+            session = Utils._rest_sessions.get(key)
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from requests.packages.urllib3.util.retry import Retry
+                retries = Retry(total=REST_RETRIES,
+                                read=False,
+                                backoff_factor=REST_BACKOFF,
+                                status_forcelist=REST_RETRY_STATUS,
+                                raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=REST_POOL_SIZE,
+                                      max_retries=retries)
+                session = requests.Session()
+                session.mount(key, adapter)
+                Utils._rest_sessions[key] = session
+        return session
 
-        logger.debug("Running as user %s. Using home directory %s for configuration data"
-                     % (user, home))
-        return home
+    @staticmethod
+    def _record_rest_latency(url, latency):
+        host = urlparse.urlparse(url).netloc
+        with Utils._rest_sessions_lock:
+            stats = Utils.rest_latency.setdefault(
+                host, {"calls": 0, "total": 0.0, "max": 0.0})
+            stats["calls"] += 1
+            stats["total"] += latency
+            stats["max"] = max(stats["max"], latency)
 
     @staticmethod
-    def make_rest_request(method, url, verify=True, data=None, headers={}):
+    def make_rest_request(method, url, verify=True, data=None, headers=None,
+                          timeout=REST_TIMEOUT):
         """
-        Make HTTP request to url
+        Make HTTP request to url using the pooled session of its host
 
         Args:
             method (str): http method (post/get/delete)
@@ -500,6 +1060,9 @@ class Utils(object):
                                   of trusted CAs
             data (dict/list): object to be serialised to json and send as http
                               data (when method=post/put/delete)
+            headers (dict): extra http headers
+            timeout (float/tuple): seconds to wait for the server to connect
+                                   and to send data, see requests' timeout
 
         Returns:
             tuple (status_code, return_data): status_code - http status code
@@ -512,19 +1075,21 @@ class Utils(object):
 
         status_code = None
         return_data = None
-
+        headers = dict(headers or {})
+        method = method.lower()
+        if method == "patch":
+            headers.update({"Content-Type": "application/json-patch+json"})
+
+        import requests
+        session = Utils.get_rest_session(url)
+        start = time.time()
         try:
-            if method.lower() == "get":
-                res = requests.get(url, verify=verify, headers=headers)
-            elif method.lower() == "post":
-                res = requests.post(url, json=data, verify=verify, headers=headers)
-            elif method.lower() == "put":
-                res = requests.put(url, json=data, verify=verify, headers=headers)
-            elif method.lower() == "delete":
-                res = requests.delete(url, json=data, verify=verify, headers=headers)
-            elif method.lower() == "patch":
-                headers.update({"Content-Type": "application/json-patch+json"})
-                res = requests.patch(url, json=data, verify=verify, headers=headers)
+            if method == "get":
+                res = session.get(url, verify=verify, headers=headers,
+                                  timeout=timeout)
+            else:
+                res = session.request(method, url, json=data, verify=verify,
+                                      headers=headers, timeout=timeout)
 
             status_code = res.status_code
             return_data = res.json()
@@ -539,5 +1104,10 @@ class Utils(object):
         except ValueError:
             # invalid json
             return_data = None
+        finally:
+            latency = time.time() - start
+            Utils._record_rest_latency(url, latency)
+            logger.debug("%s %s: %s in %.3fs", method.upper(), url,
+                         status_code, latency)
 
         return (status_code, return_data)
@@ -0,0 +1,471 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+from collections import OrderedDict
+
+from atomicapp.constants import (ANSWERS_FILE,
+                                 ANSWERS_RUNTIME_FILE,
+                                 DEFAULTNAME_KEY,
+                                 LOGGER_DEFAULT,
+                                 MAIN_FILE,
+                                 NAME_KEY,
+                                 PROVIDER_CAPABILITY_PARTIAL,
+                                 WATCH_DEBOUNCE,
+                                 WATCH_POLL_INTERVAL)
+from atomicapp.nulecule.base import Nulecule
+from atomicapp.plugin import Plugin
+from atomicapp.utils import Utils
+
+logger = logging.getLogger(LOGGER_DEFAULT)
+
+# inotify(7) flags and events
+_IN_CLOEXEC = 0o2000000
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_EVENT = struct.Struct("iIII")
+
+
+class WatchException(Exception):
+    pass
+
+
+class _InotifyWatcher(object):
+
+    """Changes of the files of some directories, reported by inotify"""
+
+    mask = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+
+    def __init__(self, dirs):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise WatchException("inotify is not available")
+        self.fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self.fd < 0:
+            raise WatchException("inotify is not available: %s"
+                                 % os.strerror(ctypes.get_errno()))
+        self.dirs = {}
+        for path in dirs:
+            wd = libc.inotify_add_watch(self.fd, path, self.mask)
+            if wd < 0:
+                error = os.strerror(ctypes.get_errno())
+                os.close(self.fd)
+                raise WatchException("Unable to watch %s: %s" % (path, error))
+            self.dirs[wd] = path
+
+    def wait(self, timeout=None):
+        """
+        Wait for changes.
+
+        Args:
+            timeout (float): seconds to wait at most, forever by default
+
+        Returns:
+            set: paths of the changed files, empty if there were none
+        """
+        try:
+            if not select.select([self.fd], [], [], timeout)[0]:
+                return set()
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return set()
+            raise
+        data = os.read(self.fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _IN_EVENT.unpack_from(data, offset)
+            offset += _IN_EVENT.size
+            name = data[offset:offset + length].rstrip("\0")
+            offset += length
+            if wd in self.dirs and name:
+                changed.add(os.path.join(self.dirs[wd], name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingWatcher(object):
+
+    """Changes of the files of some directories, found by scanning them"""
+
+    def __init__(self, dirs, interval=WATCH_POLL_INTERVAL):
+        self.dirs = dirs
+        self.interval = interval
+        self.files = self._scan()
+
+    def _scan(self):
+        files = {}
+        for path in self.dirs:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                continue
+            for name in names:
+                filepath = os.path.join(path, name)
+                try:
+                    st = os.stat(filepath)
+                except OSError:
+                    continue
+                files[filepath] = (st.st_mtime, st.st_size)
+        return files
+
+    def wait(self, timeout=None):
+        """
+        Wait for changes, see _InotifyWatcher.wait.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            files = self._scan()
+            changed = set(path for path in set(files) | set(self.files)
+                          if files.get(path) != self.files.get(path))
+            self.files = files
+            if changed:
+                return changed
+            if deadline is None:
+                time.sleep(self.interval)
+            elif time.time() >= deadline:
+                return set()
+            else:
+                time.sleep(min(self.interval, deadline - time.time()))
+
+    def close(self):
+        pass
+
+
+def _walk(nulecule):
+    """
+    The Nulecule applications and components of an application, including
+    its external applications.
+    """
+    yield nulecule
+    for component in nulecule.components:
+        yield component
+        if component.app:
+            for item in _walk(component.app):
+                yield item
+
+
+class Watch(object):
+
+    """
+    Keeps a running Nulecule application in sync with its files, for
+    `atomicapp run --watch`.
+
+    The directories of the Nulecule files, of the artifacts and of the
+    answers file are watched with inotify, or scanned every
+    WATCH_POLL_INTERVAL seconds where inotify is not available. When
+    artifact files change, only the artifacts rendered from them are
+    rendered again. When a Nulecule file or the answers change, the
+    application is loaded again and all its artifacts are rendered.
+
+    Either way only the artifacts whose rendered content changed are
+    applied: their objects are stopped with the previous rendered file and
+    run from the new one. Providers that can not apply some artifacts of a
+    component on their own (see PROVIDER_CAPABILITY_PARTIAL) apply all the
+    artifacts of the changed components. Requirements of the application
+    are not processed again.
+    """
+
+    def __init__(self, nm, dryrun=False, ask=False, only=None, skip=None):
+        """
+        Args:
+            nm (NuleculeManager): manager that ran the application
+            dryrun (bool): Do not make any change to the host system
+            ask (bool): All the params were asked for during the run, not
+                        only the ones without default value
+            only (list): names of the components that were run
+            skip (list): names of the components that were not run
+        """
+        self.nm = nm
+        self.dryrun = dryrun
+        self.ask = ask
+        self.only = only
+        self.skip = skip
+        self.provider_key = nm.nulecule.config.get('provider')
+        self.jobs = self._get_jobs(nm.nulecule)
+        self._asked = self._get_asked_answers(nm.nulecule)
+        self._watcher = None
+        self._dirs = None
+
+    def watch(self):
+        """
+        Apply the changes of the files until interrupted with Ctrl-C.
+        """
+        logger.info("Watching %s for changes, press Ctrl-C to stop",
+                    self.nm.app_path)
+        try:
+            while True:
+                self._open()
+                changed = self._watcher.wait()
+                # Editors write a file in several steps, and several files
+                # are often saved at once
+                while changed:
+                    more = self._watcher.wait(WATCH_DEBOUNCE)
+                    if not more:
+                        break
+                    changed |= more
+                self.apply(changed)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+    def apply(self, changed):
+        """
+        Apply changes of files of the application. Failures are logged,
+        the next change is applied again. The files written are handed
+        over to the user after each cycle.
+
+        Args:
+            changed (set): paths of the changed files
+        """
+        sources = set(path for _, path in self.jobs)
+        artifact_dirs = set(os.path.dirname(path) for path in sources) - \
+            set(self._get_app_dirs())
+        answers_files = self._get_answers_files()
+
+        reload = False
+        artifacts = set()
+        for path in changed:
+            path = os.path.normpath(path)
+            name = os.path.basename(path)
+            # Rendered artifacts, editor swap and backup files
+            if name.startswith('.') or name.endswith('~') or \
+                    name == ANSWERS_RUNTIME_FILE:
+                continue
+            if path in sources:
+                artifacts.add(path)
+            elif name == MAIN_FILE or path in answers_files or \
+                    os.path.dirname(path) in artifact_dirs:
+                # Nulecule files, answers, or artifacts added to or
+                # removed from artifact directories
+                reload = True
+
+        try:
+            if reload:
+                logger.info("Loading the application again")
+                self.reload()
+            elif artifacts:
+                logger.info("Rendering %s again", ", ".join(sorted(artifacts)))
+                self._apply([job for key, job in self.jobs.items()
+                             if key[1] in artifacts])
+        except Exception as e:
+            logger.debug(e, exc_info=True)
+            logger.error("Unable to apply the changes: %s", e)
+        finally:
+            # Hand the files rendered by this cycle over to the user, the
+            # watch runs until it is interrupted
+            Utils.fixOwnership()
+
+    def reload(self):
+        """
+        Load the application again, render its artifacts and apply the
+        ones that changed. The values asked for during the run are kept,
+        unless the answers provide them now.
+
+        Raises:
+            WatchException: the provider changed
+        """
+        nm = self.nm
+        config = nm.config
+        config.update_source('runtime', {})
+        nm._process_answers()
+        for (scope, name), value in self._asked.items():
+            if config.get(name, scope=scope,
+                          ignore_sources=['defaults']) is None:
+                config.set(name, value, source='runtime', scope=scope)
+
+        nm.nulecule = Nulecule.load_from_path(
+            nm.app_path, config=config, dryrun=self.dryrun)
+        nm._select_components(self.only, self.skip)
+        nm.nulecule.load_config(config=config)
+        provider_key = nm.nulecule.config.get('provider')
+        if provider_key != self.provider_key:
+            raise WatchException(
+                "The provider changed from %s to %s, stop the application "
+                "and run it again" % (self.provider_key, provider_key))
+
+        previous_jobs, self.jobs = self.jobs, self._get_jobs(nm.nulecule)
+        self._asked = self._get_asked_answers(nm.nulecule)
+        self._apply(self.jobs.values(), previous_jobs)
+
+    def _apply(self, jobs, previous_jobs=None):
+        """
+        Render artifacts and apply the ones whose rendered content changed.
+
+        Args:
+            jobs (list): (component, provider, artifact path, context)
+                         tuples to render
+            previous_jobs (OrderedDict): jobs applied before reloading the
+                                         application, the artifacts that
+                                         are gone are stopped
+        """
+        if previous_jobs is None:
+            previous_jobs = self.jobs
+        changes = OrderedDict()
+        for component, provider, path, context in jobs:
+            content = component.render_artifact_content(path, context,
+                                                        provider)
+            if content != self._read_rendered(component, path):
+                changes.setdefault(component.name, {})[path] = content
+        for key, (component, _, path, _) in previous_jobs.items():
+            if key not in self.jobs:
+                changes.setdefault(component.name, {})[path] = None
+
+        if not changes:
+            logger.info("The rendered artifacts did not change")
+            return
+        partial = Plugin().supports(self.provider_key,
+                                    PROVIDER_CAPABILITY_PARTIAL)
+        for name, contents in changes.items():
+            old = [job for key, job in previous_jobs.items() if key[0] == name]
+            new = [job for key, job in self.jobs.items() if key[0] == name]
+            if partial:
+                old = [job for job in old if job[2] in contents]
+                new = [job for job in new if job[2] in contents]
+            self._apply_component(old, new, contents, partial)
+
+    def _apply_component(self, old, new, contents, partial):
+        """
+        Stop the objects of the previous rendered artifacts of a component
+        and run the ones of the new rendered artifacts.
+
+        Args:
+            old (list): jobs of the artifacts to stop
+            new (list): jobs of the artifacts to run
+            contents (dict): new rendered content by artifact path, None
+                             for artifacts that are gone
+            partial (bool): the provider supports applying some of the
+                            artifacts of the component
+        """
+        component = (new or old)[0][0]
+        logger.info("Applying the changes of component %s", component.name)
+        provider_key, provider = component.get_provider(self.provider_key,
+                                                        self.dryrun)
+        provider.app_id = component.app_id
+        provider.component = component.name
+        provider.partial = partial
+
+        stop = [self._rendered_path(job[0], job[2]) for job in old
+                if self._read_rendered(job[0], job[2]) is not None]
+        if stop:
+            provider.artifacts = stop
+            provider.init()
+            provider.stop()
+
+        artifacts = []
+        for job in new:
+            if contents.get(job[2]) is None:
+                artifacts.append(self._rendered_path(job[0], job[2]))
+            else:
+                artifacts.append(job[0].write_rendered_artifact(
+                    job[2], contents[job[2]]))
+                Utils.trackOwnership(job[0].get_render_path(job[2]),
+                                     recursive=False)
+        if artifacts:
+            provider.artifacts = artifacts
+            provider.init()
+            provider.run()
+
+    @staticmethod
+    def _get_jobs(nulecule):
+        """
+        The render jobs of an application by component name and artifact
+        path, see Nulecule.get_render_jobs.
+        """
+        provider_key = nulecule.config.get('provider')
+        jobs = OrderedDict()
+        for job in nulecule.get_render_jobs(provider_key):
+            jobs[(job[0].name, os.path.normpath(job[2]))] = job
+        return jobs
+
+    def _get_asked_answers(self, nulecule):
+        """
+        Values that were asked for, by scope and name of their param.
+        """
+        asked = {}
+        for item in _walk(nulecule):
+            for param in item.params:
+                if not self.ask and param.get(DEFAULTNAME_KEY) is not None:
+                    continue
+                value = nulecule.config.get(
+                    param[NAME_KEY], scope=item.namespace,
+                    ignore_sources=['cli', 'answers', 'defaults'])
+                if value is not None:
+                    asked[(item.namespace, param[NAME_KEY])] = value
+        return asked
+
+    def _get_app_dirs(self):
+        return [os.path.normpath(item.basepath)
+                for item in _walk(self.nm.nulecule)
+                if isinstance(item, Nulecule)]
+
+    def _get_answers_files(self):
+        answers_files = [os.path.join(self.nm.app_path, ANSWERS_FILE)]
+        if self.nm.answers_file:
+            answers_files.append(self.nm.answers_file)
+        return set(os.path.normpath(path) for path in answers_files)
+
+    def _open(self):
+        """
+        Watch the directories of the application, again when they changed.
+        """
+        dirs = set(self._get_app_dirs())
+        dirs.update(os.path.dirname(path) for _, path in self.jobs)
+        dirs.update(os.path.dirname(path)
+                    for path in self._get_answers_files())
+        dirs = sorted(path for path in dirs if os.path.isdir(path))
+        if dirs == self._dirs:
+            return
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        try:
+            self._watcher = _InotifyWatcher(dirs)
+        except (OSError, WatchException) as e:
+            logger.warning("Scanning for changes every %ss: %s",
+                           WATCH_POLL_INTERVAL, e)
+            self._watcher = _PollingWatcher(dirs)
+        self._dirs = dirs
+
+    @staticmethod
+    def _rendered_path(component, path):
+        return os.path.relpath(component.get_render_path(path),
+                               component.basepath)
+
+    @staticmethod
+    def _read_rendered(component, path):
+        try:
+            with open(component.get_render_path(path)) as f:
+                return f.read()
+        except IOError:
+            return None
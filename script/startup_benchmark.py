@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Measure the cold start time of atomicapp subcommands.
+#
+# Every subcommand is run several times, each in a fresh interpreter, with
+# HOME pointing to a scratch directory holding a small index. The median
+# wall time of each subcommand is printed. With --baseline the results are
+# compared to a previous --save and the script fails when a subcommand got
+# slower than the allowed tolerance.
+#
+#     python script/startup_benchmark.py --save startup.json
+#     python script/startup_benchmark.py --baseline startup.json
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(TOPDIR, "tests/units/cli/test_examples/helloapache")
+
+INDEX = """location: .
+nulecules:
+- id: helloapache-app
+  metadata: {appversion: 0.0.1, location: localhost, name: Hello Apache}
+  providers: [docker, kubernetes]
+"""
+
+SUBCOMMANDS = [
+    ("help", ["--help"]),
+    ("index-list", ["index", "list"]),
+    ("index-search", ["index", "search", "apache"]),
+    ("init", ["init", "bench", "--destination", "{scratch}/init"]),
+    ("run-dry-run", ["--dry-run", "run", "{scratch}/helloapache"]),
+]
+
+
+def run_once(argv, scratch):
+    env = dict(os.environ, HOME=scratch, PYTHONPATH=TOPDIR)
+    env.pop("SUDO_USER", None)
+    argv = [arg.format(scratch=scratch) for arg in argv]
+    cmd = [sys.executable, "-c",
+           "import sys; sys.argv = ['atomicapp'] + sys.argv[1:]; "
+           "from atomicapp.cli.main import main; main()"] + argv
+    start = time.time()
+    with open(os.devnull, "w") as devnull:
+        subprocess.call(cmd, env=env, stdout=devnull, stderr=devnull)
+    return time.time() - start
+
+
+def benchmark(runs):
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="atomicapp-startup-")
+    try:
+        os.makedirs(os.path.join(scratch, ".atomicapp"))
+        with open(os.path.join(scratch, ".atomicapp", "index.yaml"), "w") as f:
+            f.write(INDEX)
+        shutil.copytree(EXAMPLE, os.path.join(scratch, "helloapache"))
+
+        for name, argv in SUBCOMMANDS:
+            # Warm up the caches that are kept on disk (index, docker probe)
+            run_once(argv, scratch)
+            times = []
+            for _ in range(runs):
+                shutil.rmtree(os.path.join(scratch, "init"), ignore_errors=True)
+                times.append(run_once(argv, scratch))
+            results[name] = sorted(times)[len(times) // 2]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the cold start time of atomicapp subcommands")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="runs per subcommand (default: 5)")
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare to results saved before")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    results = benchmark(args.runs)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    for name, _ in SUBCOMMANDS:
+        line = "%-14s %7.3fs" % (name, results[name])
+        if name in baseline:
+            change = results[name] / baseline[name] - 1
+            line += "  %+6.1f%%" % (change * 100)
+            # Ignore jitter of a few milliseconds on the fastest commands
+            if change > args.tolerance and results[name] - baseline[name] > 0.02:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if regressions:
+        print("Startup regressed for: %s" % ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,7 @@
 """
 
 import os
+import subprocess
 import sys
 import json
 
@@ -55,6 +56,28 @@ class TestCli(unittest.TestCase):
                 elif f == "answers.conf.gen":
                     os.remove(os.path.join(root, f))
 
+    def test_startup_imports(self):
+        """
+        The help and index commands don't import the network and markup
+        stacks or the providers.
+        """
+        heavy = ['anymarkup', 'requests', 'websocket', 'jsonpointer', 'yaml',
+                 'atomicapp.providers.openshift',
+                 'atomicapp.providers.lib.kubeshift.client']
+        code = ("import sys, json\n"
+                "sys.argv = ['atomicapp', '--help']\n"
+                "import atomicapp.cli.main\n"
+                "try:\n"
+                "    atomicapp.cli.main.main()\n"
+                "except SystemExit:\n"
+                "    pass\n"
+                "sys.stderr.write(json.dumps([m for m in %r if m in sys.modules]))\n"
+                % heavy)
+        proc = subprocess.Popen([sys.executable, '-c', code],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, err = proc.communicate()
+        self.assertEqual(json.loads(err.splitlines()[-1]), [])
+
     def test_run_helloapache_app(self):
         # Prepare the CLI arguments
         command = [
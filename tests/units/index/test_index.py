@@ -17,12 +17,14 @@
  along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import anymarkup
 import unittest
 import mock
 import os
+import shutil
 import tempfile
 
-from atomicapp.index import Index
+from atomicapp.index import Index, IndexException
 
 
 def mock_index_load_call(self, test):
@@ -48,3 +50,186 @@ class TestIndex(unittest.TestCase):
         self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-generation-test", dir="/tmp")
         a = Index()
         a.generate("tests/units/cli/test_examples", os.path.join(self.tmpdir, "index.yaml"))
+
+    @mock.patch("atomicapp.index.Index._load_index_file", mock_index_load_call)
+    def test_generate_reuses_unchanged(self):
+        tmpdir = tempfile.mkdtemp(prefix="atomicapp-generation-test", dir="/tmp")
+        location = os.path.join(tmpdir, "apps")
+        shutil.copytree("tests/units/cli/test_examples", location)
+        output = os.path.join(tmpdir, "index.yaml")
+
+        a = Index()
+        a.generate(location, output, workers=1)
+        first = anymarkup.parse_file(output)
+        self.assertTrue(os.path.exists(output + ".manifest.json"))
+
+        with open(os.path.join(location, "helloapache", "Nulecule"), "a") as f:
+            f.write("\n")
+        with mock.patch("atomicapp.index.Index._nulecule_get_info",
+                        wraps=Index._nulecule_get_info) as get_info:
+            a.generate(location, output, workers=1)
+        get_info.assert_called_once_with(os.path.join(location, "helloapache"))
+        self.assertEqual(anymarkup.parse_file(output), first)
+
+    @mock.patch("atomicapp.index.INDEX_GEN_POOL_THRESHOLD", 1)
+    @mock.patch("atomicapp.index.Index._load_index_file", mock_index_load_call)
+    def test_generate_pool(self):
+        tmpdir = tempfile.mkdtemp(prefix="atomicapp-generation-test", dir="/tmp")
+        a = Index()
+        a.generate("tests/units/cli/test_examples",
+                   os.path.join(tmpdir, "serial.yaml"), workers=1)
+        a.generate("tests/units/cli/test_examples",
+                   os.path.join(tmpdir, "pool.yaml"), workers=2)
+        serial = anymarkup.parse_file(os.path.join(tmpdir, "serial.yaml"))
+        self.assertEqual(anymarkup.parse_file(os.path.join(tmpdir, "pool.yaml")),
+                         serial)
+        self.assertEqual([n["path"] for n in serial["nulecules"]],
+                         sorted(os.listdir("tests/units/cli/test_examples")))
+
+
+class TestIndexSearch(unittest.TestCase):
+
+    """
+    Tests searching the index
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-search-test", dir="/tmp")
+        self.index_file = os.path.join(self.tmpdir, "index.yaml")
+        anymarkup.serialize_file({"location": ".", "nulecules": [
+            {"id": "postgresql-atomicapp", "providers": ["docker", "kubernetes"],
+             "metadata": {"name": "PostgreSQL", "appversion": "1.0.0",
+                          "tags": ["database"],
+                          "description": "Relational database server"}},
+            {"id": "redis-atomicapp", "providers": ["docker"],
+             "metadata": {"name": "Redis", "appversion": "0.0.1",
+                          "description": "Key value store"}},
+            {"id": "helloapache", "providers": ["kubernetes"],
+             "metadata": {"name": "Hello Apache"}}]},
+            self.index_file, format="yaml")
+        self.index = Index()
+        self.index.index_location = self.index_file
+
+    def search(self, query, substring=False):
+        return [e["id"] for e in
+                self.index._get_search_index().search(query, substring)]
+
+    def test_search(self):
+        self.assertEqual(self.search("data"), ["postgresql-atomicapp"])
+        self.assertEqual(self.search("docker"),
+                         ["postgresql-atomicapp", "redis-atomicapp"])
+        self.assertEqual(self.search("docker store"), ["redis-atomicapp"])
+        self.assertEqual(self.search("ache"), [])
+        self.assertEqual(self.search("ache", substring=True), ["helloapache"])
+        self.assertEqual(len(self.search("")), 3)
+
+    def test_search_saved_next_to_index(self):
+        self.index.search("redis")
+        self.assertTrue(os.path.exists(self.index_file + ".search.json"))
+
+        index = Index()
+        index.index_location = self.index_file
+        with mock.patch("anymarkup.parse_file") as parse_file:
+            self.assertEqual(index._get_search_index().get("redis-atomicapp")["metadata"]["name"],
+                             "Redis")
+            self.assertFalse(parse_file.called)
+
+    def test_search_rebuilt_on_change(self):
+        self.assertEqual(self.search("mysql"), [])
+        anymarkup.serialize_file({"nulecules": [
+            {"id": "mysql-atomicapp", "providers": ["docker"], "metadata": {}}]},
+            self.index_file, format="yaml")
+        os.utime(self.index_file, (0, 0))
+        index = Index()
+        index.index_location = self.index_file
+        self.assertEqual([e["id"] for e in index._get_search_index().search("mysql")],
+                         ["mysql-atomicapp"])
+
+    def test_info(self):
+        self.index.info("helloapache")
+        self.assertRaises(IndexException, self.index.info, "missing")
+
+
+class TestIndexSources(unittest.TestCase):
+
+    """
+    Tests an index federated from several sources
+    """
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix="atomicapp-sources-test", dir="/tmp")
+        os.mkdir(os.path.join(self.home, ".atomicapp"))
+        self.apps = os.path.join(self.home, "apps")
+        shutil.copytree("tests/units/cli/test_examples", self.apps)
+        self.url_index = os.path.join(self.home, "partner.yaml")
+        anymarkup.serialize_file({"nulecules": [
+            {"id": "partner-app", "providers": ["docker"], "metadata": {}},
+            {"id": "helloapache-app", "providers": ["docker"], "metadata": {}}]},
+            self.url_index, format="yaml")
+        self.write_sources([
+            {"name": "library", "image": "projectatomic/nulecule-library"},
+            {"name": "internal", "directory": self.apps},
+            {"name": "partner", "url": "file://" + self.url_index}])
+
+        patcher = mock.patch("atomicapp.index.Utils.getUserHome",
+                             return_value=self.home)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("atomicapp.index.DockerHandler")
+        self.docker = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.docker.return_value.get_image_id.return_value = "sha256:1"
+        self.docker.return_value.extract_files.side_effect = self.extract
+
+    def write_sources(self, sources):
+        anymarkup.serialize_file(
+            {"sources": sources},
+            os.path.join(self.home, ".atomicapp", "index-sources.yaml"),
+            format="yaml")
+
+    def extract(self, image, source, dest):
+        anymarkup.serialize_file({"nulecules": [
+            {"id": "library-app", "providers": ["kubernetes"], "metadata": {}}]},
+            dest, format="yaml")
+
+    def ids(self):
+        return [entry["id"] for entry in Index().index["nulecules"]]
+
+    def test_update_merges_sources(self):
+        Index().update()
+        ids = self.ids()
+        self.assertEqual(ids[0], "library-app")
+        self.assertEqual(ids[-1], "partner-app")
+        self.assertEqual(ids.count("helloapache-app"), 1)
+        self.assertTrue(len(ids) > 3)
+
+    def test_update_skips_unchanged_sources(self):
+        Index().update()
+        with mock.patch("atomicapp.index.Index._generate") as generate:
+            Index().update()
+            self.assertFalse(generate.called)
+        self.assertEqual(self.docker.return_value.extract_files.call_count, 1)
+
+        with open(self.url_index, "a") as f:
+            f.write("location: .\n")
+        os.utime(self.url_index, (0, 0))
+        self.docker.return_value.get_image_id.return_value = "sha256:2"
+        with mock.patch("atomicapp.index.Index._generate") as generate:
+            Index().update()
+            self.assertFalse(generate.called)
+        self.assertEqual(self.docker.return_value.extract_files.call_count, 2)
+
+    def test_failing_source(self):
+        self.docker.return_value.pull.side_effect = Exception("no registry")
+        Index().update()
+        self.assertNotIn("library-app", self.ids())
+
+        self.write_sources([{"name": "library", "image": "foo"}])
+        self.assertRaises(IndexException, Index().update)
+
+    def test_invalid_sources(self):
+        self.write_sources([{"name": "library", "image": "foo",
+                             "directory": self.apps}])
+        self.assertRaises(IndexException, Index().list)
+        self.write_sources([{"image": "foo"}])
+        self.assertRaises(IndexException, Index().list)
@@ -49,6 +49,16 @@ def test_get_groups(httpserver):
     kubebase.get_groups(httpserver.url)
 
 
+def test_discovery_cached(httpserver):
+    content = '{"kind":"APIResourceList","groupVersion":"v1","resources":[{"name":"pods","namespaced":true,"kind":"Pod"}]}'
+    httpserver.serve_content(content, code=200, headers=None)
+    url = httpserver.url + "/cached/"
+    assert KubeBase(config).get_resources(url) == ["pods"]
+    httpserver.serve_content("{}", code=500, headers=None)
+    assert KubeBase(config).get_resources(url) == ["pods"]
+    assert KubeBase(config).api is kubebase.api
+
+
 def test_connection(httpserver):
     httpserver.serve_content(content="OK", code=200, headers=None)
     kubebase.test_connection(httpserver.url)
@@ -0,0 +1,175 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import mock
+import os
+import subprocess
+import tempfile
+import unittest
+
+from atomicapp.nulecule.container import DockerHandler
+from atomicapp.nulecule.exceptions import DockerException
+
+VERSION_JSON = json.dumps({
+    'Client': {'Version': '1.10.3', 'ApiVersion': '1.22'},
+    'Server': {'Version': '1.12.1', 'ApiVersion': '1.24'}})
+
+VERSION_TEXT = """Client:
+ Version:      1.10.3
+ API version:  1.22
+ Go version:   go1.5.3
+
+Server:
+ Version:      1.12.1
+ API version:  1.24 (minimum version 1.12)
+"""
+
+OLD_VERSION_TEXT = """Client version: 1.7.1
+Client API version: 1.19
+Server version: 1.7.1
+Server API version: 1.19
+"""
+
+
+class TestDockerHandlerProbe(unittest.TestCase):
+    """Test probing docker capabilities"""
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix="atomicapp-test-probe", dir="/tmp")
+        DockerHandler._probes = {}
+
+    def tearDown(self):
+        DockerHandler._probes = {}
+
+    @mock.patch('atomicapp.nulecule.container.Utils.getUserHome')
+    @mock.patch('atomicapp.nulecule.container.subprocess.check_output')
+    def test_probe_is_cached(self, mock_check_output, mock_home):
+        mock_home.return_value = self.home
+        mock_check_output.return_value = VERSION_JSON
+        expected = {'client': {'version': '1.10.3', 'api_version': '1.22'},
+                    'server': {'version': '1.12.1', 'api_version': '1.24'}}
+
+        self.assertEqual(DockerHandler.probe('docker'), expected)
+        self.assertEqual(DockerHandler.probe('docker'), expected)
+        self.assertEqual(mock_check_output.call_count, 1)
+
+        # A new process reuses the probe persisted on disk
+        DockerHandler._probes = {}
+        self.assertEqual(DockerHandler.probe('docker'), expected)
+        self.assertEqual(mock_check_output.call_count, 1)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.home, '.atomicapp', 'docker-probe.json')))
+
+    @mock.patch('atomicapp.nulecule.container.Utils.getUserHome')
+    @mock.patch('atomicapp.nulecule.container.subprocess.check_output')
+    def test_probe_is_keyed_by_daemon(self, mock_check_output, mock_home):
+        mock_home.return_value = self.home
+        mock_check_output.return_value = VERSION_JSON
+
+        with mock.patch.dict(os.environ, {'DOCKER_HOST': 'tcp://a:2375'}):
+            DockerHandler.probe('docker')
+        with mock.patch.dict(os.environ, {'DOCKER_HOST': 'tcp://b:2375'}):
+            DockerHandler.probe('docker')
+        self.assertEqual(mock_check_output.call_count, 2)
+
+    @mock.patch('atomicapp.nulecule.container.Utils.getUserHome')
+    @mock.patch('atomicapp.nulecule.container.subprocess.check_output')
+    def test_probe_is_keyed_by_client_path(self, mock_check_output,
+                                           mock_home):
+        mock_home.return_value = self.home
+        mock_check_output.return_value = VERSION_JSON
+        bin_dir = os.path.join(self.home, 'bin')
+        os.mkdir(bin_dir)
+        docker = os.path.join(bin_dir, 'docker')
+        with open(docker, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(docker, 0o755)
+
+        with mock.patch.dict(os.environ, {'PATH': bin_dir}):
+            DockerHandler.probe('docker')
+            DockerHandler.probe(docker)
+        self.assertEqual(mock_check_output.call_count, 1)
+
+    @mock.patch('atomicapp.nulecule.container.Utils.getUserHome')
+    @mock.patch('atomicapp.nulecule.container.subprocess.check_output')
+    def test_probe_old_client(self, mock_check_output, mock_home):
+        mock_home.return_value = self.home
+
+        def check_output(cmd, **kwargs):
+            if '--format' in cmd:
+                raise subprocess.CalledProcessError(
+                    2, cmd, 'flag provided but not defined: --format')
+            return OLD_VERSION_TEXT
+        mock_check_output.side_effect = check_output
+
+        self.assertEqual(DockerHandler.probe('docker'), {
+            'client': {'version': '1.7.1', 'api_version': '1.19'},
+            'server': {'version': '1.7.1', 'api_version': '1.19'}})
+
+    @mock.patch('atomicapp.nulecule.container.Utils.getUserHome')
+    @mock.patch('atomicapp.nulecule.container.subprocess.check_output')
+    def test_probe_daemon_down(self, mock_check_output, mock_home):
+        mock_home.return_value = self.home
+        mock_check_output.side_effect = subprocess.CalledProcessError(
+            1, 'docker', 'Is your docker daemon up and running?')
+
+        self.assertRaises(DockerException, DockerHandler.probe, 'docker')
+        self.assertEqual(DockerHandler._probes, {})
+
+    def test_parse_version_text(self):
+        self.assertEqual(DockerHandler._parse_version_text(VERSION_TEXT), {
+            'client': {'version': '1.10.3', 'api_version': '1.22'},
+            'server': {'version': '1.12.1', 'api_version': '1.24'}})
+
+    def test_api_version_tuple(self):
+        self.assertTrue(DockerHandler.api_version_tuple('1.9') <
+                        DockerHandler.api_version_tuple('1.10'))
+        self.assertRaises(DockerException, DockerHandler.api_version_tuple,
+                          None)
+        self.assertRaises(DockerException, DockerHandler.api_version_tuple,
+                          'unknown')
+
+
+class TestDockerHandlerImages(unittest.TestCase):
+    """Test the list of local images shared by the handlers"""
+
+    def setUp(self):
+        DockerHandler._images = {}
+
+    def tearDown(self):
+        DockerHandler._images = {}
+
+    @mock.patch('atomicapp.nulecule.container.subprocess.check_output')
+    def test_is_image_present(self, mock_check_output):
+        mock_check_output.return_value = (
+            "REPOSITORY                TAG     IMAGE ID\n"
+            "docker.io/centos/httpd    latest  4f5a2a8b7c01\n")
+        # Skip the docker probe of a real handler
+        handler = DockerHandler(dryrun=True, docker_cli='docker')
+        handler.dryrun = False
+
+        self.assertTrue(handler.is_image_present('centos/httpd'))
+        self.assertFalse(handler.is_image_present('projectatomic/helloapache'))
+        self.assertEqual(mock_check_output.call_count, 1)
+
+        handler.pull('projectatomic/helloapache:latest')
+        self.assertTrue(handler.is_image_present('projectatomic/helloapache'))
+        # listed once, then pulled
+        self.assertEqual(mock_check_output.call_count, 2)
@@ -22,8 +22,9 @@ class TestNuleculeBaseGetProvider(unittest.TestCase):
         return_provider = mock.Mock()
         # mocking return value of method plugin.getProvider,because it returns
         # provider class and that class gets called with values
-        nb.plugin.getProvider = mock.Mock(return_value=return_provider)
-        ret_provider_key, ret_provider = nb.get_provider()
+        with mock.patch.object(NuleculeBase.plugin, 'getProvider',
+                               return_value=return_provider):
+            ret_provider_key, ret_provider = nb.get_provider()
         self.assertEqual(provider_key, ret_provider_key)
         return_provider.assert_called_with(
             {'provider': provider_key, 'namespace': 'default'},
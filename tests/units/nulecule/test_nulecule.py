@@ -277,13 +277,49 @@ class TestNuleculeLoadComponents(unittest.TestCase):
             graph[1].get('params'), graph[1].get('artifacts'), config)
 
 
+class TestNuleculeSelectComponents(unittest.TestCase):
+
+    """Test selecting a subset of the components of a Nulecule"""
+
+    def setUp(self):
+        self.n = Nulecule('some-id', '0.0.2', [], 'some/path')
+        self.components = []
+        for namespace in ['web', 'api', 'db']:
+            component = mock.Mock(name=namespace)
+            component.namespace = namespace
+            self.components.append(component)
+        self.n.components = list(self.components)
+
+    def test_only(self):
+        web, api, db = self.components
+        self.n.select_components(only=['web', 'api:cache'])
+
+        self.assertEqual(self.n.components, [web, api])
+        # Everything in web is kept, only the named component of api
+        web.select_components.assert_called_once_with(None, None)
+        api.select_components.assert_called_once_with(
+            ['web', 'api:cache'], None)
+        self.assertFalse(db.select_components.called)
+
+    def test_skip(self):
+        web, api, db = self.components
+        self.n.select_components(skip=['api', 'db:replica'])
+
+        self.assertEqual(self.n.components, [web, db])
+        db.select_components.assert_called_once_with(
+            None, ['api', 'db:replica'])
+
+
 class TestNuleculeRender(unittest.TestCase):
 
     """Test Nulecule render"""
 
-    def test_render(self):
+    @mock.patch('atomicapp.nulecule.base.NuleculeComponent.render_jobs')
+    def test_render(self, mock_render_jobs):
         mock_component_1 = mock.Mock()
+        mock_component_1.get_render_jobs.return_value = ['job1', 'job2']
         mock_component_2 = mock.Mock()
+        mock_component_2.get_render_jobs.return_value = ['job3']
         provider_key = 'foo'
         dryrun = True
 
@@ -291,10 +327,12 @@ class TestNuleculeRender(unittest.TestCase):
         n.components = [mock_component_1, mock_component_2]
         n.render(provider_key, dryrun)
 
-        mock_component_1.render.assert_called_once_with(
-            provider_key=provider_key, dryrun=dryrun)
-        mock_component_2.render.assert_called_once_with(
-            provider_key=provider_key, dryrun=dryrun)
+        # The artifacts of all the components are rendered together
+        mock_component_1.get_render_jobs.assert_called_once_with(
+            provider_key)
+        mock_component_2.get_render_jobs.assert_called_once_with(
+            provider_key)
+        mock_render_jobs.assert_called_once_with(['job1', 'job2', 'job3'])
 
 
 class TestLoadNuleculeParsing(unittest.TestCase):
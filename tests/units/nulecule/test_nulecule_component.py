@@ -1,4 +1,9 @@
+import gc
 import mock
+import os
+import shutil
+import sys
+import tempfile
 import unittest
 from atomicapp.nulecule.base import NuleculeComponent, Nulecule
 from atomicapp.nulecule.config import Config
@@ -48,6 +53,10 @@ class TestNuleculeComponentLoad(unittest.TestCase):
         nc = NuleculeComponent('some-name', 'some/path', source='blah')
         nc.load(False, dryrun)
 
+        # The external application is loaded on first use
+        self.assertEqual(mock_load_external_application.call_count, 0)
+        nc.app
+        nc.app
         mock_load_external_application.assert_called_once_with(dryrun)
 
     @mock.patch(
@@ -60,6 +69,22 @@ class TestNuleculeComponentLoad(unittest.TestCase):
 
         self.assertEqual(mock_load_external_application.call_count, 0)
 
+    def test_select_components_of_lazy_app(self):
+        mock_nulecule = mock.Mock(name='nulecule')
+
+        def load_external_application(dryrun):
+            nc._app = mock_nulecule
+
+        nc = NuleculeComponent('web', 'some/path', source='blah')
+        nc.load(False, False)
+        nc.select_components(['web:db'], None)
+
+        with mock.patch.object(NuleculeComponent, 'load_external_application',
+                               side_effect=load_external_application):
+            self.assertEqual(nc.app, mock_nulecule)
+        mock_nulecule.select_components.assert_called_once_with(
+            ['web:db'], None)
+
 
 class TestNuleculeComponentRun(unittest.TestCase):
     """Test Nulecule component run"""
@@ -89,6 +114,8 @@ class TestNuleculeComponentRun(unittest.TestCase):
         self.assertEqual(mock_provider.artifacts, ['a', 'b', 'c'])
         mock_provider.init.assert_called_once_with()
         mock_provider.run.assert_called_once_with()
+        # Handed over to the provider, the component does not keep them
+        self.assertEqual(nc.rendered_artifacts, None)
 
 
 class TestNuleculeComponentStop(unittest.TestCase):
@@ -197,13 +224,13 @@ class TestNuleculeComponentLoadExternalApplication(unittest.TestCase):
             expected_external_app_path)
         mock_Nulecule.load_from_path.assert_called_once_with(
             expected_external_app_path, dryrun=dryrun, namespace='some-app',
-            update=update)
+            update=update, external_apps=nc.external_apps)
 
     # Use http://engineeringblog.yelp.com/2015/02/assert_called_once-threat-or-menace.html
-    # by calling call_count == 1. In order to avoid the return_value = False of Utils.setFileOnwerGroup
+    # by calling call_count == 1. In order to avoid the return_value = False of Utils.trackOwnership
     @mock.patch('atomicapp.nulecule.base.Nulecule')
     @mock.patch('atomicapp.nulecule.base.os.path.isdir')
-    @mock.patch('atomicapp.utils.Utils.setFileOwnerGroup')
+    @mock.patch('atomicapp.utils.Utils.trackOwnership')
     def test_loading_app_by_unpacking(self, mock_os_path_isdir,
                                       mock_Nulecule, mock_chown):
         dryrun, update = False, False
@@ -221,6 +248,34 @@ class TestNuleculeComponentLoadExternalApplication(unittest.TestCase):
         mock_os_path_isdir.call_count == 1
         mock_Nulecule.call_count == 1
 
+    @mock.patch('atomicapp.nulecule.base.Nulecule')
+    @mock.patch('atomicapp.utils.Utils.trackOwnership')
+    def test_loading_app_extracted_by_other_component(self, mock_chown,
+                                                      mock_Nulecule):
+        tmpdir = tempfile.mkdtemp(prefix='atomicapp-test-external')
+        self.addCleanup(shutil.rmtree, tmpdir)
+        shared_app_path = os.path.join(tmpdir, 'web/external/db')
+        os.makedirs(shared_app_path)
+        with open(os.path.join(shared_app_path, 'Nulecule'), 'w') as f:
+            f.write('id: db\n')
+
+        nc = NuleculeComponent('db', os.path.join(tmpdir, 'api'),
+                               source='docker://db')
+        nc.external_apps = {'docker://db': shared_app_path}
+        nc.load_external_application(dryrun=False, update=False)
+
+        expected_external_app_path = os.path.join(tmpdir, 'api/external/db')
+        self.assertFalse(mock_Nulecule.unpack.called)
+        mock_Nulecule.load_from_path.assert_called_once_with(
+            expected_external_app_path, dryrun=False, namespace='db',
+            update=False, external_apps=nc.external_apps)
+        # The files of the first extraction are linked, not extracted again
+        self.assertEqual(
+            os.stat(os.path.join(shared_app_path, 'Nulecule')).st_ino,
+            os.stat(os.path.join(expected_external_app_path,
+                                 'Nulecule')).st_ino)
+        self.assertEqual(nc.external_apps, {'docker://db': shared_app_path})
+
 
 class TestNuleculeComponentComponents(unittest.TestCase):
     """Test accessing components attribute of a Nulecule component"""
@@ -324,6 +379,38 @@ class TestNuleculeComponentRender(unittest.TestCase):
                          expected_rendered_artifacts)
 
 
+class TestNuleculeComponentRenderJobs(unittest.TestCase):
+    """Test rendering the artifacts of many components together"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='atomicapp-test-render')
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_render_jobs_in_pool(self):
+        jobs = []
+        components = []
+        for i in range(4):
+            basepath = os.path.join(self.tmpdir, 'app%s' % i)
+            os.makedirs(os.path.join(basepath, 'artifacts'))
+            nc = NuleculeComponent('app%s' % i, basepath)
+            nc.artifacts = {'docker': [{}]}
+            components.append(nc)
+            for name in ('b', 'a', 'c'):
+                path = os.path.join(basepath, 'artifacts', name)
+                with open(path, 'w') as f:
+                    f.write('$image %s' % name)
+                jobs.append((nc, 'docker', path, {'image': 'img%s' % i}))
+
+        NuleculeComponent.render_jobs(jobs, workers=2)
+
+        for i, nc in enumerate(components):
+            # Rendered artifacts keep the order of the jobs
+            self.assertEqual(nc.rendered_artifacts['docker'],
+                             ['artifacts/.b', 'artifacts/.a', 'artifacts/.c'])
+            with open(os.path.join(nc.basepath, 'artifacts/.a')) as f:
+                self.assertEqual(f.read(), 'img%s a' % i)
+
+
 class TestNuleculeComponentGetArtifactPathsForProvider(unittest.TestCase):
     """Test creating artifact paths for a Nulecule component"""
 
@@ -356,6 +443,37 @@ class TestNuleculeComponentGetArtifactPathsForProvider(unittest.TestCase):
         self.assertEqual(nc.get_artifact_paths_for_provider(provider_key),
                          expected_artifact_paths)
 
+    @mock.patch('atomicapp.nulecule.base.NuleculeComponent.'
+                '_get_artifact_paths_for_path')
+    def test_artifact_paths_for_inherited_providers_resolved_once(
+            self, mock_get_artifact_paths_for_path):
+        mock_get_artifact_paths_for_path.side_effect = lambda path: [path]
+
+        nc = NuleculeComponent(name='some-app', basepath='some/path')
+        nc.artifacts = {
+            'openshift': [{'inherit': ['kubernetes', 'base']}],
+            'kubernetes': [{'inherit': ['base']}, 'file://k8s'],
+            'base': ['file://base'],
+        }
+
+        self.assertEqual(nc.get_artifact_paths_for_provider('openshift'),
+                         ['some/path/base', 'some/path/k8s', 'some/path/base'])
+        self.assertEqual(nc.get_artifact_paths_for_provider('kubernetes'),
+                         ['some/path/base', 'some/path/k8s'])
+        self.assertEqual(mock_get_artifact_paths_for_path.call_count, 2)
+
+    def test_artifact_paths_for_inheritance_cycle(self):
+        nc = NuleculeComponent(name='some-app', basepath='some/path')
+        nc.artifacts = {
+            'openshift': [{'inherit': ['kubernetes']}],
+            'kubernetes': [{'inherit': ['openshift']}],
+        }
+
+        with self.assertRaises(NuleculeException) as context:
+            nc.get_artifact_paths_for_provider('openshift')
+        self.assertIn('openshift -> kubernetes -> openshift',
+                      str(context.exception))
+
 
 class TestNuleculeComponentRenderArtifact(unittest.TestCase):
     """Test rendering an artifact in a NuleculeComponent"""
@@ -394,3 +512,31 @@ class TestNuleculeComponentRenderArtifact(unittest.TestCase):
         mock_source_file.read.assert_called_once_with()
         mock_target_file.write.assert_called_once_with(
             expected_rendered_content)
+
+
+class TestNuleculeComponentMemory(unittest.TestCase):
+    """Test the memory used by Nulecule components"""
+
+    def test_no_instance_dict(self):
+        nc = NuleculeComponent('some-name', 'some/path')
+        self.assertFalse(hasattr(nc, '__dict__'))
+        self.assertRaises(AttributeError, setattr, nc, 'some_attribute', 1)
+
+    def test_bounded_memory_per_component(self):
+        count = 200
+        graph = [{'name': 'component-%s' % i,
+                  'artifacts': {'docker': ['file://artifacts/%s' % i]}}
+                 for i in range(count)]
+        n = Nulecule('some-id', '0.0.2', graph, 'some/path', config=Config())
+
+        gc.collect()
+        before = set(id(obj) for obj in gc.get_objects())
+        n.load_components()
+        gc.collect()
+        allocated = [obj for obj in gc.get_objects()
+                     if id(obj) not in before and obj is not before]
+
+        self.assertEqual(len(n.components), count)
+        # The component and its share of the list of components
+        size = sum(sys.getsizeof(obj) for obj in allocated)
+        self.assertLess(size / count, 256)
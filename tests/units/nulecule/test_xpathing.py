@@ -24,6 +24,8 @@ import tempfile
 import os
 import jsonpointer
 import anymarkup
+import json
+import yaml
 from atomicapp.nulecule.base import NuleculeComponent
 from atomicapp.nulecule.exceptions import NuleculeException
 
@@ -54,6 +56,41 @@ class TestNuleculeXpathing(unittest.TestCase):
         with pytest.raises(NuleculeException):
             self.test.apply_pointers(content=self.artifact_content, params={"image": ["/spec/containers/1/image"]})
 
+    # Pointers are applied to every document of a multi-document artifact
+    def test_xpathing_multiple_documents(self):
+        content = ("kind: Pod\nspec: {image: foo}\n---\n"
+                   "kind: Service\nspec: {image: bar, ports: [80, 81]}\n")
+        docs = list(yaml.safe_load_all(self.test.apply_pointers(
+            content=content, params={"image": ["/spec/image"],
+                                     "port": ["/spec/ports/1"]})))
+        self.assertEqual(docs, [
+            {"kind": "Pod", "spec": {"image": "image"}},
+            {"kind": "Service", "spec": {"image": "image", "ports": [80, "port"]}}])
+
+    # Pointers are relative to the items of a List, or to the List itself
+    def test_xpathing_list(self):
+        content = json.dumps({"kind": "List", "items": [
+            {"kind": "Pod", "spec": {"image": "foo"}},
+            {"kind": "Pod", "spec": {"image": "bar"}}]})
+        obj = json.loads(self.test.apply_pointers(
+            content=content, params={"image": ["/spec/image"],
+                                     "kind": ["/items/1/kind"]}))
+        self.assertEqual(obj["items"], [
+            {"kind": "Pod", "spec": {"image": "image"}},
+            {"kind": "kind", "spec": {"image": "image"}}])
+
+    # Params are taken from the artifact entry of each artifact file
+    def test_grab_artifact_params_of_entry(self):
+        self.test.artifacts = {"kubernetes": [
+            "file://artifacts/plain.json",
+            {"resource": "file://xpath.json", "params": {"image": ["/spec/containers/0/image"]}}]}
+        with mock.patch("atomicapp.nulecule.base.NuleculeComponent._get_artifact_paths_for_path",
+                        side_effect=lambda path: [path]):
+            self.assertEqual(self.test.grab_artifact_params("kubernetes", self.artifact_path),
+                             {"image": ["/spec/containers/0/image"]})
+            self.assertIsNone(self.test.grab_artifact_params(
+                "kubernetes", os.path.join(self.example_dir, "artifacts/plain.json")))
+
     # Test using the artifact path
     def test_artifact_path(self):
         self.test.artifacts = {"docker": [{"file://artifacts/docker/hello-apache-pod_run"}], "kubernetes": [{"file://artifacts/kubernetes/hello-apache-pod.json"}]}
@@ -86,7 +86,126 @@ class TestDockerProviderBase(unittest.TestCase):
         provider.artifacts = [
                 self.artifact_dir + 'run-with-backslashes',
                 ]
-        expected_output = 'docker run -d -p 80:80 --name centos7 centos7'
+        expected_output = ('docker run '
+                           '--label io.projectatomic.atomicapp.namespace=test '
+                           '--label io.projectatomic.atomicapp.artifact=run-with-backslashes '
+                           '-d -p 80:80 --name centos7 centos7')
         with mock.patch('atomicapp.providers.docker.logger') as mock_logger:
             provider.run()
             mock_logger.info.assert_called_with('DRY-RUN: %s', expected_output)
+
+    def test_run_labels_containers(self):
+        data = {'namespace': 'test', 'provider': 'docker', 'image': 'centos/httpd'}
+        provider = self.prepare_provider(data)
+        provider.app_id = 'helloapache-app'
+        provider.component = 'httpd'
+        provider.init()
+        provider.artifacts = [self.artifact_dir + 'hello-world-one']
+        with mock.patch('atomicapp.providers.docker.logger') as mock_logger:
+            provider.run()
+            cmd = mock_logger.info.call_args[0][1]
+        self.assertIn('--label io.projectatomic.atomicapp.namespace=test', cmd)
+        self.assertIn('--label io.projectatomic.atomicapp.app=helloapache-app', cmd)
+        self.assertIn('--label io.projectatomic.atomicapp.component=httpd', cmd)
+
+    @mock.patch("atomicapp.providers.docker.subprocess.check_output")
+    def test_stop_by_labels(self, mock_check_output):
+        data = {'namespace': 'test', 'provider': 'docker', 'image': 'centos/httpd',
+                'docker-stop-timeout': '3'}
+        provider = self.prepare_provider(data)
+        provider.app_id = 'helloapache-app'
+        provider.component = 'httpd'
+        provider.init()
+        provider.dryrun = False
+        provider.artifacts = [self.artifact_dir + 'hello-world-one']
+        mock_check_output.side_effect = lambda cmd, **kwargs: \
+            "aaa\nbbb\nccc\n" if cmd[1] == 'ps' else ""
+
+        provider.stop()
+
+        ps_cmd = mock_check_output.call_args_list[0][0][0]
+        self.assertEqual(ps_cmd, [
+            'docker', 'ps', '-q', '--no-trunc',
+            '--filter', 'label=io.projectatomic.atomicapp.namespace=test',
+            '--filter', 'label=io.projectatomic.atomicapp.app=helloapache-app',
+            '--filter', 'label=io.projectatomic.atomicapp.component=httpd'])
+        stop_cmds = sorted(c[0][0] for c in mock_check_output.call_args_list[1:])
+        self.assertEqual(stop_cmds, [
+            ['docker', 'stop', '-t', '3', 'aaa'],
+            ['docker', 'stop', '-t', '3', 'bbb'],
+            ['docker', 'stop', '-t', '3', 'ccc']])
+
+    @mock.patch("atomicapp.providers.docker.DockerProvider._get_containers", mock_name_get_call)
+    @mock.patch("atomicapp.providers.docker.DockerProvider._get_labelled_containers")
+    @mock.patch("atomicapp.providers.docker.DockerProvider._stop_containers")
+    def test_stop_falls_back_to_names(self, mock_stop_containers, mock_labelled):
+        data = {'namespace': 'test', 'provider': 'docker', 'image': 'centos/httpd'}
+        provider = self.prepare_provider(data)
+        provider.init()
+        provider.artifacts = [self.artifact_dir + 'hello-world-one']
+        mock_labelled.return_value = []
+
+        provider.stop()
+
+        mock_stop_containers.assert_called_once_with(["test_centos-httpd_e9b9a7bfe8f9"])
+
+    @mock.patch("atomicapp.providers.docker.DockerHandler.probe")
+    def test_unknown_server_version(self, mock_probe):
+        mock_probe.return_value = {
+            'client': {'version': '1.10.3', 'api_version': '1.22'},
+            'server': {'version': None, 'api_version': None}}
+        data = {'namespace': 'test', 'provider': 'docker'}
+        provider = self.prepare_provider(data)
+        provider.dryrun = False
+        with pytest.raises(ProviderFailedException) as e:
+            provider.init()
+        assert "Unknown Docker API version" in str(e.value)
+
+    def test_invalid_stop_timeout(self):
+        for timeout in ('soon', '-1', '1.5'):
+            data = {'namespace': 'test', 'provider': 'docker',
+                    'docker-stop-timeout': timeout}
+            provider = self.prepare_provider(data)
+            with pytest.raises(ProviderFailedException) as e:
+                provider.init()
+            assert "docker-stop-timeout" in str(e.value)
+
+    @mock.patch("atomicapp.providers.docker.subprocess.check_output")
+    def test_stop_apps_sharing_namespace(self, mock_check_output):
+        # Two apps without an image answer, with the same component name,
+        # in the default namespace
+        containers = {}
+
+        def docker(cmd, **kwargs):
+            if cmd[1] == 'ps':
+                filters = set(arg[len('label='):] for arg in cmd
+                              if arg.startswith('label='))
+                return "".join("%s\n" % name for name, labels
+                               in sorted(containers.items())
+                               if filters <= labels)
+            return ""
+        mock_check_output.side_effect = docker
+
+        providers = {}
+        for app_id in ('web-app', 'blog-app'):
+            provider = self.prepare_provider({'provider': 'docker'})
+            provider.app_id = app_id
+            provider.component = 'httpd'
+            provider.init()
+            provider.dryrun = False
+            provider.artifacts = [self.artifact_dir + 'hello-world-one']
+            containers[app_id] = set(provider._get_labels())
+            providers[app_id] = provider
+
+        providers['web-app'].stop()
+
+        stopped = [c[0][0][-1] for c in mock_check_output.call_args_list
+                   if c[0][0][1] == 'stop']
+        self.assertEqual(stopped, ['web-app'])
+
+    def test_stop_timeout_zero(self):
+        data = {'namespace': 'test', 'provider': 'docker',
+                'docker-stop-timeout': 0}
+        provider = self.prepare_provider(data)
+        provider.init()
+        self.assertEqual(provider.stop_timeout, 0)
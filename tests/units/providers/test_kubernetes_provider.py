@@ -71,3 +71,44 @@ class TestKubernetesProviderBase(unittest.TestCase):
         data = {'namespace': 'testing', 'provider': 'openshift'}
         provider = self.prepare_provider(data)
         self.assertRaises(ProviderFailedException, provider.checkConfigFile)
+
+    # Objects of multi-document and List artifacts are streamed one by one
+    def test_artifact_objects_stream(self):
+        with open(os.path.join(self.tmpdir, "bundle.yaml"), "w") as fp:
+            fp.write("kind: Service\nmetadata: {name: web}\n---\n"
+                     "kind: List\nitems:\n"
+                     "- {kind: Pod, metadata: {name: web-1}}\n"
+                     "- {kind: Pod, metadata: {name: web-2, labels: {app: web}}}\n")
+        with open(os.path.join(self.tmpdir, "db.json"), "w") as fp:
+            fp.write('{\n\t"kind": "Pod",\n\t"metadata": {"name": "db"}\n}\n')
+
+        provider = self.prepare_provider({'namespace': 'testing', 'provider': 'kubernetes'})
+        provider.artifacts = ["bundle.yaml", "db.json"]
+        original = KubernetesProvider.iterArtifactObjects
+        with mock.patch.object(KubernetesProvider, "iterArtifactObjects",
+                               autospec=True, side_effect=original) as iterate:
+            provider.init()
+            provider.api = mock.Mock()
+            provider.dryrun = False
+            provider.run()
+        # The artifacts are parsed once
+        iterate.assert_called_once_with(provider)
+
+        created = [call[0][0] for call in provider.api.create.call_args_list]
+        self.assertEqual([obj["metadata"]["name"] for obj in created],
+                         ["web", "web-1", "web-2", "db"])
+        self.assertEqual(created[2]["metadata"]["labels"],
+                         {"app": "web", "namespace": "testing"})
+
+    # Objects without a kind fail the deployment when they are reached
+    def test_artifact_objects_without_kind(self):
+        with open(os.path.join(self.tmpdir, "bundle.yaml"), "w") as fp:
+            fp.write("kind: Pod\nmetadata: {name: web}\n---\nmetadata: {name: db}\n")
+
+        provider = self.prepare_provider({'namespace': 'testing', 'provider': 'kubernetes'})
+        provider.artifacts = ["bundle.yaml"]
+        provider.init()
+        provider.api = mock.Mock()
+        provider.dryrun = False
+        self.assertRaises(ProviderFailedException, provider.run)
+        self.assertEqual(provider.api.create.call_count, 1)
@@ -0,0 +1,235 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import unittest
+import mock
+import os
+import pytest
+import threading
+
+from pytest_localserver.http import WSGIServer
+from werkzeug.wrappers import Request
+
+from atomicapp.plugin import ProviderFailedException
+from atomicapp.providers.marathon import MarathonProvider
+
+
+class TestMarathonProviderBase(unittest.TestCase):
+
+    def setUp(self):
+        self.artifact_dir = os.path.join(os.path.dirname(__file__),
+                                         'marathon_artifact_test')
+
+    def prepare_provider(self, config, dryrun=False):
+        provider = MarathonProvider(config, self.artifact_dir, dryrun)
+        provider.artifacts = ['db.json', 'web.json']
+        provider.component = 'mydb:web'
+        provider.init()
+        return provider
+
+    @mock.patch('atomicapp.providers.marathon.Utils.make_rest_request')
+    def test_run_apps(self, mock_request):
+        mock_request.return_value = (201, {})
+        provider = self.prepare_provider({'provider-api': 'http://m:8080'})
+        provider.run()
+
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(mock_request.call_args_list[0][0][:2],
+                         ('post', 'http://m:8080/v2/apps/'))
+
+    @mock.patch('atomicapp.providers.marathon.Utils.make_rest_request')
+    def test_run_group(self, mock_request):
+        mock_request.return_value = (201, {'deploymentId': 'x', 'version': 'y'})
+        provider = self.prepare_provider({'provider-api': 'http://m:8080',
+                                          'marathon-group': '/myapp'})
+        artifacts = provider.marathon_artifacts
+        provider.run()
+
+        mock_request.assert_called_once_with(
+            'put', 'http://m:8080/v2/groups/myapp/mydb-web', data=mock.ANY)
+        group = mock_request.call_args[1]['data']
+        self.assertEqual(group['id'], '/myapp/mydb-web')
+        self.assertEqual([app['id'] for app in group['apps']], ['db', 'web'])
+        self.assertEqual(group['apps'][1]['dependencies'], ['db'])
+        # The parsed artifacts are left untouched, and released once
+        # submitted
+        self.assertEqual(artifacts[0]['id'], '/db')
+        self.assertEqual(provider.marathon_artifacts, [])
+
+    @mock.patch('atomicapp.providers.marathon.Utils.make_rest_request')
+    def test_run_group_dependencies(self, mock_request):
+        mock_request.return_value = (201, {'deploymentId': 'x'})
+        provider = self.prepare_provider({'marathon-group': '/myapp'})
+        provider.marathon_artifacts[1]['dependencies'] = [
+            '/db', '/infra/db', '/myapp/mydb-web/cache', 'queue']
+        provider.run()
+
+        group = mock_request.call_args[1]['data']
+        self.assertEqual(group['apps'][1]['dependencies'],
+                         ['db', '/infra/db', 'cache', 'queue'])
+
+    @mock.patch('atomicapp.providers.marathon.Utils.make_rest_request')
+    def test_run_group_failure(self, mock_request):
+        mock_request.return_value = (409, {'message': 'locked'})
+        provider = self.prepare_provider({'marathon-group': 'myapp'})
+        with pytest.raises(ProviderFailedException):
+            provider.run()
+
+    @mock.patch('atomicapp.providers.marathon.Utils.make_rest_request')
+    def test_stop_group(self, mock_request):
+        mock_request.return_value = (200, {})
+        provider = self.prepare_provider({'provider-api': 'http://m:8080',
+                                          'marathon-group': 'myapp'})
+        provider.stop()
+
+        mock_request.assert_called_once_with(
+            'delete', 'http://m:8080/v2/groups/myapp/mydb-web')
+
+
+class StubMarathon(object):
+    """
+    Minimal Marathon API serving apps, deployments and the /v2/events
+    server sent event stream.
+    """
+
+    def __init__(self, events=True, fail=False, malformed=False):
+        self.events = events
+        self.fail = fail
+        self.malformed = malformed
+        self.deployments = []
+        self.ready = threading.Event()
+        self.checked = threading.Event()
+        self.polls = 0
+
+    def finish(self):
+        self.deployments = []
+        self.ready.set()
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        path = request.path
+        if request.method == 'POST' and path == '/v2/apps/':
+            app = json.loads(request.get_data())
+            deployment_id = 'deploy-%s' % app['id'].strip('/')
+            self.deployments.append(deployment_id)
+            app['deployments'] = [{'id': deployment_id}]
+            return self._json(start_response, '201 Created', app)
+        if path == '/v2/deployments':
+            self.polls += 1
+            self.checked.set()
+            if not self.events and self.polls > 2:
+                self.finish()
+            return self._json(start_response, '200 OK',
+                              [{'id': d} for d in self.deployments])
+        if path == '/v2/events':
+            if not self.events:
+                return self._json(start_response, '404 Not Found', {})
+            start_response('200 OK', [('Content-Type', 'text/event-stream')])
+            return self._stream()
+        if path.startswith('/v2/apps/'):
+            running = 2 if self.ready.is_set() else 0
+            return self._json(start_response, '200 OK', {'app': {
+                'id': path[len('/v2/apps'):], 'instances': 2,
+                'tasksRunning': running, 'tasksHealthy': 0}})
+        return self._json(start_response, '404 Not Found', {})
+
+    def _stream(self):
+        yield 'event: event_stream_attached\ndata: {}\n\n'
+        # Let the deployments finish only once the client is subscribed
+        self.checked.wait(5)
+        pending = list(self.deployments)
+        self.finish()
+        event = 'deployment_failed' if self.fail else 'deployment_success'
+        if self.malformed:
+            yield 'event: %s\ndata: {"id": "deploy-\n\n' % event
+        for deployment_id in pending:
+            yield 'event: %s\ndata: %s\n\n' % (
+                event, json.dumps({'id': deployment_id, 'eventType': event}))
+
+    @staticmethod
+    def _json(start_response, status, data):
+        start_response(status, [('Content-Type', 'application/json')])
+        return [json.dumps(data)]
+
+
+class TestMarathonProviderWait(unittest.TestCase):
+    """Test waiting for Marathon deployments against a stub Marathon"""
+
+    def setUp(self):
+        self.artifact_dir = os.path.join(os.path.dirname(__file__),
+                                         'marathon_artifact_test')
+
+    def start_server(self, marathon):
+        server = WSGIServer(application=marathon, threaded=True)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def prepare_provider(self, server, timeout=10):
+        provider = MarathonProvider({'provider-api': server.url,
+                                     'provider-wait': True,
+                                     'provider-wait-timeout': timeout},
+                                    self.artifact_dir, False)
+        provider.wait_poll_interval = 0.01
+        provider.artifacts = ['db.json', 'web.json']
+        provider.init()
+        return provider
+
+    def test_wait_with_events(self):
+        marathon = StubMarathon()
+        provider = self.prepare_provider(self.start_server(marathon))
+        provider.run()
+
+        self.assertEqual(sorted(provider.deploy_timings.keys()), ['/db', '/web'])
+        self.assertEqual(marathon.polls, 1)
+
+    def test_wait_by_polling(self):
+        marathon = StubMarathon(events=False)
+        provider = self.prepare_provider(self.start_server(marathon))
+        provider.run()
+
+        self.assertEqual(sorted(provider.deploy_timings.keys()), ['/db', '/web'])
+        self.assertTrue(marathon.polls > 2)
+
+    def test_wait_deployment_failed(self):
+        marathon = StubMarathon(fail=True)
+        provider = self.prepare_provider(self.start_server(marathon))
+        with pytest.raises(ProviderFailedException):
+            provider.run()
+
+    def test_wait_timeout(self):
+        marathon = StubMarathon(events=False)
+        marathon.polls = -1000
+        provider = self.prepare_provider(self.start_server(marathon), timeout=0)
+        with pytest.raises(ProviderFailedException):
+            provider.run()
+
+    def test_wait_malformed_event(self):
+        marathon = StubMarathon(malformed=True)
+        provider = self.prepare_provider(self.start_server(marathon))
+        provider.run()
+
+        self.assertEqual(sorted(provider.deploy_timings.keys()), ['/db', '/web'])
+
+    def test_invalid_wait_timeout(self):
+        with pytest.raises(ProviderFailedException) as e:
+            self.prepare_provider(self.start_server(StubMarathon()),
+                                  timeout='soon')
+        assert 'provider-wait-timeout' in str(e.value)
@@ -0,0 +1,98 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from atomicapp.batch import Batch, BatchException
+
+EXAMPLE = os.path.join(os.path.dirname(__file__),
+                       "cli/test_examples/helloapache")
+
+
+class TestBatch(unittest.TestCase):
+
+    """Test deploying the entries of a batch manifest"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-test-batch")
+        shutil.copytree(EXAMPLE, os.path.join(self.tmpdir, "helloapache"))
+        self.manifest = os.path.join(self.tmpdir, "batch.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_manifest(self, data):
+        with open(self.manifest, "w") as f:
+            json.dump(data, f)
+
+    def test_run(self):
+        self.write_manifest({"entries": [
+            {"app_spec": "helloapache", "provider": "docker",
+             "namespace": "tenant-a", "destination": "a"},
+            {"app_spec": "helloapache", "provider": "kubernetes",
+             "namespace": "tenant-b", "destination": "b"},
+            {"app_spec": "helloapache", "provider": "nosuch",
+             "destination": "none"}]})
+        batch = Batch.load(self.manifest, workers=2, dryrun=True)
+
+        with mock.patch.object(Batch, "_unpack",
+                               wraps=batch._unpack) as unpack:
+            results = batch.run()
+        unpack.assert_called_once_with(os.path.join(self.tmpdir, "helloapache"))
+
+        self.assertEqual([r["status"] for r in results], ["ok", "ok", "failed"])
+        self.assertEqual(results[0]["app_path"], os.path.join(self.tmpdir, "a"))
+        self.assertIn('"nosuch" are not part of this app', results[2]["error"])
+        # Each entry rendered its own copy for its provider
+        self.assertTrue(os.path.exists(os.path.join(
+            self.tmpdir, "a/artifacts/docker/.hello-apache-pod_run")))
+        self.assertTrue(os.path.exists(os.path.join(
+            self.tmpdir, "b/artifacts/kubernetes/.hello-apache-pod.json")))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.tmpdir, "helloapache/artifacts/docker/.hello-apache-pod_run")))
+
+    def test_missing_answers(self):
+        nulecule = os.path.join(self.tmpdir, "helloapache/Nulecule")
+        with open(nulecule) as f:
+            content = f.read().replace("        default: 80\n", "")
+        with open(nulecule, "w") as f:
+            f.write(content)
+        self.write_manifest([{"app_spec": "helloapache", "provider": "docker",
+                              "destination": "a"}])
+        batch = Batch.load(self.manifest, dryrun=True)
+
+        with mock.patch("__builtin__.raw_input") as raw_input:
+            results = batch.run()
+        self.assertFalse(raw_input.called)
+        self.assertEqual(results[0]["status"], "failed")
+        self.assertIn("hostport (helloapache-app)", results[0]["error"])
+
+    def test_invalid_manifest(self):
+        for data in ([], {"entries": [{"provider": "docker"}]},
+                     [{"app_spec": "foo", "action": "restart"}],
+                     [{"app_spec": "foo", "answer": "a.conf"}],
+                     [{"app_spec": "foo", "destination": "a"},
+                      {"app_spec": "bar", "destination": "a"}]):
+            self.write_manifest(data)
+            self.assertRaises(BatchException, Batch.load, self.manifest)
@@ -1,9 +1,13 @@
 import mock
 import unittest
 
-from atomicapp.plugin import Plugin
+from atomicapp.constants import (PROVIDER_CAPABILITY_STORAGE,
+                                 PROVIDER_CAPABILITY_WAIT,
+                                 PROVIDERS)
+from atomicapp.plugin import Plugin, Provider
 from atomicapp.providers.docker import DockerProvider
 from atomicapp.providers.kubernetes import KubernetesProvider
+from atomicapp.providers.marathon import MarathonProvider
  
 class TestPluginGetProvider(unittest.TestCase):
  
@@ -28,3 +32,73 @@ class TestPluginGetProvider(unittest.TestCase):
 
         # if non-existent key provided
         self.assertEqual(p.getProvider('some_random'), None)
+
+
+class ThirdPartyProvider(Provider):
+    key = "thirdparty"
+    capabilities = frozenset([PROVIDER_CAPABILITY_WAIT])
+
+
+class TestPluginRegistry(unittest.TestCase):
+
+    """Test the provider registry of Plugin"""
+
+    def setUp(self):
+        self.plugins = mock.patch.object(Plugin, 'plugins', {})
+        self.plugins.start()
+        self.entry_point = mock.Mock()
+        self.entry_point.name = 'thirdparty'
+        self.entry_point.load.return_value = ThirdPartyProvider
+        self.entry_points = mock.patch.object(
+            Plugin, '_entry_points', {'thirdparty': self.entry_point})
+        self.entry_points.start()
+
+    def tearDown(self):
+        self.entry_points.stop()
+        self.plugins.stop()
+
+    def test_builtin_cached(self):
+        with mock.patch('importlib.import_module',
+                        wraps=__import__('importlib').import_module) as import_module:
+            self.assertEqual(Plugin().getProvider('kubernetes'),
+                             KubernetesProvider)
+            self.assertEqual(Plugin().getProvider('kubernetes'),
+                             KubernetesProvider)
+        import_module.assert_called_once_with('atomicapp.providers.kubernetes')
+
+    def test_entry_point(self):
+        p = Plugin()
+        self.assertEqual(p.getProvider('thirdparty'), ThirdPartyProvider)
+        self.assertEqual(p.getProvider('thirdparty'), ThirdPartyProvider)
+        self.entry_point.load.assert_called_once_with()
+        self.assertEqual(p.getProviderKeys(), PROVIDERS + ['thirdparty'])
+
+    def test_unknown_does_not_import(self):
+        with mock.patch('importlib.import_module') as import_module:
+            self.assertEqual(Plugin().getProvider('kuberntes'), None)
+        self.assertFalse(import_module.called)
+
+    def test_failed_entry_point(self):
+        self.entry_point.load.side_effect = ImportError('No module named x')
+        self.assertEqual(Plugin().getProvider('thirdparty'), None)
+
+    def test_capabilities(self):
+        p = Plugin()
+        self.assertTrue(p.supports('kubernetes', PROVIDER_CAPABILITY_STORAGE))
+        self.assertFalse(p.supports('docker', PROVIDER_CAPABILITY_STORAGE))
+        self.assertEqual(p.getCapabilities('marathon'),
+                         MarathonProvider.capabilities)
+        self.assertTrue(p.supports('thirdparty', PROVIDER_CAPABILITY_WAIT))
+        self.assertEqual(p.getCapabilities('some_random'), frozenset())
+
+    def test_scan_entry_points_once(self):
+        entry_point = mock.Mock()
+        entry_point.name = 'docker'
+        with mock.patch.object(Plugin, '_entry_points', None), \
+                mock.patch('pkg_resources.iter_entry_points',
+                           return_value=[entry_point]) as iter_entry_points:
+            self.assertEqual(Plugin().getProviderKeys(), PROVIDERS)
+            self.assertEqual(Plugin().getProvider('other'), None)
+        # built-in providers can not be shadowed
+        self.assertEqual(iter_entry_points.call_count, 1)
+        self.assertFalse(entry_point.load.called)
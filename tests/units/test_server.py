@@ -0,0 +1,218 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import httplib
+import json
+import mock
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from atomicapp.index import IndexException
+from atomicapp.server import Server, ServerException
+
+EXAMPLE = os.path.join(os.path.dirname(__file__),
+                       "cli/test_examples/helloapache")
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+
+    def __init__(self, path):
+        httplib.HTTPConnection.__init__(self, "localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class TestServer(unittest.TestCase):
+
+    """Test the atomicapp serve API on a unix socket"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-test-serve")
+        self.socket = os.path.join(self.tmpdir, "atomicapp.sock")
+        self.app = os.path.join(self.tmpdir, "helloapache")
+        shutil.copytree(EXAMPLE, self.app)
+        self.server = Server(self.socket, workers=4,
+                             destination_root=self.tmpdir)
+        self.server.start()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.tmpdir)
+
+    def request(self, method, path, body=None):
+        conn = UnixHTTPConnection(self.socket)
+        conn.request(method, path, body if body is None else json.dumps(body),
+                     {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_socket_mode(self):
+        self.assertEqual(os.stat(self.socket).st_mode & 0o777, 0o600)
+
+    def test_status(self):
+        status, result = self.request("GET", "/status")
+        self.assertEqual(status, 200)
+        self.assertIn("run", result["operations"])
+
+    def test_render(self):
+        status, result = self.request("POST", "/render", {
+            "app_spec": self.app, "dryrun": True,
+            "cli_answers": {"provider": "docker"}})
+        self.assertEqual(status, 200)
+        self.assertEqual(result, {"app_path": self.app, "provider": "docker"})
+        rendered = os.path.join(self.app, "artifacts/docker/.hello-apache-pod_run")
+        with open(rendered) as f:
+            self.assertIn("centos/httpd", f.read())
+
+    def test_stop_answers(self):
+        with mock.patch("atomicapp.server.NuleculeManager") as manager:
+            manager.return_value.app_path = self.app
+            status, result = self.request("POST", "/stop", {
+                "app_spec": self.app,
+                "cli_answers": {"provider": "docker", "namespace": "tenant"}})
+        self.assertEqual(status, 200)
+        manager.assert_called_once_with(
+            app_spec=self.app,
+            cli_answers={"provider": "docker", "namespace": "tenant"},
+            interactive=False)
+
+    def test_genanswers(self):
+        status, result = self.request("POST", "/genanswers",
+                                      {"app_spec": self.app})
+        self.assertEqual(status, 200)
+        self.assertEqual(result["answers"]["helloapache-app"],
+                         {"image": "centos/httpd", "hostport": 80})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.request("POST", "/run", {})[0], 400)
+        self.assertEqual(self.request("POST", "/run", {
+            "app_spec": self.app, "cli_answers": "docker"})[0], 400)
+        self.assertEqual(self.request("POST", "/deploy", {})[0], 404)
+        status, result = self.request("POST", "/stop", {
+            "app_spec": os.path.join(self.tmpdir, "missing")})
+        self.assertEqual(status, 500)
+        self.assertIn("error", result)
+
+    def test_missing_answers(self):
+        nulecule = os.path.join(self.app, "Nulecule")
+        with open(nulecule) as f:
+            content = f.read().replace("        default: 80\n", "")
+        with open(nulecule, "w") as f:
+            f.write(content)
+        with mock.patch("__builtin__.raw_input") as raw_input:
+            status, result = self.request("POST", "/render", {
+                "app_spec": self.app, "dryrun": True,
+                "cli_answers": {"provider": "docker"}})
+        self.assertFalse(raw_input.called)
+        self.assertEqual(status, 400)
+        self.assertIn("hostport (helloapache-app)", result["error"])
+
+    def test_destination_root(self):
+        body = {"app_spec": self.app, "dryrun": True,
+                "cli_answers": {"provider": "docker"}}
+        for destination in ["/etc/atomicapp", "a",
+                            os.path.join(self.tmpdir, "../a"), self.tmpdir]:
+            body["destination"] = destination
+            status, result = self.request("POST", "/render", body)
+            self.assertEqual(status, 400)
+            self.assertIn("destination must be an absolute path under",
+                          result["error"])
+        body["destination"] = os.path.join(self.tmpdir, "a")
+        self.assertEqual(self.request("POST", "/render", body)[0], 200)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.tmpdir, "a/artifacts/docker/.hello-apache-pod_run")))
+
+        self.assertEqual(self.request("POST", "/run", {
+            "app_spec": self.app, "answers_output": "/etc/answers.conf"})[0],
+            400)
+
+    def test_index_info(self):
+        with mock.patch.object(self.server._index, "get_entry",
+                               side_effect=IndexException("No application")):
+            self.assertEqual(self.request("GET", "/index/foo")[0], 404)
+        with mock.patch.object(self.server._index, "find",
+                               return_value=[{"id": "foo"}]) as find:
+            self.assertEqual(self.request("GET", "/index?q=foo&q=bar"),
+                             (200, {"nulecules": [{"id": "foo"}]}))
+        find.assert_called_once_with("foo bar", False)
+
+    def test_app_concurrency(self):
+        running = {}
+        peak = {}
+        lock = threading.Lock()
+
+        def operation(body):
+            with lock:
+                app = body["app_spec"]
+                running[app] = running.get(app, 0) + 1
+                peak[app] = max(peak.get(app, 0), running[app])
+            time.sleep(0.05)
+            with lock:
+                running[app] -= 1
+            return {}
+
+        self.server.operations["run"] = operation
+        threads = [threading.Thread(target=self.request,
+                                    args=("POST", "/run", {"app_spec": app}))
+                   for app in ["a", "a", "a", "b", "b", "b"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak, {"a": 1, "b": 1})
+
+
+class TestServerTCP(unittest.TestCase):
+
+    """Test the token of the atomicapp serve API on TCP"""
+
+    def setUp(self):
+        self.server = Server(("127.0.0.1", 0), token="secret")
+        self.server.start()
+        self.port = self.server.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+
+    def request(self, headers):
+        conn = httplib.HTTPConnection("127.0.0.1", self.port)
+        conn.request("GET", "/status", None, headers)
+        return conn.getresponse().status
+
+    def test_token(self):
+        self.assertEqual(self.request({}), 401)
+        self.assertEqual(self.request({"Authorization": "Bearer wrong"}), 401)
+        self.assertEqual(self.request({"Authorization": "Bearer secret"}), 200)
+
+    def test_no_token(self):
+        self.assertRaises(ServerException, Server, ("127.0.0.1", 0))
@@ -1,8 +1,16 @@
+import hashlib
+import json
+import mock
 import unittest
 import os
+import pwd
 import tempfile
+import threading
+import time
 
-from atomicapp.utils import Utils
+from pytest_localserver.http import WSGIServer
+
+from atomicapp.utils import AtomicAppUtilsException, Utils
 
 
 class TestUtils(unittest.TestCase):
@@ -11,9 +19,375 @@ class TestUtils(unittest.TestCase):
         self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-test-utils", dir="/tmp")
         self.tmpfile = open(os.path.join(self.tmpdir, 'test.txt'), 'w+')
 
-    def test_setFileOwnerGroup(self):
+    def test_parse_file_cached(self):
+        path = os.path.join(self.tmpdir, 'index.yaml')
+        cache = path + '.cache'
+        with open(path, 'w') as f:
+            f.write('nulecules: [{id: foo}]\n')
+
+        self.assertEqual(Utils.parse_file_cached(path, cache),
+                         {'nulecules': [{'id': 'foo'}]})
+        self.assertTrue(os.path.exists(cache))
+
+        parse = mock.Mock(side_effect=AssertionError("parsed again"))
+        self.assertEqual(Utils.parse_file_cached(path, cache, parse),
+                         {'nulecules': [{'id': 'foo'}]})
+
+        with open(path, 'w') as f:
+            f.write('nulecules: [{id: bar}]\n')
+        os.utime(path, (0, 0))
+        self.assertEqual(Utils.parse_file_cached(path, cache),
+                         {'nulecules': [{'id': 'bar'}]})
+
+    def test_parse_file_cached_corrupt_cache(self):
+        path = os.path.join(self.tmpdir, 'index.yaml')
+        cache = path + '.cache'
+        with open(path, 'w') as f:
+            f.write('id: foo\n')
+        with open(cache, 'w') as f:
+            f.write('garbage')
+        self.assertEqual(Utils.parse_file_cached(path, cache), {'id': 'foo'})
+
+    def test_parse_file_hashed(self):
+        cache_dir = os.path.join(self.tmpdir, 'spec-cache')
+        paths = [os.path.join(self.tmpdir, name) for name in ('web', 'api')]
+        for path in paths:
+            with open(path, 'w') as f:
+                f.write('id: db\n')
+
+        self.assertEqual(Utils.parse_file_hashed(paths[0], cache_dir),
+                         {'id': 'db'})
+        self.assertEqual(len(self.data_files(cache_dir)), 1)
+        # An unchanged file is not read and hashed again
+        with mock.patch('atomicapp.utils.hashlib.sha256',
+                        wraps=hashlib.sha256) as sha256:
+            self.assertEqual(Utils.parse_file_hashed(paths[0], cache_dir),
+                             {'id': 'db'})
+        self.assertEqual(sha256.call_count, 1)
+        # A copy of the file is not parsed again
+        parse = mock.Mock(side_effect=AssertionError("parsed again"))
+        self.assertEqual(Utils.parse_file_hashed(paths[1], cache_dir, parse),
+                         {'id': 'db'})
+
+        with open(paths[1], 'w') as f:
+            f.write('id: cache\n')
+        os.utime(paths[1], (0, 0))
+        self.assertEqual(Utils.parse_file_hashed(paths[1], cache_dir),
+                         {'id': 'cache'})
+        self.assertEqual(len(self.data_files(cache_dir)), 2)
+
+    @staticmethod
+    def data_files(cache_dir):
+        return [name for name in os.listdir(cache_dir)
+                if not name.startswith('stamp-')]
+
+    @mock.patch('atomicapp.utils.SPEC_CACHE_MAX_FILES', 3)
+    def test_parse_file_hashed_pruned(self):
+        cache_dir = os.path.join(self.tmpdir, 'spec-cache')
+        path = os.path.join(self.tmpdir, 'Nulecule')
+        for i in range(4):
+            with open(path, 'w') as f:
+                f.write('id: app-%s\n' % i)
+            os.utime(path, (i, i))
+            self.assertEqual(Utils.parse_file_hashed(path, cache_dir),
+                             {'id': 'app-%s' % i})
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+    def test_parse_file_hashed_ownership(self):
+        cache_dir = os.path.join(self.tmpdir, '.atomicapp', 'spec-cache')
+        path = os.path.join(self.tmpdir, 'Nulecule')
+        with open(path, 'w') as f:
+            f.write('id: db\n')
+
+        with mock.patch.object(Utils, 'trackOwnership') as track:
+            Utils.parse_file_hashed(path, cache_dir)
+        data_path, = [os.path.join(cache_dir, name)
+                      for name in self.data_files(cache_dir)]
+        stamp_path, = [os.path.join(cache_dir, name)
+                       for name in os.listdir(cache_dir)
+                       if name.startswith('stamp-')]
+        self.assertEqual(track.call_args_list, [
+            mock.call(os.path.join(self.tmpdir, '.atomicapp')),
+            mock.call(data_path, recursive=False),
+            mock.call(stamp_path, recursive=False)])
+
+    @mock.patch.object(Utils, 'getUserHome', return_value='~nobody')
+    def test_parse_spec_file_without_home(self, mock_home):
+        path = os.path.join(self.tmpdir, 'Nulecule')
+        with open(path, 'w') as f:
+            f.write('id: db\n')
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            self.assertEqual(Utils.parse_spec_file(path), {'id': 'db'})
+        finally:
+            os.chdir(cwd)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, '~nobody')))
+
+    def test_parse_file_memoized(self):
+        path = os.path.join(self.tmpdir, 'config')
+        with open(path, 'w') as f:
+            f.write('users: [{name: foo}]\n')
+
+        first = Utils.parse_file_memoized(path)
+        self.assertEqual(first, {'users': [{'name': 'foo'}]})
+        # Callers get their own copy
+        first['users'].append('bar')
+        parse = mock.Mock(side_effect=AssertionError("parsed again"))
+        self.assertEqual(Utils.parse_file_memoized(path, parse),
+                         {'users': [{'name': 'foo'}]})
+
+        with open(path, 'w') as f:
+            f.write('users: []\n')
+        os.utime(path, (0, 0))
+        self.assertEqual(Utils.parse_file_memoized(path), {'users': []})
+
+    @mock.patch('atomicapp.utils.PARSED_FILES_MAX', 2)
+    def test_parse_file_memoized_evicted(self):
+        paths = [os.path.join(self.tmpdir, name) for name in 'abc']
+        for path in paths:
+            with open(path, 'w') as f:
+                f.write('id: %s\n' % os.path.basename(path))
+        parse = mock.Mock(side_effect=lambda path: os.path.basename(path))
+        for path in paths[:2] + paths[:1] + paths[2:]:
+            Utils.parse_file_memoized(path, parse)
+        self.assertEqual(parse.call_count, 3)
+        self.assertEqual(len(Utils._parsed_files), 2)
+        # b was the least recently used
+        Utils.parse_file_memoized(paths[0], parse)
+        self.assertEqual(parse.call_count, 3)
+        Utils.parse_file_memoized(paths[1], parse)
+        self.assertEqual(parse.call_count, 4)
+
+    def test_fixOwnership(self):
+        """
+        Tracked paths are chowned once, nested and removed paths are skipped
+        """
+        app = os.path.join(self.tmpdir, 'app')
+        os.makedirs(os.path.join(app, 'external', 'db'))
+        open(os.path.join(app, 'external', 'db', 'Nulecule'), 'w').close()
+        Utils.trackOwnership(app)
+        Utils.trackOwnership(os.path.join(app, 'external'), recursive=False)
+        Utils.trackOwnership(os.path.join(app, 'external', 'db'))
+        Utils.trackOwnership(os.path.join(self.tmpdir, 'removed'))
+        Utils.trackOwnership(self.tmpfile.name, recursive=False)
+
+        uid, gid = os.getuid() + 1, os.getgid()
+        with mock.patch('atomicapp.utils.Utils.getUidGid', return_value=(uid, gid)), \
+                mock.patch('os.chown') as chown:
+            Utils.fixOwnership()
+            chowned = sorted(c[0][0] for c in chown.call_args_list)
+            self.assertEqual(chowned, sorted([
+                app,
+                os.path.join(app, 'external'),
+                os.path.join(app, 'external', 'db'),
+                os.path.join(app, 'external', 'db', 'Nulecule'),
+                self.tmpfile.name]))
+
+            chown.reset_mock()
+            Utils.fixOwnership()
+            self.assertFalse(chown.called)
+
+    def test_fixOwnership_owned(self):
+        Utils.trackOwnership(self.tmpdir)
+        with mock.patch('atomicapp.utils.Utils.getUidGid',
+                        return_value=(os.getuid(), os.getgid())), \
+                mock.patch('os.chown') as chown:
+            Utils.fixOwnership()
+            self.assertFalse(chown.called)
+
+
+    def test_ownershipScope(self):
         """
-        Use the function to set the file owner ship
+        A scope only fixes the paths of its thread, even while another
+        thread is in its own scope
         """
-        u = Utils
-        u.setFileOwnerGroup(self.tmpdir)
+        paths = [os.path.join(self.tmpdir, name) for name in ('a', 'b')]
+        for path in paths:
+            open(path, 'w').close()
+        tracked = threading.Event()
+        done = threading.Event()
+
+        def other():
+            with Utils.ownershipScope():
+                Utils.trackOwnership(paths[1], recursive=False)
+                tracked.set()
+                done.wait(5)
+
+        uid, gid = os.getuid() + 1, os.getgid()
+        with mock.patch('atomicapp.utils.Utils.getUidGid', return_value=(uid, gid)), \
+                mock.patch('os.chown') as chown:
+            thread = threading.Thread(target=other)
+            thread.start()
+            tracked.wait(5)
+            with Utils.ownershipScope():
+                Utils.trackOwnership(paths[0], recursive=False)
+            self.assertEqual([c[0][0] for c in chown.call_args_list],
+                             [paths[0]])
+            done.set()
+            thread.join()
+            self.assertEqual([c[0][0] for c in chown.call_args_list], paths)
+
+
+class TestCopyDir(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-test-copy", dir="/tmp")
+        self.src = os.path.join(self.tmpdir, 'src')
+        self.dest = os.path.join(self.tmpdir, 'dest')
+        os.makedirs(os.path.join(self.src, 'artifacts', 'docker'))
+        for name in ('Nulecule', 'artifacts/docker/run', 'artifacts/docker/stop'):
+            self.write(os.path.join(self.src, name), name)
+
+    def write(self, path, data):
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_copy_dir(self):
+        copied = Utils.copy_dir(self.src, self.dest)
+        self.assertIn(os.path.join(self.dest, 'artifacts', 'docker', 'run'), copied)
+        self.assertEqual(self.read(os.path.join(self.dest, 'artifacts/docker/stop')),
+                         'artifacts/docker/stop')
+        self.assertEqual(Utils.copy_dir(self.src, self.dest), [])
+
+        self.write(os.path.join(self.src, 'Nulecule'), 'changed')
+        self.assertEqual(Utils.copy_dir(self.src, self.dest),
+                         [os.path.join(self.dest, 'Nulecule')])
+        self.assertEqual(self.read(os.path.join(self.dest, 'Nulecule')), 'changed')
+
+        # Same content with a new mtime is not copied again
+        os.utime(os.path.join(self.src, 'Nulecule'), (0, 0))
+        self.assertEqual(Utils.copy_dir(self.src, self.dest), [])
+
+    def test_copy_dir_removes_deleted(self):
+        Utils.copy_dir(self.src, self.dest)
+        self.write(os.path.join(self.dest, 'answers.conf'), '[general]\n')
+        self.write(os.path.join(self.dest, 'artifacts/docker/stop'), 'edited')
+        os.unlink(os.path.join(self.src, 'artifacts/docker/run'))
+        os.unlink(os.path.join(self.src, 'artifacts/docker/stop'))
+
+        Utils.copy_dir(self.src, self.dest)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'artifacts/docker/run')))
+        # Files that were not copied or modified since are kept
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'artifacts/docker/stop')))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'answers.conf')))
+
+    def test_copy_dir_update(self):
+        Utils.copy_dir(self.src, self.dest)
+        self.write(os.path.join(self.dest, 'Nulecule'), 'local')
+        self.write(os.path.join(self.src, 'Nulecule'), 'upstream')
+        os.utime(os.path.join(self.src, 'Nulecule'), (0, 0))
+        self.assertEqual(Utils.copy_dir(self.src, self.dest, update=True), [])
+        self.assertEqual(self.read(os.path.join(self.dest, 'Nulecule')), 'local')
+        Utils.copy_dir(self.src, self.dest)
+        self.assertEqual(self.read(os.path.join(self.dest, 'Nulecule')), 'upstream')
+
+    def test_copy_dir_link(self):
+        Utils.copy_dir(self.src, self.dest, link=True)
+        self.assertEqual(os.stat(os.path.join(self.src, 'Nulecule')).st_ino,
+                         os.stat(os.path.join(self.dest, 'Nulecule')).st_ino)
+        Utils.copy_dir(self.src, os.path.join(self.tmpdir, 'copy'))
+        self.assertNotEqual(os.stat(os.path.join(self.src, 'Nulecule')).st_ino,
+                            os.stat(os.path.join(self.tmpdir, 'copy', 'Nulecule')).st_ino)
+
+
+class TestIdentity(unittest.TestCase):
+
+    def setUp(self):
+        self.host = tempfile.mkdtemp(prefix="atomicapp-test-host", dir="/tmp")
+        os.mkdir(os.path.join(self.host, 'etc'))
+        with open(os.path.join(self.host, 'etc', 'passwd'), 'w') as f:
+            f.write('root:x:0:0:root:/root:/bin/bash\n'
+                    'alice:x:1000:1001:Alice:/home/alice:/bin/bash\n')
+        for name, value in (('_identity', None), ('_root', None), ('_passwd', {})):
+            patcher = mock.patch.object(Utils, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch('os.chroot')
+    def test_identity_in_container(self, chroot):
+        with mock.patch('atomicapp.utils.HOST_DIR', self.host), \
+                mock.patch.dict(os.environ, {'SUDO_USER': 'alice'}):
+            identity = Utils.getIdentity()
+            self.assertEqual(identity.user, 'alice')
+            self.assertEqual((identity.uid, identity.gid), (1000, 1001))
+            self.assertEqual(Utils.getUserHome(), '/home/alice')
+            self.assertEqual(Utils.getRoot(), self.host)
+            self.assertEqual(Utils.getUidGid('root'), (0, 0))
+            self.assertRaises(KeyError, Utils.getUidGid, 'bob')
+        self.assertFalse(chroot.called)
+
+    def test_identity_resolved_once(self):
+        with mock.patch('atomicapp.utils.pwd.getpwnam',
+                        wraps=pwd.getpwnam) as getpwnam:
+            home = Utils.getUserHome()
+            self.assertEqual(Utils.getUserHome(), home)
+            Utils.getUidGid(Utils.getIdentity().user)
+            self.assertEqual(getpwnam.call_count, 1)
+
+
+class TestMakeRestRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.statuses = []
+        self.delay = 0
+        self.server = WSGIServer(application=self.app, threaded=True)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def app(self, environ, start_response):
+        self.requests.append((environ["REQUEST_METHOD"],
+                              environ.get("CONTENT_TYPE")))
+        status = self.statuses.pop(0) if self.statuses else "200 OK"
+        time.sleep(self.delay)
+        start_response(status, [("Content-Type", "application/json")])
+        return [json.dumps({"status": status})]
+
+    def test_session_is_shared_per_host(self):
+        session = Utils.get_rest_session(self.server.url + "/v2/apps")
+        self.assertIs(session, Utils.get_rest_session(self.server.url + "/v2/x"))
+        self.assertIsNot(session, Utils.get_rest_session("http://other:8080/"))
+
+    def test_retries_server_errors(self):
+        self.statuses = ["503 Service Unavailable", "502 Bad Gateway"]
+        status_code, data = Utils.make_rest_request("get", self.server.url)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data, {"status": "200 OK"})
+        self.assertEqual(len(self.requests), 3)
+
+    def test_read_timeout(self):
+        self.delay = 0.5
+        started = time.time()
+        self.assertRaises(AtomicAppUtilsException, Utils.make_rest_request,
+                          "get", self.server.url, timeout=(1, 0.1))
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_does_not_retry_post(self):
+        self.statuses = ["503 Service Unavailable"]
+        status_code, _ = Utils.make_rest_request("post", self.server.url,
+                                                 data={"id": "app"})
+        self.assertEqual(status_code, 503)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_patch_does_not_modify_headers(self):
+        headers = {"Accept": "application/json"}
+        Utils.make_rest_request("patch", self.server.url, data=[],
+                                headers=headers)
+        self.assertEqual(headers, {"Accept": "application/json"})
+        self.assertEqual(self.requests[0][1], "application/json-patch+json")
+
+    def test_records_latency(self):
+        host = self.server.url.split("://")[1]
+        Utils.make_rest_request("get", self.server.url)
+        Utils.make_rest_request("delete", self.server.url)
+        stats = Utils.rest_latency[host]
+        self.assertEqual(stats["calls"], 2)
+        self.assertTrue(stats["max"] <= stats["total"])
@@ -0,0 +1,147 @@
+"""
+ Copyright 2014-2016 Red Hat, Inc.
+
+ This file is part of Atomic App.
+
+ Atomic App is free software: you can redistribute it and/or modify
+ it under the terms of the GNU Lesser General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Atomic App is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU Lesser General Public License for more details.
+
+ You should have received a copy of the GNU Lesser General Public License
+ along with Atomic App. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from atomicapp.nulecule import NuleculeManager
+from atomicapp.providers.docker import DockerProvider
+from atomicapp.watch import (Watch, WatchException, _InotifyWatcher,
+                             _PollingWatcher)
+
+EXAMPLE = os.path.join(os.path.dirname(__file__),
+                       "cli/test_examples/helloapache")
+
+
+class TestWatch(unittest.TestCase):
+
+    """Test applying the changes of a running app"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-test-watch")
+        self.app = os.path.join(self.tmpdir, "helloapache")
+        shutil.copytree(EXAMPLE, self.app)
+        self.artifact = os.path.join(self.app,
+                                     "artifacts/docker/hello-apache-pod_run")
+        self.rendered = os.path.join(self.app,
+                                     "artifacts/docker/.hello-apache-pod_run")
+        nm = NuleculeManager(app_spec=self.app,
+                             cli_answers={"provider": "docker"})
+        nm.run(answers_output=None, ask=False, dryrun=True)
+        self.watch = Watch(nm, dryrun=True)
+
+        self.calls = []
+
+        def record(action):
+            def call(provider):
+                with open(os.path.join(self.app, provider.artifacts[0])) as f:
+                    self.calls.append((action, provider.artifacts,
+                                       provider.partial, f.read()))
+            return call
+
+        patchers = [mock.patch.object(DockerProvider, "stop", autospec=True,
+                                      side_effect=record("stop")),
+                    mock.patch.object(DockerProvider, "run", autospec=True,
+                                      side_effect=record("run"))]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_artifact_changed(self):
+        with open(self.artifact, "w") as f:
+            f.write("docker run -d -p $hostport:8080 $image")
+        self.watch.apply(set([self.artifact]))
+
+        artifacts = ["artifacts/docker/.hello-apache-pod_run"]
+        self.assertEqual(self.calls, [
+            ("stop", artifacts, True, "docker run -d -p 80:80 centos/httpd\n"),
+            ("run", artifacts, True, "docker run -d -p 80:8080 centos/httpd")])
+
+    def test_ownership_fixed(self):
+        with open(self.artifact, "w") as f:
+            f.write("docker run -d -p $hostport:8080 $image")
+        with mock.patch("atomicapp.watch.Utils.trackOwnership") as track, \
+                mock.patch("atomicapp.watch.Utils.fixOwnership") as fix:
+            self.watch.apply(set([self.artifact]))
+        track.assert_called_once_with(self.rendered, recursive=False)
+        fix.assert_called_once_with()
+
+    def test_nothing_changed(self):
+        os.utime(self.artifact, None)
+        self.watch.apply(set([self.artifact, self.rendered,
+                              os.path.join(self.app, "README.md")]))
+        self.assertEqual(self.calls, [])
+
+    def test_answers_changed(self):
+        with open(os.path.join(self.app, "answers.conf"), "w") as f:
+            f.write("[general]\nprovider = docker\n\n"
+                    "[helloapache-app]\nhostport = 8080\n")
+        self.watch.apply(set([os.path.join(self.app, "answers.conf")]))
+
+        self.assertEqual([call[0] for call in self.calls], ["stop", "run"])
+        with open(self.rendered) as f:
+            self.assertEqual(f.read(), "docker run -d -p 8080:80 centos/httpd\n")
+
+    def test_provider_changed(self):
+        self.watch.nm.config.update_source("cli", {})
+        with open(os.path.join(self.app, "answers.conf"), "w") as f:
+            f.write("[general]\nprovider = kubernetes\n")
+        self.assertRaises(WatchException, self.watch.reload)
+        self.assertEqual(self.calls, [])
+
+
+class TestWatchers(unittest.TestCase):
+
+    """Test finding the changed files of directories"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="atomicapp-test-watchers")
+        self.path = os.path.join(self.tmpdir, "Nulecule")
+        with open(self.path, "w") as f:
+            f.write("id: test\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_watcher(self, watcher):
+        try:
+            self.assertEqual(watcher.wait(0), set())
+            with open(self.path, "w") as f:
+                f.write("id: changed\n")
+            self.assertEqual(watcher.wait(1), set([self.path]))
+            os.unlink(self.path)
+            self.assertEqual(watcher.wait(1), set([self.path]))
+        finally:
+            watcher.close()
+
+    def test_polling(self):
+        self.check_watcher(_PollingWatcher([self.tmpdir], interval=0.01))
+
+    def test_inotify(self):
+        try:
+            watcher = _InotifyWatcher([self.tmpdir])
+        except WatchException as e:
+            raise unittest.SkipTest(str(e))
+        self.check_watcher(watcher)